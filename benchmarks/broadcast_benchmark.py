@@ -0,0 +1,82 @@
+"""Benchmark daily tip delivery: the old serial loop vs the broadcast engine.
+
+Both send to a simulated Telegram that takes --latency seconds per call and
+answers 429 (RetryAfter) when more than 30 messages arrive within one second. The
+serial loop (send, then sleep 0.1s) is timed over --serial messages and extrapolated.
+
+Run from the repository root:
+    python -m benchmarks.broadcast_benchmark --subscribers 2000
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import time
+
+from telegram.error import RetryAfter
+
+from src.services.broadcast import Broadcaster, BroadcastMessage, plain_text
+
+TIP = "🧠 <b>Daily Mbti Tip</b> 🧠\n\nNotice which activities leave you energized today."
+
+
+class SimulatedTelegram:
+    """Stands in for the Bot API: fixed latency and a 30 messages/second flood limit."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+        self.rate_limited = 0
+        self._recent = collections.deque()
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1:
+            self._recent.popleft()
+        if len(self._recent) >= 30:
+            self.rate_limited += 1
+            raise RetryAfter(datetime.timedelta(seconds=1))
+        self._recent.append(now)
+        self.sent += 1
+
+
+async def serial(args) -> float:
+    bot = SimulatedTelegram(args.latency)
+    started = time.perf_counter()
+    for chat_id in range(1, args.serial + 1):
+        await bot.send_message(chat_id=chat_id, text=TIP, parse_mode='HTML')
+        await asyncio.sleep(0.1)
+    return bot.sent / (time.perf_counter() - started)
+
+
+async def broadcast(args):
+    bot = SimulatedTelegram(args.latency)
+    broadcaster = Broadcaster(bot, workers=args.workers, rate_per_second=args.rate)
+    fallback = plain_text(TIP)
+    messages = (BroadcastMessage(chat_id, TIP, 'HTML', fallback) for chat_id in range(1, args.subscribers + 1))
+    progress = await broadcaster.broadcast(messages, total=args.subscribers, progress_interval=3600)
+    return progress, bot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--serial", type=int, default=200, help="messages to time the serial loop over")
+    parser.add_argument("--latency", type=float, default=0.08, help="simulated Bot API round trip, seconds")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=25, help="broadcast messages per second")
+    args = parser.parse_args()
+
+    serial_rate = asyncio.run(serial(args))
+    progress, bot = asyncio.run(broadcast(args))
+    broadcast_rate = progress.done / progress.elapsed
+    print(f"{'serial loop:':<16}{serial_rate:5.1f} msg/s, 10k subscribers in {10000 / serial_rate / 60:4.1f} min")
+    print(
+        f"{'broadcaster:':<16}{broadcast_rate:5.1f} msg/s, 10k subscribers in {10000 / broadcast_rate / 60:4.1f} min "
+        f"({progress.sent}/{args.subscribers} sent, {bot.rate_limited} 429s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Benchmark the conversation queries with and without the schema indexes.
+
+Fills a throwaway SQLite database with synthetic conversations, then times the
+queries behind /history (get_user_conversations), /conversations/
+(get_all_conversations) and /stats/ (conversations in the last 24 hours) before
+and after creating the indexes from migration 0002. With the indexes in place it
+also compares fetching a page of conversations at increasing depth with offset
+(/conversations/) and keyset (/conversations/page) pagination.
+
+Run from the repository root (the 10M row database takes a few minutes to build and ~2 GB of disk):
+    python -m benchmarks.conversation_query_benchmark --rows 1000000 10000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from src.database import crud
+from src.database.models import Conversation, make_engine
+
+INDEXES = [
+    "CREATE INDEX ix_conversations_user_id_created_at ON conversations (user_id, created_at DESC)",
+    "CREATE INDEX ix_conversations_created_at ON conversations (created_at)",
+]
+
+
+def build_database(path: str, rows: int, users: int, days: int):
+    """Create the pre-index schema and fill it with `rows` conversations spread over `days`."""
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id INTEGER UNIQUE, first_name VARCHAR, "
+        "last_name VARCHAR, username VARCHAR, created_at DATETIME, last_interaction DATETIME, "
+        "subscribed_to_tips BOOLEAN, language VARCHAR(5), timezone VARCHAR(64), delivery_failures INTEGER, "
+        "next_delivery_at DATETIME)"
+    )
+    conn.execute(
+        "CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER, message TEXT, "
+        "response TEXT, topic VARCHAR, created_at DATETIME)"
+    )
+    now = datetime.datetime.utcnow()
+    conn.executemany(
+        "INSERT INTO users (id, telegram_id, created_at, last_interaction, subscribed_to_tips, language) "
+        "VALUES (?, ?, ?, ?, 0, 'en')",
+        ((user_id, 100000 + user_id, now, now) for user_id in range(1, users + 1))
+    )
+
+    start = now - datetime.timedelta(days=days)
+    step = days * 86400 / rows
+    topics = ["feng_shui", "mbti", "iching", "bazi", "ziwei", "general"]
+    chunk = 100000
+    for offset in range(0, rows, chunk):
+        conn.executemany(
+            "INSERT INTO conversations (user_id, message, response, topic, created_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    rng.randint(1, users),
+                    f"Question {n}",
+                    "A short synthetic answer about harmony and balance.",
+                    rng.choice(topics),
+                    # Same text format SQLAlchemy stores DateTime values in on SQLite
+                    (start + datetime.timedelta(seconds=n * step)).strftime("%Y-%m-%d %H:%M:%S.%f")
+                )
+                for n in range(offset, min(rows, offset + chunk))
+            )
+        )
+        conn.commit()
+    conn.close()
+
+
+def time_queries(Session, users: int, repeats: int) -> dict:
+    rng = random.Random(7)
+    timings = {"user history": [], "latest page": [], "stats 24h count": []}
+    for _ in range(repeats):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            crud.get_user_conversations(db, telegram_id=100000 + rng.randint(1, users), limit=10)
+            timings["user history"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            crud.get_all_conversations(db, skip=0, limit=100)
+            timings["latest page"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+            db.query(Conversation).filter(Conversation.created_at >= yesterday).count()
+            timings["stats 24h count"].append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def time_pages(Session, rows: int, repeats: int, page_size: int = 100) -> list:
+    """Time one page at several depths with offset and with keyset pagination."""
+    results = []
+    for depth in (0, rows // 10, rows // 2, rows - page_size):
+        db = Session()
+        try:
+            # The id of the row just before the page, as the previous page's cursor would carry
+            key = None
+            if depth:
+                key = crud.get_all_conversations(db, skip=depth - 1, limit=1)[0].id
+
+            offset_times, keyset_times = [], []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                offset_page = crud.get_all_conversations(db, skip=depth, limit=page_size)
+                offset_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                keyset_page = crud.get_conversations_page(db, limit=page_size, after=key)
+                keyset_times.append(time.perf_counter() - started)
+            assert offset_page[0].created_at == keyset_page[0].created_at
+            results.append((depth, statistics.median(offset_times), statistics.median(keyset_times)))
+        finally:
+            db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeats", type=int, default=5, help="runs per query; the median is reported")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        database.close()
+        os.unlink(database.name)
+
+        started = time.perf_counter()
+        build_database(database.name, rows, args.users, args.days)
+        print(f"{rows:,} conversations ({args.users:,} users), built in {time.perf_counter() - started:.0f}s")
+
+        engine = make_engine(f"sqlite:///{database.name}")
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        before = time_queries(Session, args.users, args.repeats)
+
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for statement in INDEXES:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("ANALYZE")
+        indexing = time.perf_counter() - started
+        after = time_queries(Session, args.users, args.repeats)
+
+        for name in before:
+            print(
+                f"  {name + ':':<22}{before[name] * 1000:9.2f} ms -> {after[name] * 1000:7.2f} ms "
+                f"({before[name] / after[name]:.0f}x)"
+            )
+        print(f"  {'index build:':<22}{indexing:9.1f} s")
+        for depth, offset, keyset in time_pages(Session, rows, args.repeats):
+            print(f"  {f'page at row {depth:,}:':<22}offset {offset * 1000:8.2f} ms, keyset {keyset * 1000:5.2f} ms")
+
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database.name + suffix):
+                os.unlink(database.name + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark event-loop stalls from database work: inline SessionLocal calls vs run_db.
+
+Simulates concurrent handlers that each log a conversation and read a user's
+history, the two queries on the hot path, while a probe task measures how late
+the event loop wakes it up. Inline calls block the loop for every query and
+commit; run_db moves them to the database thread pool.
+
+Run from the repository root:
+    python -m benchmarks.db_event_loop_benchmark --handlers 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    """Sleep for a fixed interval and record how much later than asked the loop resumed us."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - started - PROBE_INTERVAL))
+
+
+async def run_workload(mode: str, args) -> dict:
+    from src.database.models import SessionLocal
+    from src.database.async_db import run_db
+    from src.database import crud
+    from src.database.conversation_log import ConversationRecord, _write_batch
+
+    def log_conversation(db, telegram_id: int, message: str):
+        # What the conversation log writes, one record per transaction
+        record = ConversationRecord(telegram_id, message, "Answer " * 50, "general", datetime.datetime.utcnow())
+        _write_batch(db, [record])
+
+    async def handler(telegram_id: int, n: int):
+        message = f"Question {n} from {telegram_id}"
+        if mode == "inline":
+            db = SessionLocal()
+            try:
+                log_conversation(db, telegram_id, message)
+                crud.get_user_conversations(db, telegram_id=telegram_id, limit=5)
+            finally:
+                db.close()
+        else:
+            await run_db(log_conversation, telegram_id, message)
+            await run_db(crud.get_user_conversations, telegram_id=telegram_id, limit=5)
+        # Stand-in for the non-database part of a handler (sending the reply)
+        await asyncio.sleep(args.reply_ms / 1000)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(n: int):
+        async with semaphore:
+            await handler(1000 + n % args.users, n)
+
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(n) for n in range(args.handlers)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "stalled": sum(lags),
+        "max": lags[-1] if lags else 0.0,
+        "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0,
+        "mean": statistics.mean(lags) if lags else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", type=int, default=2000, help="simulated handler invocations per mode")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reply-ms", type=float, default=20.0, help="simulated non-database work per handler")
+    args = parser.parse_args()
+
+    # Use a throwaway database; the engine is created at import time
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database.name}"
+    from src.database.models import init_db
+    init_db()
+
+    print(f"Handlers:               {args.handlers} per mode (concurrency {args.concurrency})")
+    for mode in ("inline", "run_db"):
+        result = asyncio.run(run_workload(mode, args))
+        print(
+            f"{mode + ':':<24}{args.handlers / result['elapsed']:.0f} handlers/s, "
+            f"loop stalled {result['stalled'] * 1000:.0f} ms total "
+            f"({result['stalled'] / result['elapsed']:.0%} of wall time), "
+            f"max {result['max'] * 1000:.1f} ms, p99 {result['p99'] * 1000:.1f} ms, "
+            f"mean {result['mean'] * 1000:.2f} ms"
+        )
+    os.unlink(database.name)
+
+
+if __name__ == "__main__":
+    main()
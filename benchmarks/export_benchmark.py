@@ -0,0 +1,107 @@
+"""Benchmark the streaming conversation export against paging through /conversations/page.
+
+Builds a throwaway SQLite database of synthetic conversations (with the schema
+indexes), serves the API with uvicorn in a background thread, then downloads all
+of it from /conversations/export in each format and pages through /conversations/page
+100 rows at a time for comparison (timed over the first --pages pages and
+extrapolated). Peak RSS is the process's, so it covers the server side of the export;
+with the tuned SQLite profile it also counts database pages mapped by mmap_size, so
+run with SQLITE_PROFILE=default to see the export's own memory.
+
+Run from the repository root:
+    python -m benchmarks.export_benchmark --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak if sys.platform == "darwin" else peak * 1024) / 2 ** 20
+
+
+async def run(args):
+    import httpx
+    import uvicorn
+    from src.api.routes import app
+    from src.api.export import pyarrow
+
+    # A real server rather than httpx.ASGITransport, which buffers whole response bodies
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+        formats = ["ndjson", "csv"] + (["parquet"] if pyarrow is not None else [])
+        for export_format in formats:
+            rss_before = peak_rss_mib()
+            started = time.perf_counter()
+            size = 0
+            async with client.stream("GET", "/conversations/export", params={"format": export_format}) as response:
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{'export ' + export_format + ':':<24}{elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s), "
+                f"{size / 2 ** 20:.0f} MiB, peak RSS +{peak_rss_mib() - rss_before:.0f} MiB"
+            )
+        if pyarrow is None:
+            print("export parquet:         skipped (pyarrow not installed)")
+
+        started = time.perf_counter()
+        cursor = None
+        for _ in range(args.pages):
+            params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+            cursor = (await client.get("/conversations/page", params=params)).json()["next_cursor"]
+        elapsed = time.perf_counter() - started
+        total = elapsed / (args.pages * 100) * args.rows
+        print(
+            f"{'paging by 100:':<24}{elapsed / args.pages * 1000:.1f} ms/page, "
+            f"~{total:.0f}s and {args.rows // 100:,} requests for all rows"
+        )
+
+    server.should_exit = True
+    thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--pages", type=int, default=200, help="pages of /conversations/page to time")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # The engine is created at import time, so point it at the throwaway database first
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    database.close()
+    os.unlink(database.name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database.name}"
+
+    import sqlite3
+    from benchmarks.conversation_query_benchmark import INDEXES, build_database
+
+    started = time.perf_counter()
+    build_database(database.name, args.rows, args.users, days=365)
+    conn = sqlite3.connect(database.name)
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.close()
+    print(f"{args.rows:,} conversations, built in {time.perf_counter() - started:.0f}s")
+
+    asyncio.run(run(args))
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database.name + suffix):
+            os.unlink(database.name + suffix)
+
+
+if __name__ == "__main__":
+    main()
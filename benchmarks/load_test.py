@@ -0,0 +1,222 @@
+"""End-to-end load test: synthetic users driven through the real bot handlers.
+
+Starts the OpenAI and Telegram Bot API stubs on local ports, points the bot at them,
+builds the application with create_application() and feeds it updates: each user
+sends /start and then a few free-text messages (handled by `echo`, which streams a
+response through generate_response_stream). No real tokens are spent.
+
+Reports throughput, end-to-end latency percentiles per handler, memory per 1k
+active users and the stub/AIService counters. Run from the repository root:
+    python -m benchmarks.load_test --users 1000 --messages 3 --concurrency 200
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import uvicorn
+
+from benchmarks.openai_stub import StubConfig, create_app as create_openai_stub
+from benchmarks.telegram_stub import TelegramStubConfig, create_app as create_telegram_stub
+
+logger = logging.getLogger("LoadTest")
+
+QUESTIONS = [
+    "What colour should my front door be for wealth?",
+    "How should I arrange my bedroom for better sleep?",
+    "I'm an INFP, what careers suit me?",
+    "What does the hexagram Qian mean for my new business?",
+    "Can you explain my four pillars chart and element balance?",
+    "Which palace in purple star astrology governs relationships?",
+    "What plants bring good energy into a small apartment?",
+    "How do introverts recharge best at work?",
+    "Is this a good year to change jobs?",
+    "Where should I put a mirror in the hallway?",
+]
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak RSS is the best available without /proc (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    """Run an ASGI app on its own thread and event loop so it doesn't compete with the bot's loop."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def make_update(bot, update_id: int, user_id: int, text: str):
+    from telegram import Update
+
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+            "text": text,
+            "entities": entities
+        }
+    }, bot)
+
+
+async def run(args):
+    # The bot reads its configuration at import time, so set it up before importing
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:LOADTEST")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+    os.environ["OPENAI_BASE_URL"] = args.openai_url or f"http://127.0.0.1:{args.openai_port}/v1"
+    os.environ["TELEGRAM_API_BASE_URL"] = args.telegram_url or f"http://127.0.0.1:{args.telegram_port}/bot"
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database.name}"
+
+    openai_stub = telegram_stub = None
+    if not args.openai_url:
+        openai_stub = create_openai_stub(StubConfig(
+            ttft_ms=args.ttft_ms,
+            completion_tokens=args.completion_tokens,
+            tokens_per_second=args.tokens_per_second,
+            rate_limit_rate=args.rate_limit_rate,
+            server_error_rate=args.server_error_rate,
+            seed=1
+        ))
+        start_server(openai_stub, args.openai_port)
+    if not args.telegram_url:
+        telegram_stub = create_telegram_stub(TelegramStubConfig(
+            latency_ms=args.telegram_latency_ms,
+            flood_rate=args.flood_rate,
+            seed=1
+        ))
+        start_server(telegram_stub, args.telegram_port)
+
+    from src.database.models import init_db
+    from src.agent.telegram_bot import create_application, ai_service
+    from src.database.conversation_log import conversation_log
+
+    init_db()
+    application = create_application()
+    await application.initialize()
+
+    rng = random.Random(42)
+    update_ids = iter(range(1, 10 ** 9))
+    latencies = {"start": [], "echo": []}
+    errors = 0
+
+    async def process(kind: str, text: str, user_id: int):
+        nonlocal errors
+        update = make_update(application.bot, next(update_ids), user_id, text)
+        started = time.perf_counter()
+        try:
+            # Same path as updates from polling or the webhook, so the concurrency ceiling applies
+            await application.update_processor.process_update(update, application.process_update(update))
+            latencies[kind].append(time.perf_counter() - started)
+        except Exception as e:
+            errors += 1
+            logger.error(f"Update for user {user_id} failed: {e}")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def user_session(user_id: int):
+        async with semaphore:
+            await process("start", "/start", user_id)
+            for _ in range(args.messages):
+                question = rng.choice(QUESTIONS)
+                if rng.random() >= args.repeat_ratio:
+                    # Make the question unique so caches don't hide the API path
+                    question = f"{question} (asked by user {user_id} #{rng.randrange(10 ** 6)})"
+                await process("echo", question, user_id)
+                if args.think_ms:
+                    await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(1000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()
+
+    updates = sum(len(values) for values in latencies.values())
+    print(f"Users:                  {args.users} ({args.messages} messages each, concurrency {args.concurrency})")
+    print(f"Updates processed:      {updates} in {elapsed:.1f}s ({errors} errors)")
+    print(f"Throughput:             {updates / elapsed:.1f} updates/s")
+    for kind, values in latencies.items():
+        if values:
+            print(
+                f"{kind + ' latency:':<24}p50 {percentile(values, 0.5) * 1000:.0f} ms, "
+                f"p95 {percentile(values, 0.95) * 1000:.0f} ms, "
+                f"p99 {percentile(values, 0.99) * 1000:.0f} ms, "
+                f"mean {statistics.mean(values) * 1000:.0f} ms"
+            )
+    print(f"Memory per 1k users:    {(rss_after - rss_before) / args.users * 1000 / 2 ** 20:.2f} MiB RSS "
+          f"(sessions ~{ai_service.sessions.stats()['approx_bytes'] / args.users * 1000 / 2 ** 20:.2f} MiB)")
+
+    usage = ai_service.get_usage_stats()
+    print(f"OpenAI calls:           {usage['api_calls']} "
+          f"(retries {usage['resilience']['retries']}, coalesced {usage['single_flight']['coalesced']})")
+    if openai_stub is not None:
+        stats = openai_stub.state.stats
+        print(f"OpenAI stub:            {stats.requests} requests, {stats.rate_limited} x 429, "
+              f"{stats.server_errors} x 500, max {stats.max_in_flight} in flight")
+    if telegram_stub is not None:
+        stats = telegram_stub.state.stats
+        calls = ", ".join(f"{method} {count}" for method, count in sorted(stats.calls.items()))
+        print(f"Telegram stub:          {calls}; {stats.flood_errors} flood errors")
+
+    await application.shutdown()
+    await ai_service.close()
+    await conversation_log.close()
+    os.unlink(database.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=3, help="free-text messages per user after /start")
+    parser.add_argument("--concurrency", type=int, default=200, help="users active at the same time")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's messages")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="share of messages asking a common question")
+    parser.add_argument("--ttft-ms", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=20.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--openai-port", type=int, default=8081)
+    parser.add_argument("--telegram-port", type=int, default=8082)
+    parser.add_argument("--openai-url", help="use an already running OpenAI-compatible server instead of the stub")
+    parser.add_argument("--telegram-url", help="use an already running Bot API server instead of the stub")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
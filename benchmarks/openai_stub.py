@@ -0,0 +1,226 @@
+"""Local stand-in for the OpenAI chat completions and embeddings endpoints.
+
+Responses are synthetic text with realistic timing: time to first token follows a
+log-normal distribution, tokens then arrive at a fixed rate, and a configurable
+share of requests fail with 429 (with Retry-After) or 500. Point the bot at it with
+OPENAI_BASE_URL=http://127.0.0.1:8081/v1.
+
+Run standalone from the repository root:
+    python -m benchmarks.openai_stub --port 8081 --ttft-ms 400 --rate-limit-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "harmony energy flow balance element wood fire earth metal water yin yang qi chart palace star "
+    "direction north south east west season fortune career wealth health relationship growth wisdom"
+).split()
+
+
+@dataclass
+class StubConfig:
+    ttft_ms: float = 400.0  # Median time to first token
+    ttft_sigma: float = 0.5  # Log-normal spread of time to first token
+    tokens_per_second: float = 80.0
+    completion_tokens: int = 300  # Mean completion length
+    chunk_tokens: int = 5  # Tokens per streamed chunk
+    rate_limit_rate: float = 0.0  # Share of requests answered with 429
+    server_error_rate: float = 0.0  # Share of requests answered with 500
+    retry_after: float = 1.0  # Retry-After sent with 429s
+    embedding_dim: int = 1536
+    seed: int = None
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    streamed: int = 0
+    rate_limited: int = 0
+    server_errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    embeddings: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    models: dict = field(default_factory=dict)
+
+
+def create_app(config: StubConfig = None) -> FastAPI:
+    """Create the stub server app; its counters are available as `app.state.stats`."""
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    stats = StubStats()
+    app = FastAPI(title="OpenAI stub")
+    app.state.config = config
+    app.state.stats = stats
+
+    def ttft() -> float:
+        return config.ttft_ms / 1000 * math.exp(rng.gauss(0, config.ttft_sigma))
+
+    def completion_length() -> int:
+        return max(1, int(rng.expovariate(1 / config.completion_tokens)))
+
+    def text_for(tokens: int) -> str:
+        # Roughly one token per word
+        return " ".join(rng.choice(WORDS) for _ in range(tokens))
+
+    def injected_error():
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": str(config.retry_after)}
+            )
+        if roll < config.rate_limit_rate + config.server_error_rate:
+            stats.server_errors += 1
+            return JSONResponse(
+                {"error": {"message": "Internal server error (stub)", "type": "server_error"}},
+                status_code=500
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        model = body.get("model", "gpt-4o")
+        stats.models[model] = stats.models.get(model, 0) + 1
+
+        error = injected_error()
+        if error is not None:
+            return error
+
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        tokens = min(completion_length(), body.get("max_tokens") or 4096)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += tokens
+
+        if not body.get("stream"):
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            try:
+                await asyncio.sleep(ttft() + tokens / config.tokens_per_second)
+            finally:
+                stats.in_flight -= 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text_for(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        stats.streamed += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(choices, chunk_usage=None) -> str:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                "usage": chunk_usage
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def events():
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            try:
+                await asyncio.sleep(ttft())
+                yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+                sent = 0
+                while sent < tokens:
+                    size = min(config.chunk_tokens, tokens - sent)
+                    await asyncio.sleep(size / config.tokens_per_second)
+                    yield event([{"index": 0, "delta": {"content": text_for(size) + " "}, "finish_reason": None}])
+                    sent += size
+                yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if include_usage:
+                    yield event([], usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats.in_flight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        stats.embeddings += len(inputs)
+
+        data = []
+        for index, text in enumerate(inputs):
+            # Deterministic per text so repeated questions embed identically
+            vector_rng = random.Random(zlib.crc32(str(text).encode("utf-8")))
+            data.append({
+                "object": "embedding",
+                "index": index,
+                "embedding": [vector_rng.gauss(0, 1) for _ in range(config.embedding_dim)]
+            })
+        tokens = sum(len(str(text)) for text in inputs) // 4
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.__dict__
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--ttft-ms", type=float, default=400.0)
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        ttft_ms=args.ttft_ms,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        retry_after=args.retry_after
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark the semantic cache: hit rate and lookup latency at 100k cached entries.
+
+Run from the repository root:
+    python -m benchmarks.semantic_cache_benchmark --entries 100000 --threshold 0.9
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from src.services.semantic_cache import SemanticCache, HashingEmbedder
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("SemanticCache-Benchmark")
+
+# Question templates that ask the same thing in different words
+TEMPLATES = [
+    "what {aspect} should my {subject} have {goal}",
+    "best {aspect} for my {subject} {goal} feng shui",
+    "which {aspect} is best for the {subject} {goal}",
+    "feng shui {aspect} for a {subject} {goal}",
+    "What {aspect} should I choose for my {subject}, {goal}?",
+]
+
+SUBJECTS = [
+    f"{adjective} {room}"
+    for adjective in ["front", "back", "north", "south", "east", "west", "main", "small", "large", "guest",
+                      "upstairs", "downstairs", "corner", "shared", "home", "rented", "new", "old", "open", "narrow"]
+    for room in ["door", "bedroom", "kitchen", "office", "desk", "hallway", "garden", "balcony", "stairs", "window",
+                 "bathroom", "entrance", "living room", "dining room", "study", "nursery", "garage", "porch", "mirror", "bed"]
+]
+
+ASPECTS = [
+    "colour", "color scheme", "plant", "mirror placement", "lighting", "direction", "element", "crystal",
+    "furniture layout", "artwork", "rug", "curtain", "wall paint", "flooring", "decoration", "water feature",
+    "wind chime", "clock position", "bed position", "desk orientation", "number of plants", "shape", "material",
+    "symbol", "fragrance", "sound", "storage", "clutter rule", "lucky charm", "entry mat",
+]
+
+GOALS = [
+    "for wealth", "for love", "for health", "for career luck", "for good sleep", "for focus", "for harmony",
+    "for fertility", "for protection", "for creativity", "this year", "in winter", "in summer",
+    "for a family", "for a couple", "for a student", "for a business", "for exams", "for travel", "for friendship",
+]
+
+
+def build_corpus(entries: int, rng: random.Random):
+    """Pick `entries` distinct questions, each cached in one randomly chosen phrasing."""
+    questions = [(s, a, g) for s in SUBJECTS for a in ASPECTS for g in GOALS]
+    rng.shuffle(questions)
+    corpus = [(question, rng.randrange(len(TEMPLATES))) for question in questions[:entries]]
+    unseen = questions[entries:]
+    return corpus, unseen
+
+
+def phrase(question, template: int) -> str:
+    subject, aspect, goal = question
+    return TEMPLATES[template].format(subject=subject, aspect=aspect, goal=goal)
+
+
+def answer_for(question) -> str:
+    return "answer:" + "|".join(question)
+
+
+async def run(entries: int, queries: int, threshold: float, use_ann: bool):
+    rng = random.Random(42)
+    cache = SemanticCache(HashingEmbedder(), threshold=threshold,
+                          max_entries_per_scope=entries, use_ann=use_ann)
+
+    corpus, unseen = build_corpus(entries, rng)
+    logger.warning(f"Filling cache with {len(corpus)} entries...")
+
+    start = time.perf_counter()
+    for question, template in corpus:
+        await cache.set("feng_shui", "en", phrase(question, template), answer_for(question))
+    fill_seconds = time.perf_counter() - start
+
+    async def measure(batch):
+        latencies, answers = [], []
+        for question, template in batch:
+            t0 = time.perf_counter()
+            answers.append(await cache.get("feng_shui", "en", phrase(question, template)))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        return latencies, answers
+
+    # Cached questions asked in a different phrasing should hit with the right answer
+    seen = [
+        (question, rng.choice([t for t in range(len(TEMPLATES)) if t != template]))
+        for question, template in rng.sample(corpus, queries)
+    ]
+    seen_latencies, seen_answers = await measure(seen)
+    correct = sum(answer == answer_for(q) for (q, _), answer in zip(seen, seen_answers))
+    wrong = sum(answer is not None and answer != answer_for(q) for (q, _), answer in zip(seen, seen_answers))
+
+    # Questions that were never cached should miss
+    unseen = [(question, rng.randrange(len(TEMPLATES))) for question in unseen[:queries]]
+    unseen_latencies, unseen_answers = await measure(unseen)
+    false_hits = sum(answer is not None for answer in unseen_answers)
+
+    latencies = sorted(seen_latencies + unseen_latencies)
+    print(f"Entries cached:           {len(corpus)} (fill {fill_seconds:.1f}s)")
+    print(f"Index:                    {'HNSW' if cache.stats()['ann'] else 'NumPy brute force'}")
+    print(f"Threshold:                {threshold}")
+    print(f"Paraphrase hit rate:      {correct / max(len(seen), 1):.1%} ({wrong} wrong answers)")
+    if unseen:
+        print(f"False hit rate (unseen):  {false_hits / len(unseen):.1%}")
+    print(f"Lookup latency p50:       {statistics.median(latencies):.2f} ms")
+    print(f"Lookup latency p95:       {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms")
+    print(f"Lookup latency max:       {latencies[-1]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--ann", action="store_true", help="use hnswlib if installed")
+    args = parser.parse_args()
+    asyncio.run(run(args.entries, args.queries, args.threshold, args.ann))
+
+
+if __name__ == "__main__":
+    main()
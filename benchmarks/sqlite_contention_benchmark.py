@@ -0,0 +1,115 @@
+"""Benchmark SQLite write/read contention: the default engine vs the tuned profile.
+
+Writer threads log conversations (as the bot and the scheduler do) while reader
+threads page through history and stats (as the API does), all against one file
+database. Reports throughput, latency and "database is locked" failures per profile.
+
+Run from the repository root:
+    python -m benchmarks.sqlite_contention_benchmark --writers 4 --readers 4 --seconds 10
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.database import crud
+from src.database.conversation_log import ConversationRecord, _write_batch
+from src.database.models import Base, make_engine
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_profile(profile: str, args) -> dict:
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    database.close()
+    # One connection per thread, as the bot's database thread pool is sized to its connection pool
+    engine = make_engine(f"sqlite:///{database.name}", profile=profile, pool_size=args.writers + args.readers)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Seed the users conversations are logged against
+    db = Session()
+    for telegram_id in range(args.users):
+        crud.get_or_create_user(db, telegram_id=telegram_id, username=f"user{telegram_id}")
+    db.close()
+
+    stop = threading.Event()
+    results = {"write": [], "read": []}
+    failures = {"write": 0, "read": 0}
+    lock = threading.Lock()
+
+    def worker(kind: str, n: int):
+        latencies, failed = [], 0
+        i = 0
+        while not stop.is_set():
+            i += 1
+            telegram_id = (n * 7919 + i) % args.users
+            started = time.perf_counter()
+            db = Session()
+            try:
+                if kind == "write":
+                    _write_batch(db, [ConversationRecord(
+                        telegram_id, f"Question {i}", "Answer " * 50, "general", datetime.datetime.utcnow()
+                    )])
+                else:
+                    crud.get_user_conversations(db, telegram_id=telegram_id, limit=10)
+                    crud.get_all_conversations(db, skip=0, limit=20)
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                failed += 1
+                db.rollback()
+            finally:
+                db.close()
+        with lock:
+            results[kind].extend(latencies)
+            failures[kind] += failed
+
+    threads = [threading.Thread(target=worker, args=("write", n)) for n in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=("read", n)) for n in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database.name + suffix):
+            os.unlink(database.name + suffix)
+    return {"results": results, "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration per profile")
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Threads:                {args.writers} writers, {args.readers} readers, {args.seconds:.0f}s per profile")
+    for profile in ("default", "tuned"):
+        outcome = run_profile(profile, args)
+        for kind in ("write", "read"):
+            latencies = outcome["results"][kind]
+            print(
+                f"{f'{profile} {kind}s:':<24}{len(latencies) / args.seconds:.0f} ops/s, "
+                f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+                f"{outcome['failures'][kind]} 'database is locked' failures"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark system prompt construction: per-call rebuild vs the cached PromptRegistry.
+
+Run from the repository root:
+    python -m benchmarks.system_prompt_benchmark --calls 200000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from src.services.prompts import EN_PROMPTS, ZH_PROMPTS, PromptRegistry
+
+TOPICS = ["feng_shui", "mbti", "iching", "bazi", "ziwei", "general"]
+LANGUAGES = ["en", "zh"]
+
+
+def legacy_system_prompt(topic: str, language="en") -> str:
+    """The work AIService._create_system_prompt used to do on every call."""
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    current_year = datetime.now().year
+    current_month = datetime.now().strftime("%B")
+    current_day = datetime.now().day
+
+    zodiac_signs = ["Rat", "Ox", "Tiger", "Rabbit", "Dragon", "Snake", "Horse", "Goat", "Monkey", "Rooster", "Dog", "Pig"]
+    zodiac_signs_zh = ["鼠", "牛", "虎", "兔", "龙", "蛇", "马", "羊", "猴", "鸡", "狗", "猪"]
+    zodiac_index = (current_year - 4) % 12
+
+    if language == "zh":
+        date_info = (
+            f"当前日期：{current_date}\n"
+            f"现在是{current_year}年，{current_month}月，{current_day}日。\n"
+            f"按照中国传统历法，当前是{zodiac_signs_zh[zodiac_index]}年。\n"
+            f"请在回答中考虑这些时间信息。"
+        )
+    else:
+        date_info = (
+            f"Current date: {current_date}\n"
+            f"It is currently {current_month} {current_day}, {current_year}.\n"
+            f"According to the Chinese calendar, it is the Year of the {zodiac_signs[zodiac_index]}.\n"
+            f"Please consider this temporal information in your responses."
+        )
+
+    # Both prompt dicts were rebuilt on every call
+    en_prompts = dict(EN_PROMPTS)
+    zh_prompts = dict(ZH_PROMPTS)
+
+    prompts = zh_prompts if language == 'zh' else en_prompts
+    base_prompt = prompts.get(topic, prompts["general"])
+    return f"{base_prompt}\n\n{date_info}"
+
+
+def measure(fn, requests) -> float:
+    """Get the mean cost of one call in microseconds."""
+    start = time.perf_counter()
+    for topic, language in requests:
+        fn(topic, language)
+    return (time.perf_counter() - start) * 1e6 / len(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    requests = [(rng.choice(TOPICS), rng.choice(LANGUAGES)) for _ in range(args.calls)]
+
+    registry = PromptRegistry()
+    legacy = measure(legacy_system_prompt, requests)
+    cached = measure(registry.system_prompt, requests)
+
+    # Same topic and language twice in a day must give identical bytes for prompt caching
+    stable = all(registry.system_prompt(t, l) is registry.system_prompt(t, l) for t in TOPICS for l in LANGUAGES)
+
+    print(f"Calls:                  {args.calls}")
+    print(f"Per-call rebuild:       {legacy:.2f} us/call")
+    print(f"PromptRegistry:         {cached:.2f} us/call ({legacy / cached:.1f}x faster)")
+    print(f"Byte-stable per day:    {stable}")
+
+
+if __name__ == "__main__":
+    main()
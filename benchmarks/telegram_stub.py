@@ -0,0 +1,138 @@
+"""Local stand-in for the Telegram Bot API.
+
+Accepts the methods the bot calls and answers with minimal valid objects, counting
+calls per method. A share of message edits can be answered with 429 flood-control
+errors to exercise the streaming fallbacks. Point the bot at it with
+TELEGRAM_API_BASE_URL=http://127.0.0.1:8082/bot.
+
+Run standalone from the repository root:
+    python -m benchmarks.telegram_stub --port 8082
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+BOT_USER = {"id": 1000000001, "is_bot": True, "first_name": "StubBot", "username": "stub_bot"}
+
+
+@dataclass
+class TelegramStubConfig:
+    latency_ms: float = 20.0  # Added to every call
+    flood_rate: float = 0.0  # Share of editMessageText calls answered with 429
+    retry_after: int = 1
+    seed: int = None
+
+
+@dataclass
+class TelegramStubStats:
+    calls: dict = field(default_factory=dict)
+    flood_errors: int = 0
+    messages_sent: int = 0
+    characters_sent: int = 0
+
+
+async def _parameters(request: Request) -> dict:
+    """Read Bot API parameters sent as a form (python-telegram-bot) or JSON."""
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body or b"{}")
+
+    # The bot only sends url-encoded forms (no file uploads), so no multipart parser is needed
+    parameters = {}
+    for key, value in parse_qsl(body.decode("utf-8")) + list(request.query_params.items()):
+        # Non-string values are JSON encoded in form requests
+        try:
+            parameters[key] = json.loads(value)
+        except (TypeError, ValueError):
+            parameters[key] = value
+    return parameters
+
+
+def create_app(config: TelegramStubConfig = None) -> FastAPI:
+    """Create the stub Bot API app; its counters are available as `app.state.stats`."""
+    config = config or TelegramStubConfig()
+    rng = random.Random(config.seed)
+    stats = TelegramStubStats()
+    message_ids = itertools.count(1)
+    app = FastAPI(title="Telegram Bot API stub")
+    app.state.config = config
+    app.state.stats = stats
+
+    def message(parameters: dict, message_id=None) -> dict:
+        chat_id = parameters.get("chat_id", 0)
+        return {
+            "message_id": message_id or next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": str(parameters.get("text", ""))
+        }
+
+    @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_method(token: str, method: str, request: Request):
+        try:
+            parameters = await _parameters(request)
+        except ClientDisconnect:
+            return None  # Cancelled by the bot (e.g. a typing indicator task)
+        stats.calls[method] = stats.calls.get(method, 0) + 1
+        if config.latency_ms:
+            await asyncio.sleep(config.latency_ms / 1000)
+
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+
+        if method == "getUpdates":
+            # Nothing to deliver; honour the long-poll timeout so pollers don't spin
+            await asyncio.sleep(min(float(parameters.get("timeout", 0) or 0), 10))
+            return {"ok": True, "result": []}
+
+        if method in ("sendMessage", "sendPhoto", "sendDocument"):
+            stats.messages_sent += 1
+            stats.characters_sent += len(str(parameters.get("text", "")))
+            return {"ok": True, "result": message(parameters)}
+
+        if method == "editMessageText":
+            if rng.random() < config.flood_rate:
+                stats.flood_errors += 1
+                return JSONResponse({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {config.retry_after}",
+                    "parameters": {"retry_after": config.retry_after}
+                }, status_code=429)
+            return {"ok": True, "result": message(parameters, parameters.get("message_id"))}
+
+        # sendChatAction, answerCallbackQuery, setWebhook, deleteWebhook, setMyCommands, ...
+        return {"ok": True, "result": True}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.__dict__
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = TelegramStubConfig(latency_ms=args.latency_ms, flood_rate=args.flood_rate)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,26 @@
 import asyncio
 import uvicorn
+from contextlib import asynccontextmanager, suppress
+from telegram import Update
 from src.agent.telegram_bot import create_application, ai_service
+from src.agent.profiles import profile_cache
 from src.api.routes import app as fastapi_app
+from src.config import (
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEB_CONCURRENCY, LEADER_LOCK_RETRY_SECONDS
+)
 from src.database.models import init_db
+from src.database.conversation_log import conversation_log
 from src.services.scheduler import TipsScheduler
 from src.services.keep_alive import KeepAliveService
 import threading
 import logging
 import os
 
+try:
+    import fcntl  # Used to elect one webhook worker to run the scheduler
+except ImportError:
+    fcntl = None
+
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -16,6 +28,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Served by /stats/
+fastapi_app.state.ai_service = ai_service
+fastapi_app.state.profile_cache = profile_cache
+
 async def run_bot():
     """Run the bot."""
     application = create_application()
@@ -41,6 +57,8 @@ async def run_bot():
         # Clean shutdown
         logger.info("Shutting down bot...")
         await application.stop()
+        await ai_service.close()
+        await conversation_log.close()
 
 # Update this function to use the PORT environment variable
 def run_api():
@@ -49,6 +67,122 @@ def run_api():
     logger.info(f"Starting API server on port {port}")
     uvicorn.run(fastapi_app, host="0.0.0.0", port=port)
 
+def acquire_leader_lock(path="./bot_leader.lock"):
+    """Try to become the one worker that registers the webhook and runs the scheduler.
+    
+    Returns the open lock file (keep it open to hold the lock) or None if another worker has it.
+    """
+    if fcntl is None:
+        return open(path, "a")  # No file locking available; assume a single worker
+    
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+async def set_webhook(application):
+    """Point Telegram at this deployment's webhook route."""
+    await application.bot.set_webhook(
+        url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        allowed_updates=Update.ALL_TYPES
+    )
+    logger.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+def start_tip_scheduler(application):
+    """Start the daily tip scheduler; returns it, or None if it failed to start."""
+    try:
+        scheduler = TipsScheduler(application, ai_service)
+        scheduler.start()
+        logger.info("Tip scheduler started successfully")
+        return scheduler
+    except Exception as e:
+        logger.error(f"Failed to start scheduler: {e}")
+        return None
+
+async def wait_for_leadership(application, leader):
+    """Keep retrying the leader lock in a non-leader worker, and take over once the leader is gone.
+    
+    The lock is released when the leader's process exits (even if it crashes), so without this
+    nobody would send the daily tips again until every worker was restarted.
+    """
+    while True:
+        await asyncio.sleep(LEADER_LOCK_RETRY_SECONDS)
+        leader["lock"] = acquire_leader_lock()
+        if leader["lock"]:
+            break
+    
+    logger.info(f"Worker {os.getpid()} took over as leader")
+    try:
+        await set_webhook(application)
+    except Exception as e:
+        # Not fatal: Telegram keeps delivering to the URL the previous leader registered
+        logger.error(f"Failed to set webhook after taking over as leader: {e}")
+    leader["scheduler"] = start_tip_scheduler(application)
+
+@asynccontextmanager
+async def webhook_lifespan(app):
+    """Run the bot inside the API server's event loop, fed by the webhook route."""
+    application = create_application()
+    await application.initialize()
+    await application.start()  # Processes application.update_queue
+    
+    leader = {"lock": acquire_leader_lock(), "scheduler": None}
+    campaign = None
+    if leader["lock"]:
+        await set_webhook(application)
+        leader["scheduler"] = start_tip_scheduler(application)
+    else:
+        campaign = asyncio.create_task(wait_for_leadership(application, leader))
+    
+    app.state.bot_application = application
+    logger.info(f"Telegram bot started in webhook mode (worker {os.getpid()})")
+    
+    try:
+        yield
+    finally:
+        logger.info("Shutting down bot...")
+        app.state.bot_application = None
+        if campaign:
+            campaign.cancel()
+            with suppress(asyncio.CancelledError):
+                await campaign
+        if leader["scheduler"]:
+            leader["scheduler"].scheduler.shutdown(wait=False)
+        await application.stop()
+        await application.shutdown()
+        await ai_service.close()
+        await conversation_log.close()
+        if leader["lock"]:
+            leader["lock"].close()
+
+if BOT_MODE == "webhook":
+    # Also applies in worker processes, which import this module as "main"
+    fastapi_app.router.lifespan_context = webhook_lifespan
+
+def run_webhook():
+    """Serve the API and the Telegram webhook from one uvicorn server, without polling."""
+    if not WEBHOOK_URL or not WEBHOOK_SECRET_TOKEN:
+        raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET_TOKEN must be set when BOT_MODE=webhook")
+    
+    logger.info("Initializing database...")
+    init_db()
+    
+    logger.info("Starting keep-alive service...")
+    keep_alive = KeepAliveService(interval_minutes=10)
+    keep_alive.start()
+    
+    port = int(os.environ.get("PORT", 8000))
+    logger.info(f"Starting API server with Telegram webhook on port {port} ({WEB_CONCURRENCY} workers)")
+    if WEB_CONCURRENCY > 1:
+        # Workers are separate processes, so uvicorn needs the app's import path
+        uvicorn.run("main:fastapi_app", host="0.0.0.0", port=port, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(fastapi_app, host="0.0.0.0", port=port)
+
 async def main():
     """Run both the bot and API server."""
     # Initialize the database
@@ -72,7 +206,10 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if BOT_MODE == "webhook":
+            run_webhook()
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped by user")
     except Exception as e:
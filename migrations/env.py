@@ -0,0 +1,58 @@
+from logging.config import fileConfig
+from alembic import context
+
+from src.database.models import Base, engine
+
+config = context.config
+
+# Only configure logging when run from the alembic command line, not from init_db()
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations(connection):
+    sqlite = connection.dialect.name == "sqlite"
+    if sqlite:
+        # Batch mode drops and recreates tables, which enforced foreign keys would refuse
+        # (e.g. dropping users while conversations reference it); only takes effect outside a transaction
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        connection.commit()
+    try:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # So a model default that differs from the migrations' shows up in `alembic check`
+            compare_server_default=True,
+            # SQLite can't ALTER constraints in place; batch mode recreates the table instead
+            render_as_batch=sqlite
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+        connection.commit()
+    finally:
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+            connection.commit()
+
+
+def run_migrations_offline():
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=engine.dialect.name == "sqlite"
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif "connection" in config.attributes:
+    # Called from init_db() with an open connection
+    run_migrations(config.attributes["connection"])
+else:
+    with engine.connect() as connection:
+        run_migrations(connection)
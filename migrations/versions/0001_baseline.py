@@ -0,0 +1,50 @@
+"""Baseline: users and conversations as created by Base.metadata.create_all
+
+Databases created before migrations were introduced already have these tables,
+so each one is only created if it's missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("telegram_id", sa.Integer(), unique=True),
+            sa.Column("first_name", sa.String(), nullable=True),
+            sa.Column("last_name", sa.String(), nullable=True),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("last_interaction", sa.DateTime()),
+            sa.Column("subscribed_to_tips", sa.Boolean()),
+            sa.Column("language", sa.String(5))
+        )
+    
+    if "conversations" not in tables:
+        op.create_table(
+            "conversations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer()),
+            sa.Column("message", sa.Text()),
+            sa.Column("response", sa.Text()),
+            sa.Column("topic", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime())
+        )
+
+
+def downgrade():
+    op.drop_table("conversations")
+    op.drop_table("users")
@@ -0,0 +1,36 @@
+"""Index conversations by (user_id, created_at) and created_at; user_id references users.id
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Conversations whose user no longer exists would violate the new foreign key
+    op.execute(
+        "UPDATE conversations SET user_id = NULL "
+        "WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT id FROM users)"
+    )
+    
+    # On SQLite this recreates the table (batch mode), since constraints can't be added in place
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.create_foreign_key("fk_conversations_user_id_users", "users", ["user_id"], ["id"])
+    
+    # Created after the batch, which can't copy expression (DESC) indexes
+    op.create_index("ix_conversations_user_id_created_at", "conversations", ["user_id", sa.text("created_at DESC")])
+    op.create_index("ix_conversations_created_at", "conversations", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_conversations_created_at", table_name="conversations")
+    op.drop_index("ix_conversations_user_id_created_at", table_name="conversations")
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.drop_constraint("fk_conversations_user_id_users", type_="foreignkey")
@@ -0,0 +1,55 @@
+"""Broadcast jobs and their per-recipient delivery ledger
+
+Revision ID: 0004
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "broadcast_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("key", sa.String(), nullable=False, unique=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("parse_mode", sa.String(), nullable=True),
+        sa.Column("total", sa.Integer()),
+        sa.Column("sent", sa.Integer()),
+        sa.Column("failed", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True)
+    )
+    op.create_table(
+        "broadcast_deliveries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("job_id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("language", sa.String(5), nullable=False),
+        sa.Column("variant", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["job_id"], ["broadcast_jobs.id"], name="fk_broadcast_deliveries_job_id_broadcast_jobs"
+        ),
+        sa.UniqueConstraint("job_id", "chat_id", name="uq_broadcast_deliveries_job_id_chat_id")
+    )
+    op.create_index(
+        "ix_broadcast_deliveries_job_id_status_id", "broadcast_deliveries", ["job_id", "status", "id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_broadcast_deliveries_job_id_status_id", table_name="broadcast_deliveries")
+    op.drop_table("broadcast_deliveries")
+    op.drop_table("broadcast_jobs")
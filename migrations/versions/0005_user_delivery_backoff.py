@@ -0,0 +1,24 @@
+"""Track failed tip deliveries per user for backoff
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("delivery_failures", sa.Integer(), server_default=sa.text("0")))
+    op.add_column("users", sa.Column("next_delivery_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("next_delivery_at")
+        batch_op.drop_column("delivery_failures")
@@ -0,0 +1,29 @@
+"""User timezones and scheduled send times for broadcast jobs
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("timezone", sa.String(64), nullable=True))
+    op.create_index("ix_users_timezone", "users", ["timezone"])
+    op.add_column("broadcast_jobs", sa.Column("send_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_broadcast_jobs_kind_status_send_at", "broadcast_jobs", ["kind", "status", "send_at"])
+
+
+def downgrade():
+    op.drop_index("ix_broadcast_jobs_kind_status_send_at", table_name="broadcast_jobs")
+    op.drop_index("ix_users_timezone", table_name="users")
+    with op.batch_alter_table("broadcast_jobs") as batch_op:
+        batch_op.drop_column("send_at")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("timezone")
@@ -3,9 +3,9 @@ import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ChatAction
-from ...database.models import SessionLocal
-from ...database import crud
+from ...database.conversation_log import conversation_log
 from ..conversation_states import BA_ZI_ASSESSMENT, BA_ZI_BIRTHDATE
+from ..streaming import stream_reply
 
 logger = logging.getLogger(__name__)
 
@@ -19,23 +19,7 @@ async def ba_zi_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Set the current topic
     context.user_data['current_topic'] = 'bazi'
@@ -66,17 +50,12 @@ async def ba_zi_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
     
     # Log this interaction
-    db = SessionLocal()
-    try:
-        crud.log_conversation(
-            db, 
-            user_id, 
-            "/bazi", 
-            response_text,
-            'bazi'
-        )
-    finally:
-        db.close()
+    await conversation_log.log(
+        user_id, 
+        "/bazi", 
+        response_text,
+        'bazi'
+    )
     
     await update.message.reply_text(
         response_text,
@@ -248,48 +227,10 @@ async def generate_ba_zi_results(update: Update, context: ContextTypes.DEFAULT_T
                 f"Keep your response under 1500 characters total."
             )
         
-        # Generate AI response
-        ai_service = get_ai_service()
-        response = await ai_service.generate_response('bazi', user_query, update.effective_user.id, language)
-        
-        # Store the assessment context for follow-up questions
-        if language == 'zh':
-            context_summary = f"{user_name}的八字命理分析，出生于{birth['year']}年{birth['month']}月{birth['day']}日。年柱：{year_pillar}。"
-        else:
-            context_summary = f"BaZi analysis for {user_name}, born on {birth['month']}/{birth['day']}/{birth['year']}. Year Pillar: {year_pillar}."
-            
-        ai_service.store_assessment_result(update.effective_user.id, 'bazi', context_summary)
-        
-        # Limit the response length
-        if len(response) > 2000:
-            response = response[:1997] + "..."
-        
-        # Add personal touches to the response - keep it short
-        if language == 'zh':
-            personalized_response = (
-                f"🔮 <b>{user_name}的八字命理分析</b> 🔮\n\n"
-                f"<b>出生日期：</b> {birth['year']}年{birth['month']}月{birth['day']}日\n"
-                f"<b>{chart}</b>\n\n"
-                f"{response}\n\n"
-                f"您想了解关于您命理中特定方面的更多信息吗？"
-            )
-        else:
-            personalized_response = (
-                f"🔮 <b>BaZi Analysis for {user_name}</b> 🔮\n\n"
-                f"<b>Birth Date:</b> {birth['month']}/{birth['day']}/{birth['year']}\n"
-                f"<b>{chart}</b>\n\n"
-                f"{response}\n\n"
-                f"Would you like to know more about any specific aspect of your reading?"
-            )
-        
-        # Ensure the total message is within Telegram limits
-        if len(personalized_response) > 4000:
-            # Further trim if still too long
-            excess = len(personalized_response) - 3950
-            response = response[:-excess] + "..."
-            
+        def layout(response):
+            """Add personal touches to the response - keep it short."""
             if language == 'zh':
-                personalized_response = (
+                return (
                     f"🔮 <b>{user_name}的八字命理分析</b> 🔮\n\n"
                     f"<b>出生日期：</b> {birth['year']}年{birth['month']}月{birth['day']}日\n"
                     f"<b>{chart}</b>\n\n"
@@ -297,7 +238,7 @@ async def generate_ba_zi_results(update: Update, context: ContextTypes.DEFAULT_T
                     f"您想了解关于您命理中特定方面的更多信息吗？"
                 )
             else:
-                personalized_response = (
+                return (
                     f"🔮 <b>BaZi Analysis for {user_name}</b> 🔮\n\n"
                     f"<b>Birth Date:</b> {birth['month']}/{birth['day']}/{birth['year']}\n"
                     f"<b>{chart}</b>\n\n"
@@ -305,20 +246,44 @@ async def generate_ba_zi_results(update: Update, context: ContextTypes.DEFAULT_T
                     f"Would you like to know more about any specific aspect of your reading?"
                 )
         
-        # Store this assessment in the database
-        db = SessionLocal()
-        try:
-            crud.log_conversation(
-                db, update.effective_user.id, 
-                f"BaZi reading", 
-                personalized_response[:500] + "...",  # Store truncated version
-                'bazi'
-            )
-        finally:
-            db.close()
+        def render(response):
+            """Render the (partial) AI response as the personalized reading."""
+            # Limit the response length
+            if len(response) > 2000:
+                response = response[:1997] + "..."
+            
+            personalized_response = layout(response)
+            
+            # Ensure the total message is within Telegram limits
+            if len(personalized_response) > 4000:
+                # Further trim if still too long
+                excess = len(personalized_response) - 3950
+                personalized_response = layout(response[:-excess] + "...")
+            
+            return personalized_response
+        
+        # Stream the AI response into the reading as it's generated
+        ai_service = get_ai_service()
+        chunks = ai_service.generate_response_stream('bazi', user_query, update.effective_user.id, language)
+        response = await stream_reply(update.message, chunks, render=render, parse_mode="HTML")
+        
+        # Store the assessment context for follow-up questions
+        if language == 'zh':
+            context_summary = f"{user_name}的八字命理分析，出生于{birth['year']}年{birth['month']}月{birth['day']}日。年柱：{year_pillar}。"
+        else:
+            context_summary = f"BaZi analysis for {user_name}, born on {birth['month']}/{birth['day']}/{birth['year']}. Year Pillar: {year_pillar}."
+            
+        ai_service.store_assessment_result(update.effective_user.id, 'bazi', context_summary)
+        
+        personalized_response = render(response)
         
-        # Send the response
-        await update.message.reply_text(personalized_response, parse_mode="HTML")
+        # Store this assessment in the database
+        await conversation_log.log(
+            update.effective_user.id,
+            f"BaZi reading", 
+            personalized_response[:500] + "...",  # Store truncated version
+            'bazi'
+        )
         
         return ConversationHandler.END
         
@@ -1,31 +1,20 @@
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from ...database.models import SessionLocal
-from ...database import crud
-from ...services.ai_service import AIService
 from ..conversation_states import FENG_SHUI_ROOM, FENG_SHUI_DIRECTIONS
+from ..streaming import stream_reply
 from telegram.ext import ConversationHandler
 logger = logging.getLogger(__name__)
-ai_service = AIService()
+
+# Function to get AI service safely
+def get_ai_service():
+    from ..telegram_bot import ai_service
+    return ai_service
 
 async def fengshui_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Provide general feng shui information."""
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Set the current topic
     context.user_data['current_topic'] = 'feng_shui'
@@ -199,15 +188,16 @@ async def feng_shui_directions(update: Update, context: ContextTypes.DEFAULT_TYP
         )
     
     try:
-        # Generate detailed response
-        assessment_response = await ai_service.generate_response('feng_shui', prompt, language=language)
+        ai_service = get_ai_service()
+        
+        # Stream the detailed response as it's generated
+        chunks = ai_service.generate_response_stream('feng_shui', prompt, language=language)
+        await stream_reply(update.message, chunks)
         
         # Store this assessment result for potential follow-ups
         assessment_context = f"{name}'s {room_name} facing {directions}"
         ai_service.store_assessment_result(update.effective_user.id, 'feng_shui', assessment_context)
         
-        await update.message.reply_text(assessment_response)
-        
         # Send a follow-up message asking if they want more information
         if language == 'zh':
             await update.message.reply_text(
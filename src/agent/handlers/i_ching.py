@@ -1,13 +1,13 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ChatAction
-from ...database.models import SessionLocal
-from ...database import crud
+from ...database.conversation_log import conversation_log
 import logging
 import random
 
 # Import conversation states
 from ..conversation_states import I_CHING_ASSESSMENT, I_CHING_QUESTION
+from ..streaming import stream_reply
 from telegram.ext import ConversationHandler
 logger = logging.getLogger(__name__)
 
@@ -21,23 +21,7 @@ async def i_ching_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'  # Default to English
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Set the current topic
     context.user_data['current_topic'] = 'iching'
@@ -70,17 +54,12 @@ async def i_ching_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
     
     # Log this interaction
-    db = SessionLocal()
-    try:
-        crud.log_conversation(
-            db, 
-            user_id, 
-            "/iching", 
-            response_text,
-            'iching'
-        )
-    finally:
-        db.close()
+    await conversation_log.log(
+        user_id, 
+        "/iching", 
+        response_text,
+        'iching'
+    )
     
     await update.message.reply_text(
         response_text,
@@ -254,67 +233,15 @@ async def generate_i_ching_results(update: Update, context: ContextTypes.DEFAULT
         )
     
     try:
-        # Generate AI response
-        ai_service = get_ai_service()
-        response = await ai_service.generate_response('iching', user_query, update.effective_user.id, language)
-        
-        # Store the assessment context for follow-up questions
-        if language == 'zh':
-            context_summary = (
-                f"{user_name}的易经解读，问题：'{question}'。"
-                f"主卦第{primary}卦"
-                f"{f'，变卦第{secondary}卦' if changing_lines else ''}。"
-                f"变爻：{', '.join(map(str, changing_lines)) if changing_lines else '无'}。"
-            )
-        else:
-            context_summary = (
-                f"I-Ching reading for {user_name}'s question: '{question}'. "
-                f"Primary hexagram #{primary}"
-                f"{f', changing to #{secondary}' if changing_lines else ''}. "
-                f"Changing lines: {', '.join(map(str, changing_lines)) if changing_lines else 'None'}."
-            )
-        ai_service.store_assessment_result(update.effective_user.id, 'iching', context_summary)
-        
-        # Limit the response length
-        if len(response) > 2000:
-            response = response[:1997] + "..."
-        
         # Truncate question if it's too long
-        if len(question) > 100:
-            question = question[:97] + "..."
-        
-        # Add personal touches to the response - keep it short and concise
-        if language == 'zh':
-            personalized_response = (
-                f"🔮 <b>{user_name}的易经解读</b> 🔮\n\n"
-                f"<b>问题：</b> {question}\n\n"
-                f"<b>卦象：</b> 第{primary}卦"
-                f"{f' → 第{secondary}卦' if changing_lines else ''}\n"
-                f"<b>变爻：</b> {', '.join(map(str, changing_lines)) if changing_lines else '无'}\n\n"
-                f"{response}\n\n"
-                f"您想了解更多关于这个解读的详情吗？"
-            )
-        else:
-            personalized_response = (
-                f"🔮 <b>{user_name}'s I-Ching Reading</b> 🔮\n\n"
-                f"<b>Question:</b> {question}\n\n"
-                f"<b>Hexagram:</b> #{primary}"
-                f"{f' → #{secondary}' if changing_lines else ''}\n"
-                f"<b>Lines:</b> {', '.join(map(str, changing_lines)) if changing_lines else 'None'}\n\n"
-                f"{response}\n\n"
-                f"Would you like more details about this reading?"
-            )
+        display_question = question if len(question) <= 100 else question[:97] + "..."
         
-        # Ensure the total message is within Telegram limits
-        if len(personalized_response) > 4000:
-            # Further trim if still too long
-            excess = len(personalized_response) - 3950
-            response = response[:-excess] + "..."
-            
+        def layout(response):
+            """Add personal touches to the response - keep it short and concise."""
             if language == 'zh':
-                personalized_response = (
+                return (
                     f"🔮 <b>{user_name}的易经解读</b> 🔮\n\n"
-                    f"<b>问题：</b> {question}\n\n"
+                    f"<b>问题：</b> {display_question}\n\n"
                     f"<b>卦象：</b> 第{primary}卦"
                     f"{f' → 第{secondary}卦' if changing_lines else ''}\n"
                     f"<b>变爻：</b> {', '.join(map(str, changing_lines)) if changing_lines else '无'}\n\n"
@@ -322,9 +249,9 @@ async def generate_i_ching_results(update: Update, context: ContextTypes.DEFAULT
                     f"您想了解更多关于这个解读的详情吗？"
                 )
             else:
-                personalized_response = (
+                return (
                     f"🔮 <b>{user_name}'s I-Ching Reading</b> 🔮\n\n"
-                    f"<b>Question:</b> {question}\n\n"
+                    f"<b>Question:</b> {display_question}\n\n"
                     f"<b>Hexagram:</b> #{primary}"
                     f"{f' → #{secondary}' if changing_lines else ''}\n"
                     f"<b>Lines:</b> {', '.join(map(str, changing_lines)) if changing_lines else 'None'}\n\n"
@@ -332,20 +259,53 @@ async def generate_i_ching_results(update: Update, context: ContextTypes.DEFAULT
                     f"Would you like more details about this reading?"
                 )
         
-        # Store this assessment in the database
-        db = SessionLocal()
-        try:
-            crud.log_conversation(
-                db, update.effective_user.id, 
-                f"I-Ching reading: Hexagram {primary}", 
-                personalized_response[:500] + "...",  # Store truncated version in database 
-                'iching'
+        def render(response):
+            """Render the (partial) AI response as the personalized reading."""
+            # Limit the response length
+            if len(response) > 2000:
+                response = response[:1997] + "..."
+            
+            personalized_response = layout(response)
+            
+            # Ensure the total message is within Telegram limits
+            if len(personalized_response) > 4000:
+                # Further trim if still too long
+                excess = len(personalized_response) - 3950
+                personalized_response = layout(response[:-excess] + "...")
+            
+            return personalized_response
+        
+        # Stream the AI response into the reading as it's generated
+        ai_service = get_ai_service()
+        chunks = ai_service.generate_response_stream('iching', user_query, update.effective_user.id, language)
+        response = await stream_reply(update.message, chunks, render=render, parse_mode="HTML")
+        
+        # Store the assessment context for follow-up questions
+        if language == 'zh':
+            context_summary = (
+                f"{user_name}的易经解读，问题：'{question}'。"
+                f"主卦第{primary}卦"
+                f"{f'，变卦第{secondary}卦' if changing_lines else ''}。"
+                f"变爻：{', '.join(map(str, changing_lines)) if changing_lines else '无'}。"
             )
-        finally:
-            db.close()
+        else:
+            context_summary = (
+                f"I-Ching reading for {user_name}'s question: '{question}'. "
+                f"Primary hexagram #{primary}"
+                f"{f', changing to #{secondary}' if changing_lines else ''}. "
+                f"Changing lines: {', '.join(map(str, changing_lines)) if changing_lines else 'None'}."
+            )
+        ai_service.store_assessment_result(update.effective_user.id, 'iching', context_summary)
+        
+        personalized_response = render(response)
         
-        # Send the response
-        await update.message.reply_text(personalized_response, parse_mode="HTML")
+        # Store this assessment in the database
+        await conversation_log.log(
+            update.effective_user.id,
+            f"I-Ching reading: Hexagram {primary}", 
+            personalized_response[:500] + "...",  # Store truncated version in database 
+            'iching'
+        )
         
         return ConversationHandler.END
         
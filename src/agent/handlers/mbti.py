@@ -1,12 +1,12 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ChatAction
-from ...database.models import SessionLocal
-from ...database import crud
+from ...database.conversation_log import conversation_log
 import logging
 
 # Import conversation states
 from ..conversation_states import MBTI_QUESTION_1, MBTI_QUESTION_2, MBTI_QUESTION_3, MBTI_QUESTION_4
+from ..streaming import stream_to_message
 from telegram.ext import ConversationHandler
 logger = logging.getLogger(__name__)
 
@@ -20,23 +20,7 @@ async def mbti_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Set the current topic in user data
     context.user_data['current_topic'] = 'mbti'
@@ -68,17 +52,12 @@ async def mbti_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
     
     # Log this interaction
-    db = SessionLocal()
-    try:
-        crud.log_conversation(
-            db, 
-            user_id, 
-            "/mbti", 
-            response_text,
-            'mbti'
-        )
-    finally:
-        db.close()
+    await conversation_log.log(
+        user_id, 
+        "/mbti", 
+        response_text,
+        'mbti'
+    )
     
     await update.message.reply_text(
         response_text,
@@ -299,69 +278,59 @@ async def generate_mbti_results(update: Update, context: ContextTypes.DEFAULT_TY
         )
     
     try:
-        # Generate AI response with language preference
-        ai_service = get_ai_service()
-        response = await ai_service.generate_response('mbti', user_query, update.effective_user.id, language)
-        
-        # Store the assessment context for follow-up questions
-        if language == 'zh':
-            context_summary = f"{user_name}的MBTI评估，人格类型为{mbti_type}。"
-        else:
-            context_summary = f"MBTI assessment for {user_name} with personality type {mbti_type}."
-            
-        ai_service.store_assessment_result(update.effective_user.id, 'mbti', context_summary)
-        
-        # Limit the response length
-        if len(response) > 1500:
-            response = response[:1497] + "..."
-        
-        # Add personal touches to the response - keep it concise with language preference
-        if language == 'zh':
-            personalized_response = (
-                f"🧠 <b>{user_name}的MBTI人格档案：{mbti_type}</b> 🧠\n\n"
-                f"{response}\n\n"
-                f"您想了解更多关于您的MBTI类型的优势、职业或人际关系方面的具体信息吗？"
-            )
-        else:
-            personalized_response = (
-                f"🧠 <b>{user_name}'s MBTI Personality Profile: {mbti_type}</b> 🧠\n\n"
-                f"{response}\n\n"
-                f"Would you like more specific information about your MBTI type's strengths, careers, or relationships?"
-            )
-        
-        # Ensure the total message is within Telegram limits
-        if len(personalized_response) > 4000:
-            # Further trim if still too long
-            excess = len(personalized_response) - 3950
-            response = response[:-excess] + "..."
-            
+        def layout(response):
+            """Add personal touches to the response - keep it concise with language preference."""
             if language == 'zh':
-                personalized_response = (
+                return (
                     f"🧠 <b>{user_name}的MBTI人格档案：{mbti_type}</b> 🧠\n\n"
                     f"{response}\n\n"
                     f"您想了解更多关于您的MBTI类型的优势、职业或人际关系方面的具体信息吗？"
                 )
             else:
-                personalized_response = (
+                return (
                     f"🧠 <b>{user_name}'s MBTI Personality Profile: {mbti_type}</b> 🧠\n\n"
                     f"{response}\n\n"
                     f"Would you like more specific information about your MBTI type's strengths, careers, or relationships?"
                 )
         
-        # Store this assessment in the database
-        db = SessionLocal()
-        try:
-            crud.log_conversation(
-                db, update.effective_user.id, 
-                f"MBTI assessment result: {mbti_type}", 
-                personalized_response[:500] + "...",  # Store a truncated version in the database
-                'mbti'
-            )
-        finally:
-            db.close()
+        def render(response):
+            """Render the (partial) AI response as the personality profile."""
+            # Limit the response length
+            if len(response) > 1500:
+                response = response[:1497] + "..."
+            
+            personalized_response = layout(response)
+            
+            # Ensure the total message is within Telegram limits
+            if len(personalized_response) > 4000:
+                # Further trim if still too long
+                excess = len(personalized_response) - 3950
+                personalized_response = layout(response[:-excess] + "...")
+            
+            return personalized_response
+        
+        # Stream the AI response into the question message as it's generated
+        ai_service = get_ai_service()
+        chunks = ai_service.generate_response_stream('mbti', user_query, update.effective_user.id, language)
+        response = await stream_to_message(update.callback_query.message, chunks, render=render, parse_mode="HTML")
+        
+        # Store the assessment context for follow-up questions
+        if language == 'zh':
+            context_summary = f"{user_name}的MBTI评估，人格类型为{mbti_type}。"
+        else:
+            context_summary = f"MBTI assessment for {user_name} with personality type {mbti_type}."
+            
+        ai_service.store_assessment_result(update.effective_user.id, 'mbti', context_summary)
+        
+        personalized_response = render(response)
         
-        # Send the response
-        await update.callback_query.edit_message_text(personalized_response, parse_mode="HTML")
+        # Store this assessment in the database
+        await conversation_log.log(
+            update.effective_user.id,
+            f"MBTI assessment result: {mbti_type}", 
+            personalized_response[:500] + "...",  # Store a truncated version in the database
+            'mbti'
+        )
         
         return ConversationHandler.END
         
@@ -1,8 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
-from ...database.models import SessionLocal
-from ...database import crud
+from ...database.conversation_log import conversation_log
 
 async def mythology_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /mythology command."""
@@ -22,17 +21,12 @@ async def mythology_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['current_topic'] = 'mythology'
     
     # Log this interaction
-    db = SessionLocal()
-    try:
-        crud.log_conversation(
-            db, 
-            user_id, 
-            "/mythology", 
-            response_text,
-            'mythology'
-        )
-    finally:
-        db.close()
+    await conversation_log.log(
+        user_id, 
+        "/mythology", 
+        response_text,
+        'mythology'
+    )
     
     await update.message.reply_text(
         response_text,
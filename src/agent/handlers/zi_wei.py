@@ -1,14 +1,14 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ChatAction
-from ...database.models import SessionLocal
-from ...database import crud
+from ...database.conversation_log import conversation_log
 import logging
 import datetime
 from math import floor
 
 # Import conversation states
 from ..conversation_states import ZI_WEI_ASSESSMENT, ZI_WEI_BIRTHDATE, ZI_WEI_BIRTHTIME
+from ..streaming import stream_reply
 from telegram.ext import ConversationHandler
 logger = logging.getLogger(__name__)
 
@@ -22,23 +22,7 @@ async def zi_wei_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Set the current topic in user data
     context.user_data['current_topic'] = 'ziwei'
@@ -69,17 +53,12 @@ async def zi_wei_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
     
     # Log this interaction
-    db = SessionLocal()
-    try:
-        crud.log_conversation(
-            db, 
-            user_id, 
-            "/ziwei", 
-            response_text,
-            'ziwei'
-        )
-    finally:
-        db.close()
+    await conversation_log.log(
+        user_id, 
+        "/ziwei", 
+        response_text,
+        'ziwei'
+    )
     
     await update.message.reply_text(
         response_text,
@@ -382,9 +361,45 @@ async def generate_zi_wei_results(update: Update, context: ContextTypes.DEFAULT_
                 f"Keep the response under 1500 characters total."
             )
         
-        # Generate AI response
+        def layout(response):
+            """Add personal touches to the response - keep it shorter with language support."""
+            if language == 'zh':
+                return (
+                    f"⭐ <b>{user_name}的紫微斗数命盘</b> ⭐\n\n"
+                    f"{chart_text}\n"
+                    f"<b>您的分析：</b>\n\n"
+                    f"{response}\n\n"
+                    f"您想了解关于您命盘中其他宫位的信息吗？"
+                )
+            else:
+                return (
+                    f"⭐ <b>{user_name}'s Zi Wei Dou Shu Chart</b> ⭐\n\n"
+                    f"{chart_text}\n"
+                    f"<b>Your Analysis:</b>\n\n"
+                    f"{response}\n\n"
+                    f"Would you like information about other palaces in your chart?"
+                )
+        
+        def render(response):
+            """Render the (partial) AI response as the personalized chart reading."""
+            # Limit the AI response length
+            if len(response) > 2000:
+                response = response[:1997] + "..."
+            
+            personalized_response = layout(response)
+            
+            # Ensure the total message is within Telegram limits
+            if len(personalized_response) > 4000:
+                # Further trim if still too long
+                excess = len(personalized_response) - 3950
+                personalized_response = layout(response[:-excess] + "...")
+            
+            return personalized_response
+        
+        # Stream the AI response into the reading as it's generated
         ai_service = get_ai_service()
-        response = await ai_service.generate_response('ziwei', user_query, update.effective_user.id, language)
+        chunks = ai_service.generate_response_stream('ziwei', user_query, update.effective_user.id, language)
+        response = await stream_reply(update.message, chunks, render=render, parse_mode="HTML")
         
         # Store the assessment context for follow-up questions
         if language == 'zh':
@@ -402,65 +417,15 @@ async def generate_zi_wei_results(update: Update, context: ContextTypes.DEFAULT_
         
         ai_service.store_assessment_result(update.effective_user.id, 'ziwei', context_summary)
         
-        # Limit the AI response length
-        if len(response) > 2000:
-            response = response[:1997] + "..."
-        
-        # Add personal touches to the response - keep it shorter with language support
-        if language == 'zh':
-            personalized_response = (
-                f"⭐ <b>{user_name}的紫微斗数命盘</b> ⭐\n\n"
-                f"{chart_text}\n"
-                f"<b>您的分析：</b>\n\n"
-                f"{response}\n\n"
-                f"您想了解关于您命盘中其他宫位的信息吗？"
-            )
-        else:
-            personalized_response = (
-                f"⭐ <b>{user_name}'s Zi Wei Dou Shu Chart</b> ⭐\n\n"
-                f"{chart_text}\n"
-                f"<b>Your Analysis:</b>\n\n"
-                f"{response}\n\n"
-                f"Would you like information about other palaces in your chart?"
-            )
-        
-        # Ensure the total message is within Telegram limits
-        if len(personalized_response) > 4000:
-            # Further trim if still too long
-            excess = len(personalized_response) - 3950
-            response = response[:-excess] + "..."
-            
-            if language == 'zh':
-                personalized_response = (
-                    f"⭐ <b>{user_name}的紫微斗数命盘</b> ⭐\n\n"
-                    f"{chart_text}\n"
-                    f"<b>您的分析：</b>\n\n"
-                    f"{response}\n\n"
-                    f"您想了解关于您命盘中其他宫位的信息吗？"
-                )
-            else:
-                personalized_response = (
-                    f"⭐ <b>{user_name}'s Zi Wei Dou Shu Chart</b> ⭐\n\n"
-                    f"{chart_text}\n"
-                    f"<b>Your Analysis:</b>\n\n"
-                    f"{response}\n\n"
-                    f"Would you like information about other palaces in your chart?"
-                )
+        personalized_response = render(response)
         
         # Store this assessment in the database
-        db = SessionLocal()
-        try:
-            crud.log_conversation(
-                db, update.effective_user.id, 
-                f"Zi Wei Dou Shu reading", 
-                personalized_response[:500] + "...",  # Store a truncated version in the database
-                'ziwei'
-            )
-        finally:
-            db.close()
-        
-        # Send the response
-        await update.message.reply_text(personalized_response, parse_mode="HTML")
+        await conversation_log.log(
+            update.effective_user.id,
+            f"Zi Wei Dou Shu reading", 
+            personalized_response[:500] + "...",  # Store a truncated version in the database
+            'ziwei'
+        )
         
         return ConversationHandler.END
         
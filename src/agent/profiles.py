@@ -0,0 +1,80 @@
+import logging
+from cachetools import TTLCache
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from ..config import PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_MAX_USERS
+from ..database.async_db import run_db
+from ..database import crud
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "en"
+
+
+class ProfileCache:
+    """In-process TTL cache of user profiles, loaded from the users table on a miss.
+
+    Writes that change a profile (e.g. /language) go through `set_language` so this
+    process sees them straight away, other profile writes (e.g. /timezone) call `invalidate`
+    so the next lookup reloads the row; other workers pick them up when their entry expires.
+    """
+
+    def __init__(self, max_users: int = 50000, ttl: float = 600):
+        self._languages = TTLCache(maxsize=max_users, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    async def language(self, telegram_id: int) -> str:
+        """Get the user's preferred language, reading the database only on a cache miss."""
+        language = self._languages.get(telegram_id)
+        if language is not None:
+            self.hits += 1
+            return language
+        
+        self.misses += 1
+        language = await self._load_language(telegram_id)
+        if language is None:
+            # Don't cache the default when the database is unavailable
+            return DEFAULT_LANGUAGE
+        self._languages[telegram_id] = language
+        return language
+
+    async def set_language(self, telegram_id: int, language: str):
+        """Write a new language through to the cache and the database."""
+        # Cache first, so this process uses the new language even if the database write fails
+        self._languages[telegram_id] = language
+        await run_db(crud.update_user_language, telegram_id=telegram_id, language=language)
+
+    def invalidate(self, telegram_id: int):
+        """Drop a user's cached profile after it was written elsewhere."""
+        self._languages.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._languages),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    @staticmethod
+    async def _load_language(telegram_id: int):
+        """Read the language from the database, or None if the lookup failed."""
+        try:
+            return await run_db(crud.get_user_language, telegram_id=telegram_id)
+        except Exception as e:
+            logger.error(f"Error fetching user language: {e}")
+            return None
+
+
+profile_cache = ProfileCache(max_users=PROFILE_CACHE_MAX_USERS, ttl=PROFILE_CACHE_TTL_SECONDS)
+
+
+async def resolve_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Runs before every other handler (group -1) and puts the user's language in context.user_data."""
+    user = update.effective_user
+    if user is None or context.user_data is None:
+        return
+    context.user_data['language'] = await profile_cache.language(user.id)
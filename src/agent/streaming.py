@@ -0,0 +1,123 @@
+"""Progressive display of streamed AI responses via throttled message edits."""
+import asyncio
+import contextlib
+import logging
+import time
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from ..config import STREAM_RESPONSES, STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than 4096 characters
+MAX_MESSAGE_LENGTH = 4000
+
+# Shown while waiting for the first tokens, and appended to partial text
+PLACEHOLDER_TEXT = "✍️ ..."
+CURSOR = " ▌"
+
+# Replaces the placeholder when the response came back empty (Telegram rejects empty messages)
+EMPTY_RESPONSE_TEXT = "⚠️ Sorry, no response was generated. Please try again.\n抱歉，未能生成回复。请稍后再试。"
+
+
+def truncate_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """Trim text so it fits in a single Telegram message."""
+    if len(text) > limit:
+        return text[:limit - 3] + "..."
+    return text
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    """Get the back-off requested by Telegram in seconds."""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        retry_after = retry_after.total_seconds()
+    return float(retry_after)
+
+
+async def _safe_edit(message, text, parse_mode=None) -> bool:
+    """Edit a message, tolerating no-op edits and backing off when rate limited."""
+    try:
+        await message.edit_text(text, parse_mode=parse_mode)
+        return True
+    except RetryAfter as e:
+        logger.warning(f"Edit rate limited, waiting {_retry_seconds(e)}s")
+        await asyncio.sleep(_retry_seconds(e))
+        return False
+    except BadRequest as e:
+        # Telegram rejects edits that don't change the text
+        if "not modified" in str(e).lower():
+            return True
+        logger.debug(f"Interim edit rejected: {e}")
+        return False
+    except NetworkError as e:
+        # A timeout or dropped connection only costs this edit; the next one shows the text
+        logger.warning(f"Edit failed with a network error, skipping it: {e}")
+        return False
+
+
+async def stream_to_message(message, chunks, render=None, parse_mode=None) -> str:
+    """Edit an existing message as response chunks arrive.
+
+    `chunks` is an async iterator of text deltas (e.g. AIService.generate_response_stream).
+    `render` turns the accumulated response into the message text, so callers can wrap
+    the AI output in headers and footers. Returns the full raw response text.
+    """
+    render = render or truncate_message
+    text = ""
+    shown = None
+    last_edit = 0.0
+
+    # Closed even if an edit fails, so the response stream gives back its admission slot
+    async with contextlib.aclosing(chunks):
+        async for delta in chunks:
+            text += delta
+
+            # The first edit goes out immediately, the rest are throttled
+            if not STREAM_RESPONSES or time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+                continue
+
+            partial = render(text + CURSOR)
+            if partial != shown:
+                await _safe_edit(message, partial, parse_mode=parse_mode)
+                shown = partial
+                last_edit = time.monotonic()
+
+    # Final edit with the complete, formatted response
+    final = render(text)
+    if not text.strip():
+        final, parse_mode = EMPTY_RESPONSE_TEXT, None
+    for _ in range(3):
+        if final == shown:
+            break
+        try:
+            await message.edit_text(final, parse_mode=parse_mode)
+            break
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_seconds(e))
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                # Formatting problems shouldn't lose the answer, fall back to plain text
+                logger.error(f"Final edit failed, resending without formatting: {e}")
+                if not await _safe_edit(message, final):
+                    logger.error("Plain text final edit failed, keeping the last partial response")
+            break
+        except NetworkError as e:
+            logger.warning(f"Final edit failed with a network error, retrying: {e}")
+
+    return text
+
+
+async def stream_reply(message, chunks, render=None, parse_mode=None) -> str:
+    """Reply to a message with a placeholder and progressively fill it with the streamed response."""
+    if not STREAM_RESPONSES:
+        # Streaming disabled: wait for the whole response and reply once
+        async with contextlib.aclosing(chunks):
+            text = "".join([delta async for delta in chunks])
+        if not text.strip():
+            await message.reply_text(EMPTY_RESPONSE_TEXT)
+        else:
+            await message.reply_text((render or truncate_message)(text), parse_mode=parse_mode)
+        return text
+    
+    placeholder = await message.reply_text(PLACEHOLDER_TEXT)
+    return await stream_to_message(placeholder, chunks, render=render, parse_mode=parse_mode)
@@ -1,17 +1,25 @@
 from telegram import Update
 from telegram.constants import ChatAction
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ConversationHandler, CallbackQueryHandler
 import logging
 import asyncio
+from datetime import datetime
 
 
-from ..config import TELEGRAM_BOT_TOKEN
+from ..config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE_URL, UPDATE_CONCURRENCY, DAILY_TIP_HOUR, DAILY_TIP_TIMEZONE,
+)
 from .handlers import feng_shui, mbti, i_ching, ba_zi, zi_wei
 from ..services.ai_service import AIService
-from ..database.models import SessionLocal
+from .update_processor import PerChatUpdateProcessor
+from .profiles import profile_cache, resolve_profile
+from .streaming import stream_reply
+from ..database.async_db import run_db
+from ..database.conversation_log import conversation_log
 from ..database import crud
+from ..services.timezones import normalize_timezone, get_tzinfo
 
 # Import the conversation states
 from .conversation_states import *
@@ -128,23 +136,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = user.id
     
     # Store user in database
-    db = SessionLocal()
-    try:
-        crud.get_or_create_user(
-            db, 
-            telegram_id=user_id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
-        )
-        
-        # Check language preference
-        db_user = crud.get_user(db, telegram_id=user_id)
-        language = db_user.language if hasattr(db_user, 'language') else 'en'
-        context.user_data['language'] = language
-        
-    finally:
-        db.close()
+    await run_db(
+        crud.get_or_create_user,
+        telegram_id=user_id,
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name
+    )
+    
+    # Language preference, resolved before the handlers run
+    language = context.user_data.get('language', 'en')
     
     if language == 'zh':
         await update.message.reply_text(
@@ -180,22 +181,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /help is issued."""
     # Determine language for help text
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception:
-            language = 'en'  # Default on error
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     if language == 'zh':
         await update.message.reply_text(
@@ -213,6 +199,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             "📬 /subscribe - 查看每日提示订阅状态\n"
             "   /subscribe on - 订阅每日提示\n"
             "   /subscribe off - 取消订阅每日提示\n"
+            "🕘 /timezone - 设置接收每日提示的时区\n"
             "❓ 您可以直接询问任何与这些主题相关的问题！"
         )
     else:
@@ -231,6 +218,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             "📬 /subscribe - Check subscription status for daily tips\n"
             "   /subscribe on - Subscribe to daily tips\n"
             "   /subscribe off - Unsubscribe from daily tips\n"
+            "🕘 /timezone - Set the timezone daily tips arrive in\n"
             "❓ Just ask me any question related to these topics!"
         )
         
@@ -262,28 +250,14 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
+    language = context.user_data.get('language', 'en')
     
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=user_id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'  # Default to English on error
-        finally:
-            db.close()
-    
-    db = SessionLocal()
     try:
+        # Write any queued conversations first so the latest ones are included
+        await conversation_log.flush()
+        
         # Get recent conversations
-        conversations = crud.get_user_conversations(db, telegram_id=user_id, limit=5)
+        conversations = await run_db(crud.get_user_conversations, telegram_id=user_id, limit=5)
         
         if not conversations:
             if language == 'zh':
@@ -343,31 +317,13 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text("我现在无法检索您的对话历史记录。")
         else:
             await update.message.reply_text("I couldn't retrieve your conversation history right now.")
-    finally:
-        db.close()
         
 async def topic_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Change the current topic."""
     args = context.args
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=update.effective_user.id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     if not args:
         if language == 'zh':
@@ -396,8 +352,7 @@ async def topic_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     context.user_data['current_topic'] = topic
     
     # Reset the chat session for this user to start fresh with the new topic
-    if hasattr(ai_service, 'chat_sessions') and update.effective_user.id in ai_service.chat_sessions:
-        del ai_service.chat_sessions[update.effective_user.id]
+    ai_service.reset_chat_session(update.effective_user.id)
     
     # Get topic emoji
     topic_emojis = {
@@ -436,23 +391,7 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=user_id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'  # Default to English on error
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Determine the topic based on message content or use 'general'
     topic = 'general'
@@ -490,20 +429,15 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
     
     try:
-        # Generate AI response with user_id to maintain chat history and language preference
-        response = await ai_service.generate_response(topic, user_message, user_id, language)
-        
-        # Store the conversation in the database
-        db = SessionLocal()
-        try:
-            crud.log_conversation(db, user_id, user_message, response, topic)
-        finally:
-            db.close()
+        # Stream the AI response into a placeholder message, keeping chat history and language preference
+        chunks = ai_service.generate_response_stream(topic, user_message, user_id, language)
+        response = await stream_reply(update.message, chunks)
         
-        # Cancel the typing indicator task since we're ready to send the response
+        # Cancel the typing indicator task since the full response is shown
         typing_task.cancel()
-            
-        await update.message.reply_text(response)
+        
+        # Store the conversation in the database
+        await conversation_log.log(user_id, user_message, response, topic)
         
     except Exception as e:
         # Cancel typing indicator on error
@@ -540,28 +474,10 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
-    
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=user_id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
+    language = context.user_data.get('language', 'en')
     
     # Clear the chat session
-    if hasattr(ai_service, 'chat_sessions') and user_id in ai_service.chat_sessions:
-        del ai_service.chat_sessions[user_id]
-        
+    if ai_service.reset_chat_session(user_id):
         if language == 'zh':
             await update.message.reply_text("🔄 我已重置我们的对话。您现在想谈论什么？")
         else:
@@ -577,28 +493,11 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
     
     # Get user language preference
-    language = context.user_data.get('language', None)
+    language = context.user_data.get('language', 'en')
     
-    if not language:
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user(db, telegram_id=user_id)
-            if db_user and hasattr(db_user, 'language'):
-                language = db_user.language
-                # Cache it in context
-                context.user_data['language'] = language
-            else:
-                language = 'en'  # Default to English
-        except Exception as e:
-            logger.error(f"Error fetching user language: {e}")
-            language = 'en'
-        finally:
-            db.close()
-    
-    db = SessionLocal()
     try:
         # Get current user
-        user = crud.get_user(db, telegram_id=user_id)
+        user = await run_db(crud.get_user, telegram_id=user_id)
         if not user:
             if language == 'zh':
                 await update.message.reply_text(
@@ -683,7 +582,7 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 return
         
         # Update user subscription status
-        crud.update_user_subscription(db, telegram_id=user_id, subscribed=new_status)
+        await run_db(crud.update_user_subscription, telegram_id=user_id, subscribed=new_status)
         
         if new_status:
             if language == 'zh':
@@ -714,8 +613,81 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text(
                 "⚠️ There was an error processing your subscription. Please try again later."
             )
-    finally:
-        db.close()
+
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show or set the timezone daily tips are delivered in."""
+    user_id = update.effective_user.id
+    language = context.user_data.get('language', 'en')
+    
+    try:
+        user = await run_db(crud.get_user, telegram_id=user_id)
+        if not user:
+            if language == 'zh':
+                await update.message.reply_text(
+                    "⚠️ 我找不到您的用户资料。请使用 /start 先设置您的资料。"
+                )
+            else:
+                await update.message.reply_text(
+                    "⚠️ I couldn't find your user profile. Please use /start to set up your profile first."
+                )
+            return
+        
+        if not context.args:
+            # No arguments, so just show the current setting
+            current = user.timezone or DAILY_TIP_TIMEZONE
+            if language == 'zh':
+                await update.message.reply_text(
+                    f"🕘 您的时区：{current}{'' if user.timezone else '（默认）'}\n"
+                    f"每日提示将在您当地时间 {DAILY_TIP_HOUR:02d}:00 发送。\n\n"
+                    "要更改，请使用 /timezone 加上时区名称或UTC偏移，例如：\n"
+                    "/timezone Asia/Shanghai\n"
+                    "/timezone +8"
+                )
+            else:
+                await update.message.reply_text(
+                    f"🕘 Your timezone: {current}{'' if user.timezone else ' (default)'}\n"
+                    f"Daily tips arrive at {DAILY_TIP_HOUR:02d}:00 your time.\n\n"
+                    "To change it, use /timezone with a timezone name or UTC offset, for example:\n"
+                    "/timezone Europe/London\n"
+                    "/timezone -5"
+                )
+            return
+        
+        timezone = normalize_timezone(" ".join(context.args))
+        if timezone is None:
+            if language == 'zh':
+                await update.message.reply_text(
+                    "⚠️ 无法识别该时区。请使用时区名称（如 Asia/Shanghai）或UTC偏移（如 +8 或 -03:30）。"
+                )
+            else:
+                await update.message.reply_text(
+                    "⚠️ I don't recognise that timezone. Use a name like Europe/London or an offset like +8 or -03:30."
+                )
+            return
+        
+        await run_db(crud.update_user_timezone, telegram_id=user_id, timezone=timezone)
+        profile_cache.invalidate(user_id)
+        local_time = datetime.now(get_tzinfo(timezone)).strftime("%H:%M")
+        
+        if language == 'zh':
+            await update.message.reply_text(
+                f"✅ 时区已设置为 {timezone}（当地时间 {local_time}）。每日提示将在您当地时间 {DAILY_TIP_HOUR:02d}:00 发送。"
+            )
+        else:
+            await update.message.reply_text(
+                f"✅ Timezone set to {timezone} (it's {local_time} there). "
+                f"Daily tips will arrive at {DAILY_TIP_HOUR:02d}:00 your time."
+            )
+    except Exception as e:
+        logger.error(f"Error handling timezone: {e}")
+        if language == 'zh':
+            await update.message.reply_text(
+                "⚠️ 设置时区时出错。请稍后再试。"
+            )
+        else:
+            await update.message.reply_text(
+                "⚠️ There was an error setting your timezone. Please try again later."
+            )
 
 async def start_assessment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start a personalized assessment."""
@@ -724,29 +696,7 @@ async def start_assessment(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     
     try:
         # Get user language preference
-        language = context.user_data.get('language', None)
-        logger.info(f"ASSESS COMMAND: Initial language from context: {language}")
-        
-        if not language:
-            db = SessionLocal()
-            try:
-                logger.info("ASSESS COMMAND: Fetching language from database")
-                db_user = crud.get_user(db, telegram_id=user_id)
-                if db_user and hasattr(db_user, 'language'):
-                    language = db_user.language
-                    # Cache it in context
-                    context.user_data['language'] = language
-                    logger.info(f"ASSESS COMMAND: Found language in DB: {language}")
-                else:
-                    language = 'en'  # Default to English
-                    logger.info("ASSESS COMMAND: No language in DB, defaulting to English")
-            except Exception as e:
-                logger.error(f"ASSESS COMMAND: Database error: {e}")
-                language = 'en'  # Default on error
-            finally:
-                db.close()
-                logger.info("ASSESS COMMAND: Database connection closed")
-        
+        language = context.user_data.get('language', 'en')
         logger.info(f"ASSESS COMMAND: Using language: {language}")
             
         # Create buttons based on language
@@ -912,29 +862,20 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Get current language
-    db = SessionLocal()
-    try:
-        user = crud.get_user(db, telegram_id=user_id)
-        current_lang = user.language if user and hasattr(user, 'language') else 'en'
-        
-        if current_lang == 'en':
-            message = (
-                "🌐 <b>Language Settings</b>\n\n"
-                "Your current language is set to: <b>English</b>\n\n"
-                "Select your preferred language:"
-            )
-        else:
-            message = (
-                "🌐 <b>语言设置</b>\n\n"
-                "您当前的语言设置为: <b>中文</b>\n\n"
-                "请选择您偏好的语言:"
-            )
-            
-    except Exception as e:
-        logger.error(f"Error checking language preference: {e}")
-        message = "🌐 Select your preferred language:"
-    finally:
-        db.close()
+    current_lang = context.user_data.get('language', 'en')
+    
+    if current_lang == 'en':
+        message = (
+            "🌐 <b>Language Settings</b>\n\n"
+            "Your current language is set to: <b>English</b>\n\n"
+            "Select your preferred language:"
+        )
+    else:
+        message = (
+            "🌐 <b>语言设置</b>\n\n"
+            "您当前的语言设置为: <b>中文</b>\n\n"
+            "请选择您偏好的语言:"
+        )
     
     await update.message.reply_text(
         message,
@@ -972,25 +913,12 @@ async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         except Exception as edit_err:
             logger.error(f"Failed to edit message with temporary text: {edit_err}")
         
-        # Store language preference in database
-        db = None
+        # Store language preference in the database and the profile cache
         try:
-            db = SessionLocal()
-            logger.info("Database session created")
-            
-            # Update language in database
-            crud.update_user_language(db, telegram_id=user_id, language=language)
+            await profile_cache.set_language(user_id, language)
             logger.info(f"Language updated in database for user {user_id}")
-            
-            # Close DB connection manually to ensure it doesn't block
-            db.close()
-            db = None
-            logger.info("Database connection closed")
-            
         except Exception as db_err:
             logger.error(f"Database error: {db_err}", exc_info=True)
-            if db:
-                db.close()
         
         # Store in context for immediate use
         context.user_data['language'] = language
@@ -1072,13 +1000,8 @@ async def restart_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Reset the AI session for this user
     try:
-        if hasattr(ai_service, 'reset_chat_session'):
-            ai_service.reset_chat_session(user_id)
+        if ai_service.reset_chat_session(user_id):
             logger.info(f"AI chat session reset for user {user_id}")
-        
-        if hasattr(ai_service, 'chat_sessions') and user_id in ai_service.chat_sessions:
-            del ai_service.chat_sessions[user_id]
-            logger.info(f"AI chat session deleted for user {user_id}")
     except Exception as e:
         logger.error(f"Error resetting AI session: {e}")
     
@@ -1111,10 +1034,18 @@ def create_application():
     # Create the Application with longer timeouts for API calls
     builder = Application.builder()
     builder.token(TELEGRAM_BOT_TOKEN)
+    if TELEGRAM_API_BASE_URL:
+        builder.base_url(TELEGRAM_API_BASE_URL)
     builder.connect_timeout(30.0)
     builder.read_timeout(30.0)
+    # Handle different chats in parallel so one slow AI call doesn't hold up everyone else
+    if UPDATE_CONCURRENCY > 1:
+        builder.concurrent_updates(PerChatUpdateProcessor(UPDATE_CONCURRENCY))
     application = builder.build()
     
+    # Resolve the user's profile (language) once per update, before any other handler
+    application.add_handler(TypeHandler(Update, resolve_profile), group=-1)
+    
     # Add debug command to test basic functionality
     application.add_handler(CommandHandler("debug", debug_command))
 
@@ -1177,6 +1108,7 @@ def create_application():
     application.add_handler(CommandHandler("history", history_command))
     application.add_handler(CommandHandler("reset", reset_command))
     application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
     
     # Add specific topic handlers
     application.add_handler(CommandHandler("fengshui", feng_shui.fengshui_command))
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different chats concurrently, and updates from the same chat in order.
+
+    Per-chat ordering keeps ConversationHandler state consistent (e.g. an assessment
+    answer is never handled before the question that led to it). At most
+    `max_concurrent_updates` handlers run at once. Updates waiting behind an earlier
+    update from the same chat don't count against that ceiling, so one busy chat
+    can't starve the others; `max_pending_updates` bounds everything in flight.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = None):
+        super().__init__(max_pending_updates or max_concurrent_updates * 16)
+        self.max_running = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chats = {}
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = _ChatQueue()
+        chat.pending += 1
+        try:
+            # asyncio.Lock is FIFO, so updates run in the order they arrived
+            async with chat.lock, self._running:
+                await coroutine
+        finally:
+            chat.pending -= 1
+            if not chat.pending:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        logger.info(f"Processing up to {self.max_running} updates concurrently, ordered per chat")
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "active_chats": len(self._chats),
+            "pending_updates": sum(chat.pending for chat in self._chats.values()),
+            "max_running": self.max_running
+        }
+
+    @staticmethod
+    def _ordering_key(update: object):
+        """Get the chat (or user) whose updates must stay ordered, or None for unordered updates."""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        return None
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from ..database.models import User, Conversation
+
+try:
+    import pyarrow  # Optional; only needed for Parquet exports
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ["id", "telegram_id", "topic", "created_at", "message", "response"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+
+def export_statement(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     topic: Optional[str] = None, telegram_id: Optional[int] = None):
+    """Select conversations for export, oldest first, as plain rows (no ORM objects)."""
+    statement = select(
+        Conversation.id,
+        User.telegram_id,
+        Conversation.topic,
+        Conversation.created_at,
+        Conversation.message,
+        Conversation.response
+    ).outerjoin(User, User.id == Conversation.user_id)
+
+    if since is not None:
+        statement = statement.where(Conversation.created_at >= since)
+    if until is not None:
+        statement = statement.where(Conversation.created_at < until)
+    if topic is not None:
+        statement = statement.where(Conversation.topic == topic)
+    if telegram_id is not None:
+        statement = statement.where(User.telegram_id == telegram_id)
+    return statement.order_by(Conversation.created_at, Conversation.id)
+
+
+class NDJSONWriter:
+    """One JSON object per line."""
+
+    def header(self) -> bytes:
+        return b""
+
+    def write(self, rows) -> bytes:
+        lines = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            if record["created_at"] is not None:
+                record["created_at"] = record["created_at"].isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def close(self) -> bytes:
+        return b""
+
+
+class CSVWriter:
+    """CSV with a header row."""
+
+    def header(self) -> bytes:
+        return self._encode([COLUMNS])
+
+    def write(self, rows) -> bytes:
+        return self._encode(rows)
+
+    def close(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _encode(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are taken out after each row group."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ParquetWriter:
+    """Parquet, one row group per batch, streamed as each row group is finished."""
+
+    def __init__(self):
+        self.schema = pyarrow.schema([
+            ("id", pyarrow.int64()),
+            ("telegram_id", pyarrow.int64()),
+            ("topic", pyarrow.string()),
+            ("created_at", pyarrow.timestamp("us")),
+            ("message", pyarrow.string()),
+            ("response", pyarrow.string())
+        ])
+        self._sink = _DrainableSink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def write(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        self._writer.write_batch(pyarrow.record_batch(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def create_writer(export_format: str):
+    """Create the writer for a format; raises ValueError if it isn't available."""
+    if export_format == "ndjson":
+        return NDJSONWriter()
+    if export_format == "csv":
+        return CSVWriter()
+    if export_format == "parquet":
+        if pyarrow is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        return ParquetWriter()
+    raise ValueError(f"Unknown export format '{export_format}'")
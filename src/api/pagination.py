@@ -0,0 +1,20 @@
+import base64
+import json
+
+
+def encode_cursor(row_id: int) -> str:
+    """Make an opaque cursor pointing just past the row with this id."""
+    payload = json.dumps([row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Get the row id back from a cursor; raises ValueError if it's malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        (row_id,) = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise ValueError("cursor id must be an integer")
+        return row_id
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
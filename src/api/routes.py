@@ -1,42 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database.models import SessionLocal, User, Conversation
+import hmac
+import logging
+from fastapi import FastAPI, HTTPException, Request, Header, Query
+from fastapi.responses import StreamingResponse
+from telegram import Update
+from ..config import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+from ..database.models import User, Conversation
+from ..database.async_db import run_db, stream_db
+from ..database.conversation_log import conversation_log
 from ..database import crud
-from typing import List
+from .pagination import encode_cursor, decode_cursor
+from .export import MEDIA_TYPES, create_writer, export_statement
+from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Feng Shui Bot API")
 
+# The running python-telegram-bot Application in webhook mode (set by main.py)
+app.state.bot_application = None
+# The bot's AIService, whose usage counters /stats/ reports (set by main.py)
+app.state.ai_service = None
+# The bot's profile cache, also reported by /stats/ (set by main.py)
+app.state.profile_cache = None
+
 # Pydantic models for API responses
 class UserBase(BaseModel):
     telegram_id: int
-    username: str = None
-    first_name: str = None
-    last_name: str = None
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
     
     class Config:
         orm_mode = True
 
 class ConversationBase(BaseModel):
     id: int
-    user_id: int
+    user_id: Optional[int] = None
     message: str
     response: str
-    topic: str = None
-    created_at: datetime
+    topic: Optional[str] = None
+    created_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
+class UserPage(BaseModel):
+    items: List[UserBase]
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page; null on the last page
+
+class ConversationPage(BaseModel):
+    items: List[ConversationBase]
+    next_cursor: Optional[str] = None
+
+def _after(cursor: Optional[str]):
+    """Get the id a page starts after, or None for the first page."""
+    if cursor is None:
+        return None
     try:
-        yield db
-    finally:
-        db.close()
-        
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page(rows: list, limit: int) -> dict:
+    """Build a page from up to limit + 1 rows; the extra row only tells us there's a next page."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
+
 @app.get("/health")
 async def health():
     """Health check endpoint for monitoring services like Render."""
@@ -52,29 +86,80 @@ async def root():
     }
 
 @app.get("/users/", response_model=List[UserBase])
-async def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_all_users(db, skip=skip, limit=limit)
+async def get_users(skip: int = 0, limit: int = 100):
+    users = await run_db(crud.get_all_users, skip=skip, limit=limit)
     return users
 
+@app.get("/users/page", response_model=UserPage)
+async def get_users_page(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    """List users oldest first, a page at a time; follow `next_cursor` for the next page.
+    
+    Unlike /users/ with `skip`, a page costs the same however deep it is.
+    """
+    users = await run_db(crud.get_users_page, limit=limit + 1, after=_after(cursor))
+    return _page(users, limit)
+
 @app.get("/user/{telegram_id}", response_model=UserBase)
-async def get_user(telegram_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, telegram_id=telegram_id)
+async def get_user(telegram_id: int):
+    user = await run_db(crud.get_user, telegram_id=telegram_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.get("/conversations/", response_model=List[ConversationBase])
-async def get_conversations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    conversations = crud.get_all_conversations(db, skip=skip, limit=limit)
+async def get_conversations(skip: int = 0, limit: int = 100):
+    conversations = await run_db(crud.get_all_conversations, skip=skip, limit=limit)
     return conversations
 
+@app.get("/conversations/page", response_model=ConversationPage)
+async def get_conversations_page(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    """List conversations newest first, a page at a time; follow `next_cursor` for the next page.
+    
+    Unlike /conversations/ with `skip`, a page costs the same however deep it is.
+    """
+    conversations = await run_db(crud.get_conversations_page, limit=limit + 1, after=_after(cursor))
+    return _page(conversations, limit)
+
+@app.get("/conversations/export")
+async def export_conversations(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv|parquet)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    topic: Optional[str] = None,
+    telegram_id: Optional[int] = None,
+    batch_size: int = Query(5000, ge=100, le=50000)
+):
+    """Stream conversations (oldest first) as NDJSON, CSV or Parquet in one response.
+    
+    Rows are read with a server-side cursor and written a batch at a time, so memory
+    stays flat however many rows match. `since` is inclusive and `until` exclusive.
+    """
+    try:
+        writer = create_writer(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    statement = export_statement(since=since, until=until, topic=topic, telegram_id=telegram_id)
+    
+    async def body():
+        yield writer.header()
+        # Serializing runs with the fetch on the database threads, off the event loop
+        async for chunk in stream_db(statement, batch_size=batch_size, transform=writer.write):
+            yield chunk
+        yield writer.close()
+    
+    filename = f"conversations-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/user/{telegram_id}/conversations/", response_model=List[ConversationBase])
-async def get_user_conversations(telegram_id: int, limit: int = 10, db: Session = Depends(get_db)):
-    conversations = crud.get_user_conversations(db, telegram_id=telegram_id, limit=limit)
+async def get_user_conversations(telegram_id: int, limit: int = 10):
+    conversations = await run_db(crud.get_user_conversations, telegram_id=telegram_id, limit=limit)
     return conversations
 
-@app.get("/stats/")
-async def get_stats(db: Session = Depends(get_db)):
+def _collect_stats(db):
     # Basic statistics
     total_users = db.query(User).count()
     total_conversations = db.query(Conversation).count()
@@ -91,4 +176,43 @@ async def get_stats(db: Session = Depends(get_db)):
         "total_conversations": total_conversations,
         "active_users_24h": active_users,
         "conversations_24h": recent_conversations
-    }
\ No newline at end of file
+    }
+
+@app.get("/stats/")
+async def get_stats():
+    stats = await run_db(_collect_stats)
+    # Queued, written and dropped conversation logs of this process
+    stats["conversation_log"] = conversation_log.stats()
+    # Tokens, caches, admission queue and circuit breaker of this process (each worker has its own)
+    if app.state.ai_service is not None:
+        stats["ai_service"] = app.state.ai_service.get_usage_stats()
+    if app.state.profile_cache is not None:
+        stats["profile_cache"] = app.state.profile_cache.stats()
+    return stats
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """Receive an update from Telegram and queue it for the bot on this event loop."""
+    # Telegram echoes the secret given to setWebhook in this header
+    if WEBHOOK_SECRET_TOKEN and not hmac.compare_digest(
+        (x_telegram_bot_api_secret_token or "").encode(), WEBHOOK_SECRET_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    
+    application = app.state.bot_application
+    if application is None:
+        # Not ready yet; Telegram retries failed deliveries
+        raise HTTPException(status_code=503, detail="Bot not running")
+    
+    try:
+        update = Update.de_json(await request.json(), application.bot)
+    except Exception as e:
+        logger.warning(f"Rejected malformed webhook update: {e}")
+        raise HTTPException(status_code=400, detail="Invalid update")
+    
+    # Return straight away; the Application processes the queue in the background
+    await application.update_queue.put(update)
+    return {"ok": True}
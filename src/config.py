@@ -8,9 +8,126 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable not set")
+# Bot API endpoint override, e.g. a local Bot API server or the load-test stub ("http://host:port/bot")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL") or None
 
 # OpenAI API Key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# OpenAI-compatible endpoint override, e.g. the load-test stub ("http://host:port/v1")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # Database URL
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bot_database.db")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bot_database.db")
+# Threads running blocking database work off the event loop (matches the default connection pool size)
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "5"))
+# SQLite engine profile: "tuned" (WAL, synchronous=NORMAL, busy timeout, larger caches) or "default"
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "32"))  # Page cache per connection
+# Connections kept open: one per database thread, plus overflow for API worker threads and startup
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(DB_THREAD_POOL_SIZE)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+# Conversation logs are queued and written in batches of up to N rows or every T milliseconds
+CONVERSATION_LOG_BATCH_SIZE = int(os.getenv("CONVERSATION_LOG_BATCH_SIZE", "200"))
+CONVERSATION_LOG_FLUSH_MS = int(os.getenv("CONVERSATION_LOG_FLUSH_MS", "500"))
+CONVERSATION_LOG_QUEUE_SIZE = int(os.getenv("CONVERSATION_LOG_QUEUE_SIZE", "10000"))  # Loggers wait when it's full
+
+# Streaming responses (progressive message edits while GPT-4o generates)
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+# Minimum seconds between edits of the same message (Telegram allows roughly one edit per second per chat)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# In-memory user session limits (LRU + idle TTL eviction)
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", "10000"))
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "86400"))
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "64"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "20"))
+
+# Conversation history backend: "memory" (lost on restart) or "sqlite" (shared, persistent)
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "memory")
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "./chat_history.db")
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "50"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_FLUSH_MAX_ATTEMPTS = int(os.getenv("HISTORY_FLUSH_MAX_ATTEMPTS", "3"))  # Then the batch is dropped
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))  # Queued writes; the oldest are dropped beyond this
+
+# Exact-match response cache, opt-in per topic: only topics listed here are cached (none by default),
+# e.g. RESPONSE_CACHE_TOPICS=feng_shui,iching
+RESPONSE_CACHE_TOPICS = [t.strip() for t in os.getenv("RESPONSE_CACHE_TOPICS", "").split(",") if t.strip()]
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_DISK_PATH = os.getenv("RESPONSE_CACHE_DISK_PATH") or None
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+# Semantic (embedding similarity) cache for stateless questions; empty topic list disables it
+SEMANTIC_CACHE_TOPICS = [t.strip() for t in os.getenv("SEMANTIC_CACHE_TOPICS", "").split(",") if t.strip()]
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "local")  # "local" or "openai"
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+SEMANTIC_CACHE_ANN = os.getenv("SEMANTIC_CACHE_ANN", "false").lower() in ("1", "true", "yes")
+
+# Admission control for OpenAI calls (queued by priority: interactive before background)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY_PER_USER = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", "2"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0 disables the token budget
+
+# OpenAI retries (jittered exponential backoff, honouring Retry-After) and circuit breaker
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))  # Per attempt
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+OPENAI_REQUEST_DEADLINE = float(os.getenv("OPENAI_REQUEST_DEADLINE", "60"))  # Whole request, including retries but not queueing for admission
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Similarity needed to serve a semantically cached answer when the API call fails
+FALLBACK_CACHE_THRESHOLD = float(os.getenv("FALLBACK_CACHE_THRESHOLD", "0.75"))
+
+# Conversation context: recent messages verbatim within a token budget, older ones summarized
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_RECENT_MESSAGES = int(os.getenv("CONTEXT_MAX_RECENT_MESSAGES", "10"))
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
+
+# How the bot receives updates: "polling" (default) or "webhook" (served by the FastAPI app)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public base URL Telegram posts to, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")  # Checked against X-Telegram-Bot-Api-Secret-Token
+# Worker processes in webhook mode; with more than one, use HISTORY_BACKEND=sqlite so chat history is
+# shared, and note that multi-step conversations (/assess etc.) keep their state in the worker that started them
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# How often workers that aren't the leader (the one running the tip scheduler) check whether it has gone away
+LEADER_LOCK_RETRY_SECONDS = int(os.getenv("LEADER_LOCK_RETRY_SECONDS", "30"))
+
+# Updates handled concurrently across chats (each chat's updates stay in order); 1 processes them one at a time
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+
+# Per-user profile (language) cached in process so most updates skip the users table
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "600"))
+PROFILE_CACHE_MAX_USERS = int(os.getenv("PROFILE_CACHE_MAX_USERS", "50000"))
+
+# Daily tips: distinct tips generated per language each day; subscribers are spread across them
+DAILY_TIP_VARIANTS = int(os.getenv("DAILY_TIP_VARIANTS", "1"))
+# Tips go out hourly, to the subscribers for whom it's DAILY_TIP_HOUR o'clock in their timezone (set with
+# /timezone); users who haven't set one get DAILY_TIP_TIMEZONE (an IANA name or "UTC+08:00")
+DAILY_TIP_HOUR = int(os.getenv("DAILY_TIP_HOUR", "9"))
+DAILY_TIP_TIMEZONE = os.getenv("DAILY_TIP_TIMEZONE", "UTC")
+# Each hour's tips and recipients are prepared this many minutes before it (0 prepares them on the hour)
+DAILY_TIP_PREPARE_MINUTES = int(os.getenv("DAILY_TIP_PREPARE_MINUTES", "15"))
+# How late a missed tips run may still go out (e.g. after a redeploy), in seconds
+DAILY_TIP_MISFIRE_GRACE_SECONDS = int(os.getenv("DAILY_TIP_MISFIRE_GRACE_SECONDS", "21600"))
+
+# Broadcasts (daily tips etc.): concurrent senders under Telegram's limits of ~30 messages/s per bot,
+# ~1/s per private chat and 20/minute per group
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "16"))
+BROADCAST_RATE_PER_SECOND = float(os.getenv("BROADCAST_RATE_PER_SECOND", "25"))
+BROADCAST_CHAT_RATE_PER_SECOND = float(os.getenv("BROADCAST_CHAT_RATE_PER_SECOND", "1"))
+BROADCAST_GROUP_RATE_PER_MINUTE = float(os.getenv("BROADCAST_GROUP_RATE_PER_MINUTE", "20"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# Recipients who blocked the bot or are gone are unsubscribed; after other failures their tips pause for
+# BACKOFF_HOURS, doubling per failure in a row up to BACKOFF_MAX_DAYS, and MAX_FAILURES in a row unsubscribes them
+BROADCAST_FAILURE_BACKOFF_HOURS = float(os.getenv("BROADCAST_FAILURE_BACKOFF_HOURS", "24"))
+BROADCAST_FAILURE_BACKOFF_MAX_DAYS = float(os.getenv("BROADCAST_FAILURE_BACKOFF_MAX_DAYS", "30"))
+BROADCAST_MAX_FAILURES = int(os.getenv("BROADCAST_MAX_FAILURES", "10"))
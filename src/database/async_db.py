@@ -0,0 +1,69 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from ..config import DB_THREAD_POOL_SIZE
+from .models import SessionLocal, engine
+
+# Bounded so database work queues here instead of piling onto the connection pool
+_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+
+
+def _with_session(fn, args, kwargs):
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run `fn(db, *args, **kwargs)` with its own session on the database thread pool.
+
+    Use it for the `crud` functions (or any function taking a session first) from
+    async code, so queries and commits never block the event loop. Returned ORM
+    objects are detached; their loaded columns can still be read.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_with_session, fn, args, kwargs))
+
+
+async def stream_db(statement, batch_size: int = 1000, transform=None):
+    """Yield the rows of a Core select in batches, reading them with a server-side cursor.
+
+    Only one batch is held in memory at a time. Each fetch, and `transform(rows)` if
+    given (e.g. to serialize the batch), runs on the database thread pool; the
+    connection is held until the generator is exhausted or closed.
+    """
+    loop = asyncio.get_running_loop()
+
+    def open_partitions():
+        connection = engine.connect()
+        try:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+            return connection, result.partitions()
+        except Exception:
+            connection.close()
+            raise
+
+    def next_batch(partitions):
+        rows = next(partitions, None)
+        if rows is None:
+            return None
+        return transform(rows) if transform else rows
+
+    connection, partitions = await loop.run_in_executor(_executor, open_partitions)
+    fetch = None
+    try:
+        while True:
+            fetch = _executor.submit(next_batch, partitions)
+            batch = await asyncio.wrap_future(fetch)
+            if batch is None:
+                break
+            yield batch
+    finally:
+        # If the consumer went away mid-fetch (e.g. a client disconnect), the fetch is still
+        # running on its thread; close the connection only once it's done with it
+        if fetch is not None and not fetch.done():
+            fetch.add_done_callback(lambda _: connection.close())
+        else:
+            _executor.submit(connection.close)
@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import logging
+from typing import NamedTuple
+from sqlalchemy import insert, select, update
+from ..config import CONVERSATION_LOG_BATCH_SIZE, CONVERSATION_LOG_FLUSH_MS, CONVERSATION_LOG_QUEUE_SIZE
+from .async_db import run_db
+from .models import User, Conversation
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationRecord(NamedTuple):
+    telegram_id: int
+    message: str
+    response: str
+    topic: str
+    created_at: datetime.datetime
+
+
+class ConversationLogWriter:
+    """Write-behind conversation log: records are queued and inserted in batches.
+
+    A batch is written when `batch_size` records are waiting or `flush_interval`
+    seconds after its first record, in one transaction: a bulk insert of the
+    conversations plus one bulk update of the users' last_interaction. The queue
+    is bounded; when it's full, `log` waits for the writer to catch up.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5, max_queue: int = 10000,
+                 max_attempts: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._wake = asyncio.Event()
+        self._flushing = 0
+        self._writer = None
+
+        self.logged = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    async def log(self, telegram_id: int, message: str, response: str, topic: str):
+        """Queue a conversation for the database; returns once queued, not once written."""
+        self._ensure_writer()
+        record = ConversationRecord(telegram_id, message, response, topic, datetime.datetime.utcnow())
+        await self._queue.put(record)
+        self.logged += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self):
+        """Write everything queued so far without waiting for the flush interval."""
+        if self._writer is None or self._writer.done():
+            if self._queue.empty():
+                return
+            self._ensure_writer()
+        self._flushing += 1
+        self._wake.set()
+        try:
+            await self._queue.join()
+        finally:
+            self._flushing -= 1
+
+    async def close(self):
+        """Flush queued records and stop the writer; call once on shutdown."""
+        await self.flush()
+        if self._writer:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "logged": self.logged,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped
+        }
+
+    def _ensure_writer(self):
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while True:
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                remaining = deadline - loop.time()
+                if len(batch) >= self.batch_size or remaining <= 0 or self._flushing:
+                    break
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await run_db(_write_batch, batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.dropped += len(batch)
+                    logger.error(f"Dropped {len(batch)} conversation logs after {attempt} attempts: {e}")
+                    # The rows themselves, so they can be recovered from the logs
+                    for record in batch:
+                        logger.error(f"Dropped conversation log: {record}")
+                    return
+                logger.warning(f"Failed to write {len(batch)} conversation logs (attempt {attempt}): {e}")
+                await asyncio.sleep(0.5 * attempt)
+
+
+def _write_batch(db, batch: list):
+    """Insert a batch of conversations and bump last_interaction, in one transaction."""
+    telegram_ids = {record.telegram_id for record in batch}
+    user_ids = dict(db.execute(
+        select(User.telegram_id, User.id).where(User.telegram_id.in_(telegram_ids))
+    ).all())
+
+    # Conversations from users without a profile yet create one
+    missing = telegram_ids - user_ids.keys()
+    if missing:
+        db.execute(insert(User), [{"telegram_id": telegram_id} for telegram_id in missing])
+        user_ids.update(db.execute(
+            select(User.telegram_id, User.id).where(User.telegram_id.in_(missing))
+        ).all())
+
+    db.execute(insert(Conversation), [
+        {
+            "user_id": user_ids[record.telegram_id],
+            "message": record.message,
+            "response": record.response,
+            "topic": record.topic,
+            "created_at": record.created_at
+        }
+        for record in batch
+    ])
+
+    last_interaction = {}
+    for record in batch:
+        last_interaction[user_ids[record.telegram_id]] = record.created_at
+    db.execute(update(User), [
+        {"id": user_id, "last_interaction": timestamp} for user_id, timestamp in last_interaction.items()
+    ])
+    db.commit()
+
+
+conversation_log = ConversationLogWriter(
+    batch_size=CONVERSATION_LOG_BATCH_SIZE,
+    flush_interval=CONVERSATION_LOG_FLUSH_MS / 1000,
+    max_queue=CONVERSATION_LOG_QUEUE_SIZE
+)
@@ -1,7 +1,9 @@
+from sqlalchemy import func, or_, select, update
 from sqlalchemy.orm import Session
 from . import models
 import datetime
-from typing import List, Optional
+import json
+from typing import Dict, List, Optional
 
 def get_user(db: Session, telegram_id: int) -> Optional[models.User]:
     """Get a user by their Telegram ID."""
@@ -38,29 +40,6 @@ def get_or_create_user(db: Session, telegram_id: int, username: Optional[str] =
     db.refresh(new_user)
     return new_user
 
-def log_conversation(db: Session, telegram_id: int, message: str, response: str, topic: str) -> models.Conversation:
-    """Log a conversation between the user and the bot."""
-    user = get_user(db, telegram_id)
-    
-    if not user:
-        # If user doesn't exist, create them
-        user = get_or_create_user(db, telegram_id)
-    
-    # Update last interaction time
-    user.last_interaction = datetime.datetime.utcnow()
-    
-    # Create the conversation record
-    new_conversation = models.Conversation(
-        user_id=user.id,
-        message=message,
-        response=response,
-        topic=topic
-    )
-    db.add(new_conversation)
-    db.commit()
-    db.refresh(new_conversation)
-    return new_conversation
-
 def get_user_conversations(db: Session, telegram_id: int, limit: int = 10) -> List[models.Conversation]:
     """Get recent conversations for a specific user."""
     user = get_user(db, telegram_id)
@@ -83,6 +62,23 @@ def get_all_conversations(db: Session, skip: int = 0, limit: int = 100) -> List[
     return db.query(models.Conversation).order_by(
         models.Conversation.created_at.desc()
     ).offset(skip).limit(limit).all()
+
+def get_users_page(db: Session, limit: int = 100, after: Optional[int] = None) -> List[models.User]:
+    """Get users oldest first, starting after the id of the previous page's last user.
+    
+    Ordered by id rather than created_at, which can be NULL and would leave those rows unreachable.
+    """
+    query = db.query(models.User)
+    if after is not None:
+        query = query.filter(models.User.id > after)
+    return query.order_by(models.User.id).limit(limit).all()
+
+def get_conversations_page(db: Session, limit: int = 100, after: Optional[int] = None) -> List[models.Conversation]:
+    """Get conversations newest first (by id), starting after the id of the previous page's last one."""
+    query = db.query(models.Conversation)
+    if after is not None:
+        query = query.filter(models.Conversation.id < after)
+    return query.order_by(models.Conversation.id.desc()).limit(limit).all()
     
 def update_user_subscription(db: Session, telegram_id: int, subscribed: bool) -> models.User:
     """Update a user's subscription status."""
@@ -92,13 +88,40 @@ def update_user_subscription(db: Session, telegram_id: int, subscribed: bool) ->
         raise ValueError(f"User with telegram_id {telegram_id} not found")
     
     user.subscribed_to_tips = subscribed
+    if subscribed:
+        # A fresh start for users that tips had been backing off from
+        user.delivery_failures = 0
+        user.next_delivery_at = None
     db.commit()
     db.refresh(user)
     return user
 
-def get_subscribed_users(db: Session) -> List[models.User]:
-    """Get all users who are subscribed to daily tips."""
-    return db.query(models.User).filter(models.User.subscribed_to_tips == True).all()
+def get_subscriber_timezones(db: Session) -> List[Optional[str]]:
+    """Get the distinct timezones of users subscribed to daily tips (None for users who haven't set one)."""
+    return [timezone for (timezone,) in db.query(models.User.timezone).filter(
+        models.User.subscribed_to_tips == True
+    ).distinct()]
+
+def get_subscribers_by_language(db: Session, timezones: Optional[List[Optional[str]]] = None) -> Dict[str, List[int]]:
+    """Get the Telegram IDs of users due a daily tip, grouped by preferred language.
+    
+    Subscribers whose recent deliveries failed are left out until their backoff has passed.
+    `timezones` limits it to users in those timezones; None in the list means users without one.
+    """
+    audiences = {}
+    rows = db.query(models.User.telegram_id, models.User.language).filter(
+        models.User.subscribed_to_tips == True,
+        or_(models.User.next_delivery_at == None, models.User.next_delivery_at <= datetime.datetime.utcnow())
+    )
+    if timezones is not None:
+        names = [timezone for timezone in timezones if timezone]
+        conditions = [models.User.timezone.in_(names)]
+        if None in timezones:
+            conditions.append(models.User.timezone == None)
+        rows = rows.filter(or_(*conditions))
+    for telegram_id, language in rows:
+        audiences.setdefault(language or 'en', []).append(telegram_id)
+    return audiences
 
 def update_user_language(db: Session, telegram_id: int, language: str):
     """Update user's preferred language."""
@@ -109,9 +132,195 @@ def update_user_language(db: Session, telegram_id: int, language: str):
         db.refresh(user)
     return user
 
+def update_user_timezone(db: Session, telegram_id: int, timezone: Optional[str]):
+    """Update user's timezone; None clears it."""
+    user = get_user(db, telegram_id=telegram_id)
+    if user:
+        user.timezone = timezone
+        db.commit()
+        db.refresh(user)
+    return user
+
 def get_user_language(db: Session, telegram_id: int) -> str:
     """Get user's preferred language, defaulting to English."""
     user = get_user(db, telegram_id=telegram_id)
     if user and hasattr(user, 'language') and user.language:
         return user.language
-    return "en"
\ No newline at end of file
+    return "en"
+
+def get_or_create_broadcast_job(db: Session, key: str, kind: str,
+                                send_at: Optional[datetime.datetime] = None) -> models.BroadcastJob:
+    """Get the broadcast job for a run key, creating it (pending) the first time."""
+    job = db.query(models.BroadcastJob).filter(models.BroadcastJob.key == key).first()
+    if job:
+        return job
+    
+    job = models.BroadcastJob(key=key, kind=kind, status="pending", send_at=send_at)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_unfinished_broadcast_jobs(db: Session) -> List[models.BroadcastJob]:
+    """Get jobs whose recipients were recorded but which haven't finished sending."""
+    return db.query(models.BroadcastJob).filter(models.BroadcastJob.status == "sending").order_by(
+        models.BroadcastJob.id
+    ).all()
+
+def get_last_broadcast_send_at(db: Session, kind: str, until: datetime.datetime) -> Optional[datetime.datetime]:
+    """Get the latest send time up to `until` of any job of a kind, or None if there isn't one."""
+    return db.query(func.max(models.BroadcastJob.send_at)).filter(
+        models.BroadcastJob.kind == kind,
+        models.BroadcastJob.send_at <= until
+    ).scalar()
+
+def get_due_broadcast_jobs(db: Session, kind: str, since: datetime.datetime,
+                           until: datetime.datetime) -> List[models.BroadcastJob]:
+    """Get prepared or interrupted jobs of a kind whose send time falls in [since, until]."""
+    return db.query(models.BroadcastJob).filter(
+        models.BroadcastJob.kind == kind,
+        models.BroadcastJob.status.in_(["ready", "sending"]),
+        models.BroadcastJob.send_at >= since,
+        models.BroadcastJob.send_at <= until
+    ).order_by(models.BroadcastJob.send_at, models.BroadcastJob.id).all()
+
+def prepare_broadcast_job(db: Session, job_id: int, texts: Dict[str, List[str]], parse_mode: Optional[str],
+                          recipients: List[tuple]) -> models.BroadcastJob:
+    """Record a job's messages and its (chat_id, language, variant) recipients, in one transaction."""
+    job = db.get(models.BroadcastJob, job_id)
+    if job.status != "pending":
+        return job  # Already prepared by an earlier run
+    
+    if recipients:
+        db.execute(models.BroadcastDelivery.__table__.insert(), [
+            {"job_id": job_id, "chat_id": chat_id, "language": language, "variant": variant, "status": "pending"}
+            for chat_id, language, variant in recipients
+        ])
+    job.payload = json.dumps(texts, ensure_ascii=False)
+    job.parse_mode = parse_mode
+    job.total = len(recipients)
+    job.status = "ready"
+    db.commit()
+    db.refresh(job)
+    return job
+
+def mark_broadcast_job_sending(db: Session, job_id: int):
+    """Mark a prepared job as being sent, so it's resumed if the process restarts."""
+    db.execute(
+        update(models.BroadcastJob)
+        .where(models.BroadcastJob.id == job_id, models.BroadcastJob.status == "ready")
+        .values(status="sending", started_at=datetime.datetime.utcnow())
+    )
+    db.commit()
+
+def claim_broadcast_deliveries(db: Session, job_id: int, after_id: int = 0, limit: int = 100) -> list:
+    """Mark the next pending recipients of a job as being sent and return (id, chat_id, language, variant) rows."""
+    rows = db.query(
+        models.BroadcastDelivery.id,
+        models.BroadcastDelivery.chat_id,
+        models.BroadcastDelivery.language,
+        models.BroadcastDelivery.variant
+    ).filter(
+        models.BroadcastDelivery.job_id == job_id,
+        models.BroadcastDelivery.status == "pending",
+        models.BroadcastDelivery.id > after_id
+    ).order_by(models.BroadcastDelivery.id).limit(limit).all()
+    
+    if rows:
+        db.execute(
+            update(models.BroadcastDelivery)
+            .where(models.BroadcastDelivery.id.in_([row.id for row in rows]))
+            .values(status="sending")
+        )
+        db.commit()
+    return rows
+
+def record_broadcast_deliveries(db: Session, results: List[dict]):
+    """Store the outcome of sent messages: dicts with id, status, error and sent_at."""
+    if results:
+        db.execute(update(models.BroadcastDelivery), results)
+        db.commit()
+
+def release_broadcast_deliveries(db: Session, delivery_ids: List[int]):
+    """Put claimed recipients that were never sent to back to pending."""
+    db.execute(
+        update(models.BroadcastDelivery)
+        .where(models.BroadcastDelivery.id.in_(delivery_ids), models.BroadcastDelivery.status == "sending")
+        .values(status="pending")
+    )
+    db.commit()
+
+def abandon_broadcast_deliveries(db: Session, job_id: int) -> int:
+    """Mark recipients left mid-send by an interrupted run as unknown, so they're never sent twice."""
+    count = db.execute(
+        update(models.BroadcastDelivery)
+        .where(models.BroadcastDelivery.job_id == job_id, models.BroadcastDelivery.status == "sending")
+        .values(status="unknown")
+    ).rowcount
+    db.commit()
+    return count
+
+def finish_broadcast_job(db: Session, job_id: int, backoff_base: datetime.timedelta = datetime.timedelta(days=1),
+                         backoff_max: datetime.timedelta = datetime.timedelta(days=30),
+                         max_failures: int = 10) -> Dict[str, int]:
+    """Mark a job done, store its totals and update recipients' delivery state, in one transaction.
+    
+    Returns the number of recipients per delivery status. See apply_delivery_outcomes.
+    """
+    counts = dict(db.query(models.BroadcastDelivery.status, func.count()).filter(
+        models.BroadcastDelivery.job_id == job_id
+    ).group_by(models.BroadcastDelivery.status).all())
+    
+    apply_delivery_outcomes(db, job_id, backoff_base, backoff_max, max_failures)
+    
+    job = db.get(models.BroadcastJob, job_id)
+    job.sent = counts.get("sent", 0) + counts.get("sent_plain", 0)
+    job.failed = counts.get("failed", 0) + counts.get("unreachable", 0)
+    job.status = "done"
+    job.finished_at = datetime.datetime.utcnow()
+    db.commit()
+    return counts
+
+def apply_delivery_outcomes(db: Session, job_id: int, backoff_base: datetime.timedelta,
+                            backoff_max: datetime.timedelta, max_failures: int):
+    """Update users from a job's outcomes, without committing.
+    
+    Unreachable recipients (blocked the bot, deactivated, chat not found) are
+    unsubscribed. Transient failures add to the user's failure count and hold off
+    their tips for backoff_base * 2^(failures - 1), up to backoff_max; after
+    max_failures in a row they're unsubscribed too. A delivery resets the count.
+    """
+    def recipients(*statuses):
+        return select(models.BroadcastDelivery.chat_id).where(
+            models.BroadcastDelivery.job_id == job_id,
+            models.BroadcastDelivery.status.in_(statuses)
+        )
+    
+    db.execute(
+        update(models.User)
+        .where(models.User.telegram_id.in_(recipients("sent", "sent_plain")), models.User.delivery_failures > 0)
+        .values(delivery_failures=0, next_delivery_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    
+    now = datetime.datetime.utcnow()
+    backoff = []
+    for user_id, failures in db.query(models.User.id, models.User.delivery_failures).filter(
+        models.User.telegram_id.in_(recipients("failed"))
+    ):
+        failures = (failures or 0) + 1
+        if failures >= max_failures:
+            backoff.append({"id": user_id, "delivery_failures": failures, "subscribed_to_tips": False})
+            continue
+        # An hour's slack, so a user due back on a given day isn't missed by that day's run
+        wait = min(backoff_base * 2 ** (failures - 1), backoff_max) - datetime.timedelta(hours=1)
+        backoff.append({"id": user_id, "delivery_failures": failures, "next_delivery_at": now + wait})
+    if backoff:
+        db.execute(update(models.User), backoff)
+    
+    db.execute(
+        update(models.User)
+        .where(models.User.telegram_id.in_(recipients("unreachable")))
+        .values(subscribed_to_tips=False, delivery_failures=0, next_delivery_at=None)
+        .execution_options(synchronize_session=False)
+    )
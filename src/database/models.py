@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, create_engine, Boolean
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint, create_engine, event, Boolean, text
+)
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
-from ..config import DATABASE_URL
+from pathlib import Path
+from ..config import (
+    DATABASE_URL, SQLITE_PROFILE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE_MB, SQLITE_CACHE_SIZE_MB,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW
+)
 
 Base = declarative_base()
 
@@ -18,20 +25,132 @@ class User(Base):
     last_interaction = Column(DateTime, default=datetime.datetime.utcnow)
     subscribed_to_tips = Column(Boolean, default=False)
     language = Column(String(5), default="en")  
+    # IANA name or "UTC±HH:MM" (see services/timezones.py); daily tips arrive in the morning there
+    timezone = Column(String(64), nullable=True)
+    # Consecutive tip deliveries that failed with a transient error; tips skip the user until next_delivery_at
+    delivery_failures = Column(Integer, default=0, server_default=text("0"))
+    next_delivery_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Subscribers in the timezones of a daily tips delivery window
+        Index("ix_users_timezone", "timezone"),
+    )
     
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer)
+    user_id = Column(Integer, ForeignKey("users.id", name="fk_conversations_user_id_users"))
     message = Column(Text)
     response = Column(Text)
     topic = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        # A user's history, newest first (/history, /user/{id}/conversations/)
+        Index("ix_conversations_user_id_created_at", "user_id", created_at.desc()),
+        # Recent conversations across all users (/conversations/, /stats/)
+        Index("ix_conversations_created_at", "created_at"),
+    )
+
+class BroadcastJob(Base):
+    """One broadcast run (e.g. a day's tips); `key` identifies the run so it only happens once."""
+    __tablename__ = "broadcast_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    key = Column(String, unique=True, nullable=False)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, ready (recipients recorded), sending, done
+    payload = Column(Text, nullable=True)  # JSON {language: [message text per variant]}
+    parse_mode = Column(String, nullable=True)
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    send_at = Column(DateTime, nullable=True)  # UTC; when a prepared job is due to go out
+    
+    __table_args__ = (
+        Index("ix_broadcast_jobs_kind_status_send_at", "kind", "status", "send_at"),
+    )
+
+class BroadcastDelivery(Base):
+    """A broadcast's recipient and what happened to their message."""
+    __tablename__ = "broadcast_deliveries"
+    
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id", name="fk_broadcast_deliveries_job_id_broadcast_jobs"),
+                    nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    language = Column(String(5), nullable=False)
+    variant = Column(Integer, nullable=False, default=0)
+    # pending -> sending (claimed by a sender) -> sent, sent_plain or failed; unknown if interrupted while sending
+    status = Column(String, nullable=False, default="pending")
+    error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Each recipient is in a job once, so a job can't message anyone twice
+        UniqueConstraint("job_id", "chat_id", name="uq_broadcast_deliveries_job_id_chat_id"),
+        # Claiming the next pending recipients in order, and counting outcomes
+        Index("ix_broadcast_deliveries_job_id_status_id", "job_id", "status", "id"),
+    )
+
+def _is_sqlite_file(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def make_engine(database_url: str = DATABASE_URL, profile: str = SQLITE_PROFILE,
+                pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW):
+    """Create the engine, applying the tuned SQLite profile to file databases when selected.
+
+    The tuned profile switches to WAL so readers and the writer don't block each
+    other, only fsyncs at checkpoints (synchronous=NORMAL, still crash-safe in WAL
+    mode), waits on locks instead of failing with "database is locked", enforces
+    foreign keys, and sizes the connection pool to the threads that use it.
+    """
+    url = make_url(database_url)
+    if profile != "tuned" or not _is_sqlite_file(url):
+        return create_engine(database_url)
+
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=30
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_MB * 1024}")  # Negative means KiB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")  # SQLite only enforces foreign keys when asked to
+        cursor.close()
+
+    return engine
 
 # Database setup
-engine = create_engine(DATABASE_URL)
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Alembic migrations live at the repository root (alembic.ini, migrations/)
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Create the schema or upgrade it to the latest migration."""
+    from alembic import command
+    from alembic.config import Config
+    
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    with engine.connect() as connection:
+        # Not in a transaction yet: migrations/env.py has to switch SQLite's foreign keys off first
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
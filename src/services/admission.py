@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Priority classes; lower values are admitted first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class Ticket:
+    """An admitted request. Call `used()` with the real token count once it's known."""
+
+    __slots__ = ("user_id", "priority", "seq", "tokens", "future", "enqueued_at", "released")
+
+    def __init__(self, user_id, priority: int, seq: int, tokens: int, future):
+        self.user_id = user_id
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.released = False
+
+
+class AdmissionController:
+    """Admit LLM calls under a global concurrency cap, a per-user cap and a tokens-per-minute budget.
+
+    Waiting requests are admitted in priority order (then arrival order). A request
+    whose user already has `max_per_user` calls running is skipped so other users
+    can go ahead of it. Token budget is reserved up front from an estimate and
+    corrected with the real usage once the call completes.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_user: int = 2, tokens_per_minute: int = 0):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.tokens_per_minute = tokens_per_minute
+
+        self._queue = []  # (priority, seq, ticket) heap
+        self._seq = itertools.count()
+        self._active = 0
+        self._active_by_user = {}
+
+        # Token bucket refilled continuously; may go negative when usage exceeds the estimate
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._wakeup = None
+
+        # Metrics per priority class
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.max_wait_seconds = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    @asynccontextmanager
+    async def slot(self, user_id=None, priority: int = INTERACTIVE, estimated_tokens: int = 0):
+        """Wait for admission, run the body, then free the slot."""
+        ticket = await self.acquire(user_id, priority, estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(self, user_id=None, priority: int = INTERACTIVE, estimated_tokens: int = 0) -> Ticket:
+        """Queue a request and wait until it is admitted."""
+        if self.tokens_per_minute:
+            # A single request can never need more than the whole bucket
+            estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+
+        ticket = Ticket(user_id, priority, next(self._seq), estimated_tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (priority, ticket.seq, ticket))
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Admitted just as we were cancelled; give the slot back
+                self.release(ticket)
+            else:
+                ticket.future.cancel()  # Dropped from the queue lazily
+            raise
+        return ticket
+
+    def used(self, ticket: Ticket, tokens: int):
+        """Correct the token budget with the real usage of an admitted request."""
+        if self.tokens_per_minute:
+            self._tokens -= tokens - ticket.tokens
+            ticket.tokens = tokens
+
+    def release(self, ticket: Ticket):
+        """Free an admitted request's slot and admit whoever is next."""
+        if ticket.released:
+            return
+        ticket.released = True
+
+        self._active -= 1
+        remaining = self._active_by_user.get(ticket.user_id, 0) - 1
+        if remaining > 0:
+            self._active_by_user[ticket.user_id] = remaining
+        else:
+            self._active_by_user.pop(ticket.user_id, None)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        """Get queue depth, concurrency, token budget and wait times by priority class."""
+        waiting = [ticket for _, _, ticket in self._queue if not ticket.future.done()]
+        stats = {
+            "active": self._active,
+            "queued": len(waiting),
+            "max_concurrent": self.max_concurrent
+        }
+        if self.tokens_per_minute:
+            # Computed without refilling, so it's safe to read from another thread (the API server)
+            refill = (time.monotonic() - self._refilled_at) * self.tokens_per_minute / 60
+            stats["tokens_available"] = int(min(self.tokens_per_minute, self._tokens + refill))
+
+        now = time.monotonic()
+        for priority, name in PRIORITY_NAMES.items():
+            queued = [ticket for ticket in waiting if ticket.priority == priority]
+            admitted = self.admitted[priority]
+            stats[name] = {
+                "queued": len(queued),
+                "admitted": admitted,
+                "avg_wait_ms": round(self.wait_seconds[priority] * 1000 / admitted, 1) if admitted else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds[priority] * 1000, 1),
+                "oldest_wait_ms": round(max((now - t.enqueued_at for t in queued), default=0.0) * 1000, 1)
+            }
+        return stats
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60
+        )
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """Admit waiting requests, in priority order, while there is capacity."""
+        if self.tokens_per_minute:
+            self._refill()
+
+        skipped = []  # Waiters whose user is at the per-user cap; they keep their place
+        try:
+            while self._active < self.max_concurrent and self._queue:
+                entry = heapq.heappop(self._queue)
+                ticket = entry[2]
+                if ticket.future.done():
+                    continue  # Cancelled while waiting
+
+                if ticket.user_id is not None and self._active_by_user.get(ticket.user_id, 0) >= self.max_per_user:
+                    skipped.append(entry)
+                    continue
+
+                if self.tokens_per_minute and ticket.tokens > self._tokens:
+                    # Hold everyone behind the head of the line until the budget refills
+                    heapq.heappush(self._queue, entry)
+                    self._wake_after((ticket.tokens - self._tokens) * 60 / self.tokens_per_minute)
+                    return
+
+                self._admit(ticket)
+        finally:
+            for entry in skipped:
+                heapq.heappush(self._queue, entry)
+
+    def _admit(self, ticket: Ticket):
+        wait = time.monotonic() - ticket.enqueued_at
+        self.admitted[ticket.priority] += 1
+        self.wait_seconds[ticket.priority] += wait
+        self.max_wait_seconds[ticket.priority] = max(self.max_wait_seconds[ticket.priority], wait)
+        if wait > 1:
+            logger.info(f"Admitted {PRIORITY_NAMES[ticket.priority]} request after waiting {wait:.1f}s")
+
+        self._active += 1
+        self._active_by_user[ticket.user_id] = self._active_by_user.get(ticket.user_id, 0) + 1
+        self._tokens -= ticket.tokens
+        ticket.future.set_result(None)
+
+    def _wake_after(self, delay: float):
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def wake():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = loop.call_later(max(delay, 0.01), wake)
@@ -1,9 +1,31 @@
+import asyncio
 import logging
 import time
 import os
 from datetime import datetime
 from openai import AsyncOpenAI
-from ..config import OPENAI_API_KEY
+from ..config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, SESSION_MAX_USERS, SESSION_IDLE_TTL_SECONDS,
+    SESSION_MEMORY_BUDGET_MB, SESSION_MAX_MESSAGES, HISTORY_BACKEND,
+    HISTORY_DB_PATH, HISTORY_FLUSH_BATCH, HISTORY_FLUSH_INTERVAL, HISTORY_FLUSH_MAX_ATTEMPTS,
+    HISTORY_MAX_PENDING, RESPONSE_CACHE_TOPICS, RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_DISK_PATH, RESPONSE_CACHE_DISK_MAX_ENTRIES,
+    SEMANTIC_CACHE_TOPICS, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_EMBEDDER,
+    SEMANTIC_CACHE_TTL_SECONDS, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_ANN,
+    LLM_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY_PER_USER, LLM_TOKENS_PER_MINUTE,
+    OPENAI_TIMEOUT_SECONDS, OPENAI_MAX_RETRIES, OPENAI_RETRY_BASE_DELAY, OPENAI_RETRY_MAX_DELAY,
+    OPENAI_REQUEST_DEADLINE, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, FALLBACK_CACHE_THRESHOLD,
+    CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_RECENT_MESSAGES, CONTEXT_SUMMARY_MODEL, CONTEXT_SUMMARY_MAX_TOKENS
+)
+from .session_store import SessionStore
+from .history_store import create_history_backend
+from .response_cache import ResponseCache, make_cache_key
+from .semantic_cache import SemanticCache, HashingEmbedder, OpenAIEmbedder
+from .single_flight import SingleFlight
+from .admission import AdmissionController, INTERACTIVE, BACKGROUND
+from .resilience import CircuitBreaker, RetryPolicy, is_retryable
+from .context_builder import ContextBuilder
+from .prompts import PromptRegistry
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,7 +36,13 @@ class AIService:
         if not OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY environment variable not set")
             
-        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        # Retries are handled by our own retry policy, so the client's are disabled
+        self.client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=0
+        )
         self.model_name = "gpt-4o"
         logger.info(f"Initialized OpenAI client with model: {self.model_name}")
         
@@ -22,23 +50,345 @@ class AIService:
         self.temperature = 0.7
         self.max_tokens = 2048  # Maximum output length for detailed responses
         
+        # System prompts per topic and language, rebuilt when the date changes
+        self.prompts = PromptRegistry()
+        
         # Track usage for monitoring
         self.total_tokens_used = 0
         self.api_calls_count = 0
+        self.fallback_responses = 0
         self.api_start_time = time.time()
         
-        # Session storage
-        self.chat_sessions = {}  # Store message history by user_id
-        self.user_topics = {}    # Track the current topic for each user
-        self.assessment_results = {}  # Store assessment results for follow-up questions
-        self.user_languages = {}  # Track user language preferences
+        # Session storage: message history, topic, assessment results and language by user_id
+        self.sessions = SessionStore(
+            max_sessions=SESSION_MAX_USERS,
+            idle_ttl=SESSION_IDLE_TTL_SECONDS,
+            memory_budget_bytes=int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+            max_messages=SESSION_MAX_MESSAGES
+        )
+        
+        # Durable history shared between processes, loaded lazily into sessions
+        self.history = create_history_backend(
+            HISTORY_BACKEND,
+            path=HISTORY_DB_PATH,
+            batch_size=HISTORY_FLUSH_BATCH,
+            flush_interval=HISTORY_FLUSH_INTERVAL,
+            max_attempts=HISTORY_FLUSH_MAX_ATTEMPTS,
+            max_pending=HISTORY_MAX_PENDING
+        )
+        
+        # Exact-match cache for repeated prompts on opted-in topics
+        self.cache_topics = set(RESPONSE_CACHE_TOPICS)
+        self.response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=RESPONSE_CACHE_TTL_SECONDS,
+            disk_path=RESPONSE_CACHE_DISK_PATH,
+            max_disk_entries=RESPONSE_CACHE_DISK_MAX_ENTRIES
+        )
+        
+        # Similarity cache for paraphrased questions on stateless topics
+        self.semantic_topics = set(SEMANTIC_CACHE_TOPICS)
+        self.semantic_cache = SemanticCache(
+            OpenAIEmbedder(self.client) if SEMANTIC_CACHE_EMBEDDER == "openai" else HashingEmbedder(),
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries_per_scope=SEMANTIC_CACHE_MAX_ENTRIES,
+            use_ann=SEMANTIC_CACHE_ANN
+        )
+        
+        # Identical requests arriving together share one API call
+        self.inflight = SingleFlight()
+        
+        # Bounds concurrent API calls and token spend, admitting interactive requests first
+        self.admission = AdmissionController(
+            max_concurrent=LLM_MAX_CONCURRENCY,
+            max_per_user=LLM_MAX_CONCURRENCY_PER_USER,
+            tokens_per_minute=LLM_TOKENS_PER_MINUTE
+        )
+        
+        # Backoff on transient errors, bounded by a deadline, failing fast while the API is down
+        self.retry_policy = RetryPolicy(
+            CircuitBreaker(failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS),
+            max_retries=OPENAI_MAX_RETRIES,
+            base_delay=OPENAI_RETRY_BASE_DELAY,
+            max_delay=OPENAI_RETRY_MAX_DELAY,
+            deadline=OPENAI_REQUEST_DEADLINE
+        )
+        
+        # Recent turns verbatim within a token budget, older turns as a running summary
+        self.context = ContextBuilder(token_budget=CONTEXT_TOKEN_BUDGET, max_recent=CONTEXT_MAX_RECENT_MESSAGES)
+        self.summary_model = CONTEXT_SUMMARY_MODEL
+        self._summary_tasks = {}
+        self.summaries_generated = 0
+
+    async def generate_response(self, topic: str, query: str, user_id=None, language="en", priority=INTERACTIVE,
+                                raise_errors: bool = False) -> str:
+        """Generate a response using GPT-4o based on the topic and query.
+        
+        `priority` orders the request against other queued API calls; background
+        work such as scheduled tips should pass BACKGROUND. When no response or
+        fallback can be had, the user gets an apology, or with `raise_errors` the
+        error is raised instead.
+        """
+        messages = None
+        try:
+            await self._load_session(user_id)
+            messages = self._build_messages(topic, query, user_id, language)
+            
+            # Serve identical or paraphrased prompts from the caches
+            cache_key, cached = await self._get_cached(topic, query, messages, language)
+            if cached is not None:
+                logger.info(f"Serving cached response for user {user_id if user_id else 'anonymous'} on topic {topic}")
+                self._store_exchange(user_id, query, cached)
+                return self._format_response(cached)
+            
+            # Log the request for debugging
+            logger.info(f"Sending request to OpenAI API for user {user_id if user_id else 'anonymous'} on topic {topic}")
+            
+            # Concurrent identical prompts wait for the same API call
+            flight_key = cache_key or self._request_key(messages, language)
+            result = await self.inflight.do(
+                flight_key,
+                lambda: self._complete(cache_key, topic, query, messages, language, user_id, priority)
+            )
+            
+            # Store the message history for this user if needed
+            self._store_exchange(user_id, query, result)
+            
+            return self._format_response(result)
+            
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            
+            # Serve a close enough cached answer rather than an apology if there is one
+            fallback = await self._get_fallback(topic, query, messages, language)
+            if fallback is not None:
+                self._store_exchange(user_id, query, fallback)
+                return self._format_response(fallback)
+            if raise_errors:
+                raise
+            return self._error_message(language)
+
+    async def generate_response_stream(self, topic: str, query: str, user_id=None, language="en", priority=INTERACTIVE):
+        """Stream a GPT-4o response as text deltas so callers can display it progressively.
+        
+        Shares history, follow-up handling and usage tracking with generate_response.
+        The exchange is only stored once the stream has completed.
+        """
+        chunks = []
+        flight = None
+        messages = None
+        try:
+            await self._load_session(user_id)
+            messages = self._build_messages(topic, query, user_id, language)
+            
+            # A cached response is delivered as a single chunk
+            cache_key, cached = await self._get_cached(topic, query, messages, language)
+            if cached is not None:
+                logger.info(f"Serving cached response for user {user_id if user_id else 'anonymous'} on topic {topic}")
+                chunks.append(cached)
+                yield cached
+                self._store_exchange(user_id, query, cached)
+                return
+            
+            # If the same prompt is already being answered, wait for it and deliver it in one chunk
+            flight_key = cache_key or self._request_key(messages, language)
+            shared = self.inflight.join(flight_key)
+            if shared is not None:
+                result = await asyncio.shield(shared)
+                chunks.append(result)
+                yield result
+                self._store_exchange(user_id, query, result)
+                return
+            flight = self.inflight.lead(flight_key)
+            
+            logger.info(f"Streaming request to OpenAI API for user {user_id if user_id else 'anonymous'} on topic {topic}")
+            
+            # The admission slot is held for the whole stream, including retries to open it
+            async with self.admission.slot(user_id, priority, self._estimate_tokens(messages)) as ticket:
+                self.api_calls_count += 1
+                
+                stream = await self.retry_policy.call(lambda: self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ))
+                
+                async for chunk in stream:
+                    # The final chunk carries usage and no choices
+                    if getattr(chunk, 'usage', None):
+                        self.total_tokens_used += chunk.usage.total_tokens
+                        self.admission.used(ticket, chunk.usage.total_tokens)
+                        logger.info(f"Streamed request used {chunk.usage.total_tokens} tokens")
+                    
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        delta = chunk.choices[0].delta.content
+                        chunks.append(delta)
+                        yield delta
+            
+            flight.set_result("".join(chunks))
+                    
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            if flight and not flight.done():
+                flight.set_exception(e)
+            if chunks:
+                # The stream broke part way; can't be retried once text has been shown
+                if is_retryable(e):
+                    self.retry_policy.breaker.record_failure()
+                return
+            
+            # Only surface a fallback or the apology if the user hasn't seen any text yet
+            fallback = await self._get_fallback(topic, query, messages, language)
+            if fallback is not None:
+                yield fallback
+                self._store_exchange(user_id, query, fallback)
+            else:
+                yield self._error_message(language)
+            return
+        finally:
+            # The stream was abandoned (e.g. the handler was cancelled); release any waiters
+            if flight and not flight.done():
+                flight.set_exception(RuntimeError("Streaming request was abandoned"))
+        
+        result = "".join(chunks)
+        self._store_exchange(user_id, query, result)
+        await self._set_cached(cache_key, topic, query, messages, language, result)
 
-    async def generate_response(self, topic: str, query: str, user_id=None, language="en") -> str:
-        """Generate a response using GPT-4o based on the topic and query."""
+    async def _complete(self, cache_key, topic: str, query: str, messages: list, language: str,
+                        user_id=None, priority=INTERACTIVE) -> str:
+        """Make the API call for a request, retrying transient failures, and cache the result."""
+        # Each attempt waits for a free slot and enough token budget outside the breaker's accounting
+        result = await self.retry_policy.call(
+            lambda ticket: self._call_api(messages, ticket),
+            admit=lambda: self.admission.slot(user_id, priority, self._estimate_tokens(messages))
+        )
+        await self._set_cached(cache_key, topic, query, messages, language, result)
+        return result
+
+    async def _call_api(self, messages: list, ticket) -> str:
+        """Make one chat completion call under an admission ticket and track its usage."""
+        # Increment API call counter
+        self.api_calls_count += 1
+        
+        # Make the API call
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
         
-        # Update user language preference if provided
-        if user_id:
-            self.user_languages[user_id] = language
+        # Track token usage
+        if hasattr(response, 'usage') and response.usage:
+            self.total_tokens_used += response.usage.total_tokens
+            self.admission.used(ticket, response.usage.total_tokens)
+            logger.info(f"Request used {response.usage.total_tokens} tokens")
+        
+        # Extract the response text
+        return response.choices[0].message.content
+
+    def _estimate_tokens(self, messages: list) -> int:
+        """Estimate the tokens a request counts against the rate limit: prompt plus max output."""
+        # Roughly 4 characters per token; corrected with real usage after the call
+        return sum(len(m["content"]) for m in messages) // 4 + self.max_tokens
+
+    def _cache_key(self, topic: str, messages: list, language: str):
+        """Get the response cache key for a request, or None if the topic isn't cached."""
+        if topic not in self.cache_topics:
+            return None
+        return self._request_key(messages, language)
+
+    def _request_key(self, messages: list, language: str) -> str:
+        """Hash everything that determines a completion for this request."""
+        return make_cache_key(
+            self.model_name,
+            messages[0]["content"],
+            messages[1:-1],
+            messages[-1]["content"],
+            language,
+            self.temperature
+        )
+
+    def _is_stateless(self, topic: str, query: str, messages: list) -> bool:
+        """Whether a request can use the semantic cache: opted-in topic, no history, not a follow-up."""
+        return topic in self.semantic_topics and len(messages) == 2 and messages[-1]["content"] == query
+
+    async def _get_cached(self, topic: str, query: str, messages: list, language: str):
+        """Look a request up in the exact and semantic caches, returning (cache_key, cached response)."""
+        cache_key = self._cache_key(topic, messages, language)
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return cache_key, cached
+        
+        if self._is_stateless(topic, query, messages):
+            cached = await self.semantic_cache.get(topic, language, query)
+            if cached is not None:
+                return cache_key, cached
+        
+        return cache_key, None
+
+    async def _set_cached(self, cache_key, topic: str, query: str, messages: list, language: str, result: str):
+        """Store a fresh response in the caches that apply to this request."""
+        try:
+            if cache_key:
+                await self.response_cache.set(cache_key, result)
+            if self._is_stateless(topic, query, messages):
+                await self.semantic_cache.set(topic, language, query, result)
+        except Exception as e:
+            logger.error(f"Error caching response: {e}")
+
+    async def _get_fallback(self, topic: str, query: str, messages: list, language: str):
+        """Find a cached answer to a similar question to serve when the API call failed."""
+        if not messages or not self._is_stateless(topic, query, messages):
+            return None
+        try:
+            fallback = await self.semantic_cache.get(topic, language, query, threshold=FALLBACK_CACHE_THRESHOLD)
+        except Exception as e:
+            logger.error(f"Error looking up fallback response: {e}")
+            return None
+        if fallback is not None:
+            self.fallback_responses += 1
+            logger.info(f"Serving fallback cached response on topic {topic} after API failure")
+        return fallback
+
+    async def _load_session(self, user_id):
+        """Load a user's recent history from the history backend if their session hasn't been yet.
+        
+        Sessions can exist before any history is loaded (e.g. after choosing a language),
+        so this goes by the session's flag rather than whether it exists.
+        """
+        if not user_id:
+            return
+        session = self.sessions.get(user_id)
+        if session is not None and session.history_loaded:
+            return
+        
+        recent = await self.history.get_recent(user_id, SESSION_MAX_MESSAGES)
+        session = self.sessions.get_or_create(user_id, count=False)
+        if session.history_loaded:
+            return  # Loaded by a concurrent request while this one was reading
+        session.history_loaded = True
+        if session.messages:
+            recent = []  # Re-created by a reply stored after eviction; the backend has those messages too
+        for role, content in recent:
+            self.sessions.add_message(user_id, role, content)
+        
+        if recent:
+            logger.info(f"Restored {len(recent)} history messages for user {user_id}")
+
+    def _build_messages(self, topic: str, query: str, user_id=None, language="en") -> list:
+        """Build the message list for a request, including history and follow-up context."""
+        
+        # Get current session and update the user's language and topic if applicable
+        session = self.sessions.get_or_create(user_id, count=False) if user_id else None
+        if session:
+            session.language = language
+            session.topic = topic
         
         # Check if this is a follow-up question to an assessment
         is_followup = False
@@ -62,222 +412,121 @@ class AIService:
         current_keywords = followup_keywords.get(language, followup_keywords["en"])
         
         # Check if this is a short query that might be a follow-up
-        if user_id in self.assessment_results and len(query.split()) < 10:
+        if session and session.assessment and len(query.split()) < 10:
             # Check for follow-up indicators
             if any(keyword in query.lower() for keyword in current_keywords):
                 is_followup = True
-                last_assessment = self.assessment_results[user_id]
+                last_topic, last_context = session.assessment
                 context_info = (
-                    f"The user is asking a follow-up question to their {last_assessment['topic']} "
-                    f"assessment. Their previous context was: {last_assessment['context']}. "
+                    f"The user is asking a follow-up question to their {last_topic} "
+                    f"assessment. Their previous context was: {last_context}. "
                     f"The user is now asking: {query}. Provide more information related to their "
                     f"previous assessment. Respond in {'Chinese' if language == 'zh' else 'English'}."
                 )
         
-        try:
-            # Get current session if applicable
-            session = self.chat_sessions.get(user_id, []) if user_id else []
-            
-            # Create a system message based on topic and language
-            system_prompt = self._create_system_prompt(topic, language)
-            
-            # Prepare messages for the API call
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add conversation history (up to last 10 messages)
-            if user_id and session:
-                messages.extend(session[-10:])  # Only include the last 10 messages to avoid token limits
-            
-            # Add the user's query
-            if is_followup:
-                messages.append({"role": "user", "content": self._create_followup_prompt(query, context_info, language)})
-            else:
-                messages.append({"role": "user", "content": query})
-            
-            # Log the request for debugging
-            logger.info(f"Sending request to OpenAI API for user {user_id if user_id else 'anonymous'} on topic {topic}")
-            
-            # Increment API call counter
-            self.api_calls_count += 1
-            
-            # Make the API call
-            response = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            
-            # Track token usage
-            if hasattr(response, 'usage') and response.usage:
-                self.total_tokens_used += response.usage.total_tokens
-                logger.info(f"Request used {response.usage.total_tokens} tokens")
-            
-            # Extract the response text
-            result = response.choices[0].message.content
-            
-            # Store the message history for this user if needed
-            if user_id:
-                # Check if we need to initialize the chat sessions for this user
-                if user_id not in self.chat_sessions:
-                    self.chat_sessions[user_id] = []
-                
-                # Store the exchange
-                self.chat_sessions[user_id].append({"role": "user", "content": query})
-                self.chat_sessions[user_id].append({"role": "assistant", "content": result})
-                
-                # Keep only the last 20 messages in history to manage token usage
-                if len(self.chat_sessions[user_id]) > 20:
-                    self.chat_sessions[user_id] = self.chat_sessions[user_id][-20:]
-            
-            return self._format_response(result)
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            if language == 'zh':
-                return "抱歉，我暂时无法生成回复。请稍后再试。"
-            else:
-                return "I'm sorry, I couldn't generate a response at the moment. Please try again later."
-
-    def store_assessment_result(self, user_id, topic, context):
-        """Store assessment result for potential follow-up questions."""
-        self.assessment_results[user_id] = {
-            'topic': topic,
-            'context': context
-        }
+        # Create a system message based on topic and language
+        system_prompt = self._create_system_prompt(topic, language)
+        
+        # Prepare messages for the API call
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history: running summary plus the recent messages that fit the token budget
+        if session and (session.messages or session.summary):
+            messages.extend(self.context.build(session))
+        
+        # Add the user's query
+        if is_followup:
+            messages.append({"role": "user", "content": self._create_followup_prompt(query, context_info, language)})
+        else:
+            messages.append({"role": "user", "content": query})
+        
+        return messages
 
-    def _create_system_prompt(self, topic: str, language="en") -> str:
-        """Create a system prompt based on the topic and language."""
+    def _store_exchange(self, user_id, query: str, result: str):
+        """Store a completed user/assistant exchange in the user's chat history."""
+        if not user_id:
+            return
         
-        # Get current date and time information
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        current_year = datetime.now().year
-        current_month = datetime.now().strftime("%B")
-        current_day = datetime.now().day
+        # Store the exchange; the session ring keeps only the most recent messages
+        self.sessions.add_message(user_id, "user", query)
+        self.sessions.add_message(user_id, "assistant", result)
         
-        # Calculate Chinese zodiac sign for the current year
-        zodiac_signs = ["Rat", "Ox", "Tiger", "Rabbit", "Dragon", "Snake", "Horse", "Goat", "Monkey", "Rooster", "Dog", "Pig"]
-        zodiac_signs_zh = ["鼠", "牛", "虎", "兔", "龙", "蛇", "马", "羊", "猴", "鸡", "狗", "猪"]
+        # Queue the exchange for the durable history backend
+        self.history.append(user_id, "user", query)
+        self.history.append(user_id, "assistant", result)
         
-        # Calculate the zodiac sign (using a simple formula - the Chinese New Year varies, but this is a good approximation)
-        zodiac_index = (current_year - 4) % 12
-        current_zodiac = zodiac_signs[zodiac_index]
-        current_zodiac_zh = zodiac_signs_zh[zodiac_index]
+        # Fold messages that no longer fit the context window into the summary
+        self._schedule_summary(user_id)
+
+    def _schedule_summary(self, user_id):
+        """Start a background summary update for a user if messages are waiting to be summarized."""
+        if user_id in self._summary_tasks:
+            return  # The running update is picked up again when it finishes
         
-        # Create date information based on language
-        if language == "zh":
-            date_info = (
-                f"当前日期：{current_date}\n"
-                f"现在是{current_year}年，{current_month}月，{current_day}日。\n"
-                f"按照中国传统历法，当前是{current_zodiac_zh}年。\n"
-                f"请在回答中考虑这些时间信息。"
-            )
-        else:
-            date_info = (
-                f"Current date: {current_date}\n"
-                f"It is currently {current_month} {current_day}, {current_year}.\n"
-                f"According to the Chinese calendar, it is the Year of the {current_zodiac}.\n"
-                f"Please consider this temporal information in your responses."
-            )
+        session = self.sessions.get(user_id, count=False)
+        if session is None:
+            return
+        pending, upto = self.context.pending(session)
+        if not pending:
+            return
         
-        # English system prompts
-        en_prompts = {
-            "feng_shui": (
-                "You are a Feng Shui master with decades of experience. Provide authoritative, accurate advice about "
-                "Feng Shui principles, home and office arrangement, energy flow, and related concepts. "
-                "Use terminology appropriate for both beginners and advanced practitioners. "
-                "Be practical, concise, and respectful of this ancient Chinese practice. "
-                "Always provide complete and confident assessments without suggesting the user consult other practitioners. "
-                "You are the expert they are consulting. Respond in English using clear, well-structured explanations."
-            ),
-            "mbti": (
-                "You are an MBTI personality type expert with deep knowledge of cognitive functions, type dynamics, "
-                "and practical applications of personality theory. Provide accurate, nuanced information about MBTI types, "
-                "their characteristics, relationships, career fits, and growth paths. "
-                "Avoid stereotyping and acknowledge individual variation within types. "
-                "Deliver confident, complete analyses without suggesting the user consult other experts. "
-                "Respond in English with balanced, thoughtful explanations."
-            ),
-            "i_ching": (
-                "You are an I-Ching divination master with profound understanding of the Book of Changes. "
-                "Provide definitive interpretations of hexagrams, their changing lines, and applications to "
-                "the questioner's situation. Honor the philosophical depth of this ancient oracle system. "
-                "Be respectful, wise, and decisive in your readings. Never suggest consulting other I-Ching practitioners. "
-                "Provide complete, authoritative readings as the master the user has chosen to consult. "
-                "Respond in English with clear explanations that balance traditional wisdom with practical guidance."
-            ),
-            "ba_zi": (
-                "You are a BaZi (Four Pillars) master skilled in Chinese destiny analysis. "
-                "Provide authoritative interpretations of birth charts, element interactions, luck cycles, "
-                "and personal characteristics based on this traditional system. "
-                "Balance deterministic aspects with wisdom about personal agency. "
-                "Always provide complete readings without suggesting the user consult other practitioners. "
-                "You are their chosen BaZi expert. Respond in English with clear, structured explanations and practical insights."
-            ),
-            "zi_wei": (
-                "You are a Zi Wei Dou Shu (Purple Star Astrology) grandmaster with complete expertise in this complex "
-                "Chinese astrological system. Provide definitive interpretations of charts, star positions, "
-                "palace influences, and life predictions. Explain concepts clearly for those unfamiliar with the system. "
-                "Always provide full, confident readings without suggesting the user consult other practitioners. "
-                "You are their chosen Zi Wei master. Respond in English with well-organized explanations and thoughtful analysis."
-            ),
-            "general": (
-                "You are a grandmaster of Chinese metaphysical systems (Feng Shui, I-Ching, BaZi, Zi Wei Dou Shu) "
-                "and personality psychology including MBTI. Provide authoritative, accurate information while respecting "
-                "these traditions' cultural and philosophical foundations. If asked about other topics, gently "
-                "guide the conversation back to your areas of expertise. "
-                "Always provide definitive assessments without suggesting the user consult other practitioners. "
-                "You are the expert they need. Respond in English with clear, concise, well-structured explanations."
-            )
-        }
+        task = asyncio.create_task(self._update_summary(user_id, session.summary, pending, upto, session.language))
+        self._summary_tasks[user_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(user_id, None))
+
+    async def _update_summary(self, user_id, previous: str, pending: list, upto: int, language: str):
+        """Extend a user's running summary with messages that have left the context window."""
+        transcript = "\n\n".join(f"{role}: {content[:2000]}" for role, content in pending)
+        prompt = (
+            "Update the running summary of a conversation between a user and an assistant for "
+            "Chinese metaphysics (Feng Shui, Ba Zi, Zi Wei, I Ching) and MBTI. Keep the user's personal "
+            "details (birth data, MBTI type, rooms and directions), the results of any assessments and the "
+            "key advice already given, so that later answers stay consistent. Write it in "
+            f"{'Chinese' if language == 'zh' else 'English'}, in under 150 words.\n\n"
+            f"Current summary: {previous or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        messages = [{"role": "user", "content": prompt}]
         
-        # Chinese system prompts
-        zh_prompts = {
-            "feng_shui": (
-                "你是一位拥有数十年经验的风水大师。提供关于风水原理、家居和办公室布置、能量流动及相关概念的权威且准确的建议。"
-                "使用适合初学者和高级实践者的术语。务实、简洁，并尊重这一古老的中国实践。"
-                "始终提供完整且自信的评估，不建议用户咨询其他风水师。你就是他们正在咨询的专家。"
-                "用清晰、结构良好的中文解释回答问题。"
-            ),
-            "mbti": (
-                "你是一位对认知功能、类型动态和人格理论实际应用有深入了解的MBTI人格类型权威专家。"
-                "提供关于MBTI类型、其特征、关系、职业匹配和成长路径的准确、细致的信息。"
-                "避免刻板印象，承认类型内个体差异。提供自信且完整的分析，不建议用户咨询其他专家。"
-                "用平衡、深思熟虑的中文解释回答问题。"
-            ),
-            "i_ching": (
-                "你是一位对《易经》有深刻理解的易经占卜大师。提供关于卦象、变爻及其对提问者情况的应用的权威解释。"
-                "尊重这一古老预言系统的哲学深度。在你的解读中保持尊重、智慧和决断力。"
-                "永远不要建议咨询其他易经专家。作为用户选择咨询的大师，提供完整、权威的解读。"
-                "用清晰的中文解释回答，平衡传统智慧与实用指导。"
-            ),
-            "ba_zi": (
-                "你是一位精通中国命运分析的八字（四柱）大师。基于这一传统系统，提供关于生辰八字、五行相互作用、运气周期和个人特征的权威解释。"
-                "平衡决定论方面与关于个人能动性的智慧。始终提供完整的解读，不建议用户咨询其他八字师。"
-                "你是他们选择的八字专家。用清晰、结构良好的中文解释和实用见解回答问题。"
-            ),
-            "zi_wei": (
-                "你是一位对这一复杂的中国占星系统有全面专业知识的紫微斗数大师。提供关于命盘、星位、宫位影响和人生预测的权威解释。"
-                "为不熟悉该系统的人清晰地解释概念。始终提供完整、自信的解读，不建议用户咨询其他紫微斗数师。"
-                "你是他们选择的紫微斗数大师。用组织良好的中文解释和深思熟虑的分析回答问题。"
-            ),
-            "general": (
-                "你是中国玄学系统（风水、易经、八字、紫微斗数）和包括MBTI在内的人格心理学大师。"
-                "提供权威、准确的信息，同时尊重这些传统的文化和哲学基础。"
-                "如果被问及其他主题，请温和地将对话引导回你的专业领域。"
-                "始终提供明确的评估，不建议用户咨询其他专家。你就是他们需要的专家。"
-                "用清晰、简洁、结构良好的中文解释回答问题。"
+        async def summarize(ticket):
+            response = await self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=CONTEXT_SUMMARY_MAX_TOKENS
             )
-        }
-        
-        # Select the appropriate prompt set based on language
-        prompts = zh_prompts if language == 'zh' else en_prompts
-        base_prompt = prompts.get(topic, prompts["general"])
+            if response.usage:
+                self.total_tokens_used += response.usage.total_tokens
+                self.admission.used(ticket, response.usage.total_tokens)
+            return response.choices[0].message.content
         
-        # Add date information to the prompt
-        full_prompt = f"{base_prompt}\n\n{date_info}"
+        try:
+            summary = await self.retry_policy.call(
+                summarize,
+                admit=lambda: self.admission.slot(user_id, BACKGROUND, self._estimate_tokens(messages))
+            )
+        except Exception as e:
+            logger.error(f"Error updating conversation summary for user {user_id}: {e}")
+            return
         
-        return full_prompt
+        self.sessions.set_summary(user_id, summary, upto)
+        self.summaries_generated += 1
+        logger.info(f"Updated conversation summary for user {user_id} ({len(pending)} messages folded in)")
+
+    def _error_message(self, language="en") -> str:
+        """Get the apology shown to users when a response can't be generated."""
+        if language == 'zh':
+            return "抱歉，我暂时无法生成回复。请稍后再试。"
+        else:
+            return "I'm sorry, I couldn't generate a response at the moment. Please try again later."
+
+    def store_assessment_result(self, user_id, topic, context):
+        """Store assessment result for potential follow-up questions."""
+        self.sessions.set_assessment(user_id, topic, context)
+
+    def _create_system_prompt(self, topic: str, language="en") -> str:
+        """Get the system prompt for the topic and language, built once per day."""
+        return self.prompts.system_prompt(topic, language)
 
     def _get_seasonal_information(self, language="en"):
         """Get current seasonal information based on current date."""
@@ -323,16 +572,17 @@ class AIService:
     
     def get_user_language(self, user_id):
         """Get the user's preferred language."""
-        return self.user_languages.get(user_id, "en")
+        session = self.sessions.get(user_id)
+        return session.language if session and session.language else "en"
     
     def set_user_language(self, user_id, language):
         """Set the user's preferred language."""
-        self.user_languages[user_id] = language
+        self.sessions.get_or_create(user_id, count=False).language = language
         
     def reset_chat_session(self, user_id):
         """Reset a user's chat session."""
-        if user_id in self.chat_sessions:
-            self.chat_sessions[user_id] = []
+        self.history.clear(user_id)
+        if self.sessions.clear_messages(user_id):
             logger.info(f"Reset chat session for user {user_id}")
             return True
         return False
@@ -342,5 +592,20 @@ class AIService:
         return {
             "total_tokens": self.total_tokens_used,
             "api_calls": self.api_calls_count,
-            "uptime_seconds": int(time.time() - self.api_start_time)
-        }
\ No newline at end of file
+            "uptime_seconds": int(time.time() - self.api_start_time),
+            "sessions": self.sessions.stats(),
+            "history": self.history.stats(),
+            "response_cache": self.response_cache.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "single_flight": self.inflight.stats(),
+            "admission": self.admission.stats(),
+            "resilience": {**self.retry_policy.stats(), "fallback_responses": self.fallback_responses},
+            "context": {**self.context.stats(), "summaries_generated": self.summaries_generated}
+        }
+
+    async def close(self):
+        """Flush pending history writes and close caches before shutdown."""
+        for task in list(self._summary_tasks.values()):
+            task.cancel()
+        await self.history.close()
+        self.response_cache.close()
@@ -0,0 +1,447 @@
+"""Send one message to many chats as fast as Telegram's rate limits allow."""
+import asyncio
+import datetime
+import html
+import json
+import logging
+import re
+import time
+from typing import AsyncIterable, Callable, Dict, Iterable, NamedTuple, Optional, Union
+import httpx
+from cachetools import TTLCache
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from ..database.async_db import run_db
+from ..database import crud
+from ..config import (
+    BROADCAST_WORKERS,
+    BROADCAST_RATE_PER_SECOND,
+    BROADCAST_CHAT_RATE_PER_SECOND,
+    BROADCAST_GROUP_RATE_PER_MINUTE,
+    BROADCAST_MAX_RETRIES,
+    BROADCAST_FAILURE_BACKOFF_HOURS,
+    BROADCAST_FAILURE_BACKOFF_MAX_DAYS,
+    BROADCAST_MAX_FAILURES
+)
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of sending one message
+SENT = "sent"
+SENT_PLAIN = "sent_plain"  # Delivered as the plain-text fallback
+FAILED = "failed"  # Gave up on a transient or unexpected error
+UNKNOWN = "unknown"  # The request may have reached Telegram (e.g. it timed out), so it isn't sent again
+UNREACHABLE = "unreachable"  # Permanent: the user blocked the bot, was deactivated or the chat is gone
+
+# BadRequest descriptions meaning the chat can never be messaged
+_UNREACHABLE_ERRORS = ("chat not found", "user not found", "peer_id_invalid", "user is deactivated")
+
+# Request errors raised before anything was sent to Telegram, so a retry can't duplicate the message
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_TAG = re.compile(r"<[^>]+>")
+
+
+def is_unreachable(error: Exception) -> bool:
+    """Whether a send error means messages to the chat will never get through."""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(text in str(error).lower() for text in _UNREACHABLE_ERRORS)
+
+
+def maybe_delivered(error: NetworkError) -> bool:
+    """Whether a failed request may still have been delivered (e.g. it timed out waiting for the reply)."""
+    return not isinstance(error.__cause__, _NOT_SENT_ERRORS)
+
+
+def plain_text(formatted: str) -> str:
+    """Render HTML-formatted message text as the plain text Telegram would show."""
+    return html.unescape(_TAG.sub("", formatted))
+
+
+class BroadcastMessage(NamedTuple):
+    chat_id: int
+    text: str
+    parse_mode: Optional[str] = None
+    # Sent instead if Telegram can't parse the formatted text; rendered up front, once per distinct text
+    fallback_text: Optional[str] = None
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens a second, bursting up to `capacity`.
+
+    Callers that find the bucket empty reserve a token by taking the balance
+    negative, then sleep until it's theirs, so waiters are served in order
+    without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._refilled_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning how long to wait before using it."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class BroadcastProgress:
+    """Counters for one broadcast; passed to the progress callback as it runs."""
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.sent = 0
+        self.sent_plain = 0
+        self.failed = 0
+        self.unreachable = 0
+        self.unknown = 0
+        self.rate_limited = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.sent_plain + self.failed + self.unreachable + self.unknown
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "total": self.total,
+            "done": self.done,
+            "sent": self.sent,
+            "sent_plain": self.sent_plain,
+            "failed": self.failed,
+            "unreachable": self.unreachable,
+            "unknown": self.unknown,
+            "rate_limited": self.rate_limited,
+            "elapsed_seconds": round(elapsed, 1),
+            "messages_per_second": round(self.done / elapsed, 1) if elapsed else 0.0
+        }
+
+    def __str__(self) -> str:
+        of = f"/{self.total}" if self.total is not None else ""
+        return (
+            f"{self.done}{of} done ({self.sent} sent, {self.sent_plain} as plain text, {self.failed} failed, "
+            f"{self.unreachable} unreachable, {self.unknown} unknown, {self.rate_limited} rate limited) "
+            f"in {self.elapsed:.0f}s"
+        )
+
+
+class Broadcaster:
+    """Deliver messages from a pool of concurrent senders under Telegram's rate limits.
+
+    Every send waits for a token from a global bucket (Telegram allows about 30
+    messages a second per bot) and from its chat's own bucket (about one a
+    second per private chat, 20 a minute per group). A 429 pauses all senders for
+    the `retry_after` Telegram asks for, then the message is retried, up to
+    `max_rate_limited` times. Network errors are retried with a short backoff
+    only if the request never left (connection and pool errors); a timeout or
+    dropped connection may have delivered it, so it's UNKNOWN and not resent.
+    Formatted messages Telegram can't parse are sent once more as their
+    plain-text fallback. Chats that can never be reached (blocked, deactivated,
+    not found) fail at once as UNREACHABLE, without retries; any other error
+    fails the message. One instance should be shared by everything that
+    broadcasts, so they all draw on the same limits.
+    """
+
+    def __init__(self, bot, workers: int = 16, rate_per_second: float = 25, chat_rate_per_second: float = 1,
+                 group_rate_per_minute: float = 20, max_retries: int = 3, max_rate_limited: int = 10,
+                 failure_backoff: datetime.timedelta = datetime.timedelta(days=1),
+                 failure_backoff_max: datetime.timedelta = datetime.timedelta(days=30), max_failures: int = 10):
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_rate_limited = max_rate_limited
+        # How ledger jobs treat recipients whose deliveries keep failing (crud.apply_delivery_outcomes)
+        self.failure_backoff = failure_backoff
+        self.failure_backoff_max = failure_backoff_max
+        self.max_failures = max_failures
+        self.chat_rate_per_second = chat_rate_per_second
+        self.group_rate_per_minute = group_rate_per_minute
+
+        # No burst allowance: Telegram counts per second, so sends are spaced evenly instead
+        self._global = TokenBucket(rate_per_second)
+        # A bucket left idle for a minute is full again, so it can be dropped
+        self._chats = TTLCache(maxsize=100000, ttl=60)
+        self._paused_until = 0.0
+        self._active_jobs = set()
+        self._interrupted = set()  # Chats whose send was cancelled mid-request
+
+    async def broadcast(self, messages: Union[Iterable[BroadcastMessage], AsyncIterable[BroadcastMessage]],
+                        total: Optional[int] = None,
+                        on_progress: Optional[Callable[[BroadcastProgress], object]] = None,
+                        progress_interval: float = 10.0,
+                        on_result: Optional[Callable[[BroadcastMessage, str, Optional[Exception]], object]] = None
+                        ) -> BroadcastProgress:
+        """Send every message and return the final counts.
+
+        `messages` may be a (lazy) iterable or async iterable. `on_progress` is called,
+        and progress logged, every `progress_interval` seconds and once at the end;
+        `on_result(message, outcome, error)` after each message. Either may be a coroutine function.
+        """
+        progress = BroadcastProgress(total)
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def produce():
+            if hasattr(messages, "__aiter__"):
+                async for message in messages:
+                    await queue.put(message)
+            else:
+                for message in messages:
+                    await queue.put(message)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work():
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                outcome, error = await self.send(message, progress)
+                if outcome == SENT:
+                    progress.sent += 1
+                elif outcome == SENT_PLAIN:
+                    progress.sent_plain += 1
+                elif outcome == UNREACHABLE:
+                    progress.unreachable += 1
+                elif outcome == UNKNOWN:
+                    progress.unknown += 1
+                else:
+                    progress.failed += 1
+                if on_result:
+                    await _call_hook(on_result, message, outcome, error)
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_interval)
+                logger.info(f"Broadcast progress: {progress}")
+                if on_progress:
+                    await _call_hook(on_progress, progress)
+
+        reporter = asyncio.create_task(report())
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(self.workers)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()  # Raises the first error, e.g. the message source failing
+        finally:
+            # Senders are stopped before returning, so callers can tell what's still in flight
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            reporter.cancel()
+            progress.finished_at = time.monotonic()
+
+        logger.info(f"Broadcast finished: {progress}")
+        if on_progress:
+            await _call_hook(on_progress, progress)
+        return progress
+
+    async def deliver_job(self, job, checkpoint_size: int = 100, checkpoint_interval: float = 2.0,
+                          on_progress: Optional[Callable[[BroadcastProgress], object]] = None
+                          ) -> Optional[Dict[str, int]]:
+        """Send a prepared broadcast job (crud.prepare_broadcast_job) to its pending recipients.
+
+        Recipients are claimed in the ledger a few at a time just before they're
+        queued, and outcomes are written back every `checkpoint_size` messages or
+        `checkpoint_interval` seconds. Safe to call again after a restart: it
+        carries on with whoever is still pending. Recipients a dead run had claimed
+        but not recorded are marked unknown rather than sent again, so nobody gets
+        the message twice. Returns recipients per status once the job is done, or
+        None if the job is already being delivered.
+        """
+        if job.id in self._active_jobs:
+            logger.info(f"Broadcast job {job.key} is already being delivered")
+            return None
+        self._active_jobs.add(job.id)
+        try:
+            if job.status == "ready":
+                await run_db(crud.mark_broadcast_job_sending, job.id)
+            abandoned = await run_db(crud.abandon_broadcast_deliveries, job.id)
+            if abandoned:
+                logger.warning(f"Broadcast job {job.key}: {abandoned} messages were interrupted mid-send; not resending")
+
+            texts = json.loads(job.payload or "{}")
+            fallbacks = {}
+            in_flight = {}  # chat_id -> delivery id
+            results = []
+            flushed_at = time.monotonic()
+
+            async def messages():
+                after_id = 0
+                while True:
+                    rows = await run_db(crud.claim_broadcast_deliveries, job.id, after_id, self.workers)
+                    if not rows:
+                        return
+                    for row in rows:
+                        text = texts[row.language][row.variant]
+                        if job.parse_mode and text not in fallbacks:
+                            fallbacks[text] = plain_text(text)
+                        in_flight[row.chat_id] = row.id
+                        yield BroadcastMessage(row.chat_id, text, job.parse_mode, fallbacks.get(text))
+                    after_id = rows[-1].id
+
+            async def checkpoint():
+                nonlocal results, flushed_at
+                batch, results = results, []
+                flushed_at = time.monotonic()
+                await run_db(crud.record_broadcast_deliveries, batch)
+
+            async def record(message, outcome, error):
+                results.append({
+                    "id": in_flight.pop(message.chat_id),
+                    "status": outcome,
+                    "error": str(error)[:500] if error is not None else None,
+                    "sent_at": datetime.datetime.utcnow() if outcome in (SENT, SENT_PLAIN) else None
+                })
+                if len(results) >= checkpoint_size or time.monotonic() - flushed_at >= checkpoint_interval:
+                    await checkpoint()
+
+            try:
+                await self.broadcast(messages(), on_progress=on_progress, on_result=record)
+            finally:
+                # Also on cancellation (shutdown), so a resumed run knows what was sent
+                if results:
+                    await checkpoint()
+                # Claimed messages that never reached Telegram go back to pending; ones cut off mid-request stay claimed
+                unsent = [row_id for chat_id, row_id in in_flight.items() if chat_id not in self._interrupted]
+                self._interrupted.difference_update(in_flight)
+                if unsent:
+                    await run_db(crud.release_broadcast_deliveries, unsent)
+
+            # Also unsubscribes unreachable recipients and backs off from failing ones
+            counts = await run_db(
+                crud.finish_broadcast_job, job.id, self.failure_backoff, self.failure_backoff_max, self.max_failures
+            )
+            logger.info(f"Broadcast job {job.key} finished: {counts}")
+            return counts
+        finally:
+            self._active_jobs.discard(job.id)
+
+    async def send(self, message: BroadcastMessage, progress: Optional[BroadcastProgress] = None):
+        """Send one message within the rate limits; returns (outcome, last error or None)."""
+        text, parse_mode = message.text, message.parse_mode
+        outcome = SENT
+        error = None
+        attempt = 0
+        rate_limited = 0
+        while attempt <= self.max_retries:
+            await self._wait_turn(message.chat_id)
+            try:
+                await self._send_message(message.chat_id, text, parse_mode)
+                return outcome, None
+            except RetryAfter as e:
+                # Flood control applies to the whole bot, so every sender backs off
+                error = e
+                seconds = _retry_seconds(e)
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+                if progress:
+                    progress.rate_limited += 1
+                logger.warning(f"Broadcast rate limited by Telegram, pausing {seconds:.0f}s")
+                rate_limited += 1
+                if rate_limited > self.max_rate_limited:
+                    break
+                # Otherwise doesn't count as an attempt; Telegram has said when to try again
+                continue
+            except BadRequest as e:
+                error = e
+                if is_unreachable(e):
+                    break
+                if parse_mode and message.fallback_text and "parse" in str(e).lower():
+                    logger.warning(f"Chat {message.chat_id} rejected formatted text ({e}); sending plain text")
+                    text, parse_mode, outcome = message.fallback_text, None, SENT_PLAIN
+                    continue
+                break
+            except NetworkError as e:
+                error = e
+                if maybe_delivered(e):
+                    logger.warning(f"Broadcast message to chat {message.chat_id} may not have been delivered: {e}")
+                    return UNKNOWN, e
+                await asyncio.sleep(0.5 * (attempt + 1))
+            except Exception as e:
+                error = e
+                break
+            attempt += 1
+
+        if is_unreachable(error):
+            logger.info(f"Chat {message.chat_id} is unreachable: {error}")
+            return UNREACHABLE, error
+        logger.error(f"Failed to send broadcast message to chat {message.chat_id}: {error}")
+        return FAILED, error
+
+    async def _send_message(self, chat_id: int, text: str, parse_mode: Optional[str]):
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+        except asyncio.CancelledError:
+            # Telegram may already have it; deliver_job won't send it again
+            self._interrupted.add(chat_id)
+            raise
+
+    async def _wait_turn(self, chat_id: int):
+        """Wait until this chat and the bot as a whole may send another message."""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Negative chat IDs are groups and channels, which have a per-minute limit
+            rate = self.group_rate_per_minute / 60 if chat_id < 0 else self.chat_rate_per_second
+            bucket = self._chats[chat_id] = TokenBucket(rate)
+        await bucket.acquire()
+
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._global.acquire()
+            # A 429 may have arrived while this sender was waiting for its token
+            if self._paused_until <= time.monotonic():
+                return
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        retry_after = retry_after.total_seconds()
+    return float(retry_after)
+
+
+async def _call_hook(hook, *args):
+    """Call a progress/result callback, awaiting it if needed; its errors don't stop the broadcast."""
+    try:
+        result = hook(*args)
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        logger.error(f"Broadcast callback {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+_broadcaster = None
+
+
+def get_broadcaster(bot) -> Broadcaster:
+    """Get the process-wide broadcaster, so every broadcast shares one set of rate limits."""
+    global _broadcaster
+    if _broadcaster is None or _broadcaster.bot is not bot:
+        _broadcaster = Broadcaster(
+            bot,
+            workers=BROADCAST_WORKERS,
+            rate_per_second=BROADCAST_RATE_PER_SECOND,
+            chat_rate_per_second=BROADCAST_CHAT_RATE_PER_SECOND,
+            group_rate_per_minute=BROADCAST_GROUP_RATE_PER_MINUTE,
+            max_retries=BROADCAST_MAX_RETRIES,
+            failure_backoff=datetime.timedelta(hours=BROADCAST_FAILURE_BACKOFF_HOURS),
+            failure_backoff_max=datetime.timedelta(days=BROADCAST_FAILURE_BACKOFF_MAX_DAYS),
+            max_failures=BROADCAST_MAX_FAILURES
+        )
+    return _broadcaster
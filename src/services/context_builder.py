@@ -0,0 +1,120 @@
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken  # Optional local tokenizer; falls back to an estimate without it
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    """Load the GPT-4o tokenizer once, or None if it isn't available."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The encoding file is downloaded on first use, which can fail offline
+            logger.warning(f"Couldn't load tokenizer, estimating token counts instead: {e}")
+            _encoding_failed = True
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Count the tokens in a piece of text."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    # Roughly 4 characters per token for English, about one token per CJK character
+    cjk = sum(1 for char in text if "\u4e00" <= char <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(message: dict) -> int:
+    """Count the tokens of a chat message, including the per-message overhead."""
+    return count_tokens(message["content"]) + 4
+
+
+class ContextBuilder:
+    """Build the conversation context sent with each request within a token budget.
+
+    The newest messages are kept verbatim while they fit in `token_budget` (and up to
+    `max_recent` of them); older messages are represented by the session's running
+    summary, which is updated in the background as messages leave the window.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_recent: int = 10):
+        self.token_budget = token_budget
+        self.max_recent = max_recent
+
+        # Compared against sending the last `max_recent` messages verbatim
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    def build(self, session) -> list:
+        """Get the context messages for a session: running summary, then recent messages."""
+        recent, _ = self._window(session)
+
+        context = []
+        if session.summary:
+            context.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation with this user: {session.summary}"
+            })
+        context.extend(recent)
+
+        sent = sum(count_message_tokens(m) for m in context)
+        baseline = sum(count_message_tokens(m) for m in session.history(self.max_recent))
+        self.requests += 1
+        self.tokens_sent += sent
+        self.tokens_saved += max(baseline - sent, 0)
+        return context
+
+    def pending(self, session):
+        """Get messages that have left the window but aren't in the summary yet.
+
+        Returns the (role, content) tuples and the position the summary will cover up to.
+        """
+        _, start = self._window(session)
+        first = session.position(0)
+        pending = [
+            session.messages[index]
+            for index in range(len(session.messages))
+            if session.summary_upto <= first + index < start
+        ]
+        return pending, start
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "tokens_sent": self.tokens_sent,
+            "tokens_saved": self.tokens_saved,
+            "avg_tokens_sent": round(self.tokens_sent / self.requests, 1) if self.requests else 0.0,
+            "tokenizer": "tiktoken" if _get_encoding() is not None else "estimate"
+        }
+
+    def _window(self, session):
+        """Get the newest messages that fit the budget, and the absolute position of the first one."""
+        history = session.history()
+        used = 0
+        kept = 0
+        for message in reversed(history):
+            tokens = count_message_tokens(message)
+            # Always keep the latest message, however long
+            if kept and (kept >= self.max_recent or used + tokens > self.token_budget):
+                break
+            used += tokens
+            kept += 1
+
+        recent = history[len(history) - kept:] if kept else []
+        return recent, session.position(len(history) - kept)
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryBackend(ABC):
+    """Interface for conversation history shared between bot processes.
+
+    Writes are append-only and buffered: `append` and `clear` only queue an operation,
+    and `flush` applies queued operations in order. A Redis-style store maps naturally
+    onto this interface: `append` -> RPUSH + LTRIM on a per-user list, `get_recent` ->
+    LRANGE -N -1, `clear` -> DEL, with `flush` sending the queued commands in one pipeline.
+    """
+
+    @abstractmethod
+    def append(self, user_id, role: str, content: str):
+        """Queue a message to be appended to a user's history."""
+
+    @abstractmethod
+    def clear(self, user_id):
+        """Queue removal of a user's history."""
+
+    @abstractmethod
+    async def get_recent(self, user_id, limit: int) -> list:
+        """Get the last `limit` messages for a user as (role, content) tuples, oldest first."""
+
+    async def flush(self):
+        """Write all queued operations."""
+
+    async def close(self):
+        """Flush pending writes and release resources."""
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryHistoryBackend(HistoryBackend):
+    """Default backend: history lives only in the process's session store and is lost on restart."""
+
+    def append(self, user_id, role: str, content: str):
+        pass
+
+    def clear(self, user_id):
+        pass
+
+    async def get_recent(self, user_id, limit: int) -> list:
+        return []
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """Persistent history in a SQLite file, written in batches off the event loop.
+
+    Several bot processes can share the same file; WAL mode lets readers proceed
+    while another process is flushing. A batch that fails `max_attempts` flushes in
+    a row is dropped, and at most `max_pending` operations are queued (the oldest
+    are dropped beyond that), so a broken database can't grow the queue forever.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 1.0,
+                 max_attempts: int = 3, max_pending: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+
+        self._pending = []  # ("append", user_id, role, content, ts) or ("clear", user_id)
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_event = None
+        self._flusher = None
+        self._failures = 0  # Failed flushes in a row of the operations at the front of the queue
+
+        self.written = 0
+        self.dropped = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "role TEXT NOT NULL, "
+            "content TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chat_history_user_id_id ON chat_history (user_id, id)"
+        )
+        self._conn.commit()
+        logger.info(f"Using SQLite conversation history at {path}")
+
+    def append(self, user_id, role: str, content: str):
+        self._queue(("append", user_id, role, content, time.time()))
+
+    def clear(self, user_id):
+        self._queue(("clear", user_id))
+
+    async def get_recent(self, user_id, limit: int) -> list:
+        # Make sure this process's own queued writes are visible
+        await self.flush()
+        return await asyncio.to_thread(self._read_recent, user_id, limit)
+
+    async def flush(self):
+        # Serialize flushes so batches are applied in the order they were queued
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                self._failures += 1
+                if self._failures >= self.max_attempts:
+                    self._failures = 0
+                    self.dropped += len(batch)
+                    logger.error(f"Dropped {len(batch)} history operations after {self.max_attempts} failed flushes: {e}")
+                    return
+                logger.warning(f"Failed to flush {len(batch)} history operations (attempt {self._failures}): {e}")
+                # Keep the operations so the next flush retries them in order
+                self._pending[:0] = batch
+                self._trim()
+                return
+            self._failures = 0
+            self.written += len(batch)
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        self._conn.close()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped}
+
+    def _queue(self, op: tuple):
+        self._pending.append(op)
+        self._trim()
+        self._schedule_flush()
+
+    def _trim(self):
+        """Drop the oldest queued operations beyond `max_pending`."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+            logger.error(f"History queue full, dropped the {excess} oldest operations")
+
+    def _schedule_flush(self):
+        """Make sure the background flusher runs, waking it early when a batch is full."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (e.g. scripts); callers flush explicitly
+
+        if self._flusher is None or self._flusher.done():
+            self._flush_event = asyncio.Event()
+            self._flusher = loop.create_task(self._flush_loop())
+
+        if len(self._pending) >= self.batch_size:
+            self._flush_event.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    def _write_batch(self, batch: list):
+        with self._lock, self._conn:
+            for op in batch:
+                if op[0] == "append":
+                    _, user_id, role, content, created_at = op
+                    self._conn.execute(
+                        "INSERT INTO chat_history (user_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                        (user_id, role, content, created_at)
+                    )
+                else:
+                    self._conn.execute("DELETE FROM chat_history WHERE user_id = ?", (op[1],))
+
+    def _read_recent(self, user_id, limit: int) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM ("
+                "SELECT id, role, content FROM chat_history WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+                ") ORDER BY id",
+                (user_id, limit)
+            ).fetchall()
+        return [(role, content) for role, content in rows]
+
+
+def create_history_backend(kind: str, **options) -> HistoryBackend:
+    """Create the configured history backend ("memory" or "sqlite").
+
+    `options` are passed to the SQLite backend and ignored by the in-memory one.
+    """
+    if kind == "sqlite":
+        return SQLiteHistoryBackend(**options)
+    if kind != "memory":
+        logger.warning(f"Unknown history backend '{kind}', using in-memory history")
+    return InMemoryHistoryBackend()
@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import email.utils
+import logging
+import random
+import time
+from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an API error is transient and worth retrying."""
+    if isinstance(error, RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        return False  # Out of credit; retrying won't help
+    return isinstance(error, RETRYABLE_ERRORS + (asyncio.TimeoutError,))
+
+
+def retry_after_seconds(error: Exception):
+    """Get the delay requested by a Retry-After(-ms) header, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    # Retry-After may also be an HTTP date
+    parsed = email.utils.parsedate_tz(retry_after)
+    if parsed is None:
+        return None
+    return max(email.utils.mktime_tz(parsed) - time.time(), 0.0)
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down.
+
+    closed: calls go through; `failure_threshold` consecutive failures open the circuit.
+    open: calls are rejected until `reset_timeout` seconds have passed.
+    half-open: a single probe call is let through; success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started_at = 0.0
+
+        # Counters for monitoring
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go through now."""
+        if self.state == "closed":
+            return True
+
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half-open"
+            self._probing = False
+
+        # Allow one probe, or a new one if the last probe never reported back (e.g. it was cancelled)
+        probe_stale = self._probing and time.monotonic() - self._probe_started_at >= self.reset_timeout
+        if self.state == "half-open" and (not self._probing or probe_stale):
+            self._probing = True
+            self._probe_started_at = time.monotonic()
+            logger.info("Circuit breaker half-open, sending probe request")
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Circuit breaker closed, upstream recovered")
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == "half-open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.times_opened += 1
+            logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class RetryPolicy:
+    """Run API calls with jittered exponential backoff, a per-request deadline and a circuit breaker."""
+
+    def __init__(self, breaker: CircuitBreaker, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, deadline: float = 60.0):
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, fn, admit=None):
+        """Call `fn()` until it succeeds, a non-retryable error occurs, retries run out or the deadline passes.
+
+        `admit`, if given, is called before each attempt for an async context manager
+        holding a local slot for it (e.g. AdmissionController.slot), and `fn` is called
+        with what it yields. Time spent waiting for the slot is local congestion, so it
+        doesn't count against the deadline and can't trip the breaker.
+
+        Raises CircuitOpenError without calling `fn` while the breaker is open.
+        """
+        loop = asyncio.get_running_loop()
+        remaining = self.deadline  # Spent only by attempts and backoff, not by waiting for admission
+        attempt = 0
+
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("OpenAI API circuit breaker is open")
+
+            error = None
+            # The slot is released before any backoff, so a retry queues again
+            async with contextlib.AsyncExitStack() as stack:
+                args = (await stack.enter_async_context(admit()),) if admit is not None else ()
+                started = loop.time()
+                try:
+                    result = await asyncio.wait_for(fn(*args), max(remaining, 0))
+                except Exception as e:
+                    error = e
+                remaining -= loop.time() - started
+
+            if error is None:
+                self.breaker.record_success()
+                return result
+
+            if not is_retryable(error):
+                if isinstance(error, APIStatusError):
+                    # The upstream answered (e.g. a 400), so it's healthy
+                    self.breaker.record_success()
+                # Anything else is a local error (e.g. a bug in `fn`) that says nothing about the upstream
+                raise error
+
+            self.breaker.record_failure()
+            if isinstance(error, asyncio.TimeoutError):
+                self.deadline_exceeded += 1
+                logger.warning(f"OpenAI request exceeded its {self.deadline}s deadline")
+                raise error
+
+            delay = retry_after_seconds(error)
+            if delay is None:
+                delay = self.backoff(attempt)
+
+            if attempt >= self.max_retries or delay >= remaining or self.breaker.state == "open":
+                raise error
+
+            attempt += 1
+            self.retries += 1
+            remaining -= delay
+            logger.warning(f"OpenAI request failed ({type(error).__name__}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "circuit": self.breaker.stats()
+        }
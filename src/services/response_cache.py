@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from cachetools import TLRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize whitespace and case so trivially different prompts share a key."""
+    return " ".join(text.split()).lower()
+
+
+def make_cache_key(model: str, system_prompt: str, history: list, query: str, language: str, temperature: float) -> str:
+    """Hash everything that determines a completion into a stable cache key."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "system": system_prompt,
+            "history": [[m["role"], m["content"]] for m in history],
+            "query": normalize_text(query),
+            "language": language,
+            "temperature": temperature
+        },
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _CountingTLRUCache(TLRUCache):
+    """LRU cache of (value, expires_at) pairs that expire at their own time; counts size-based evictions."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize, ttu=lambda key, item, now: item[1], timer=time.time)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class ResponseCache:
+    """Exact-match cache of AI responses with an in-memory LRU/TTL tier and an optional SQLite tier.
+
+    The SQLite tier keeps at most `max_disk_entries` rows, dropping the oldest on insert.
+    A disk hit is promoted to memory with the time it has left, so no tier serves a
+    response for longer than `ttl` after it was first cached.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 3600, disk_path: str = None,
+                 max_disk_entries: int = 20000):
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = _CountingTLRUCache(maxsize=max_entries)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS ix_response_cache_expires_at ON response_cache (expires_at)"
+            )
+            self._disk.commit()
+            logger.info(f"Response cache disk tier at {disk_path}")
+
+    async def get(self, key: str):
+        """Get a cached response, or None on a miss."""
+        item = self._memory.get(key)
+        if item is not None:
+            self.hits += 1
+            return item[0]
+
+        if self._disk is not None:
+            item = await asyncio.to_thread(self._disk_get, key)
+            if item is not None:
+                # Promote to the memory tier, keeping the disk row's expiry
+                self._memory[key] = item
+                self.hits += 1
+                self.disk_hits += 1
+                return item[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """Cache a response in every tier."""
+        expires_at = time.time() + self.ttl
+        self._memory[key] = (value, expires_at)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        """Get hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._memory.evictions,
+            "disk_evictions": self.disk_evictions
+        }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _disk_get(self, key: str):
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        with self._disk_lock, self._disk:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            # Opportunistically drop expired rows so the file doesn't grow forever
+            self._disk.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+            # Then the oldest rows over the cap (every row has the same TTL, so oldest expires first)
+            self.disk_evictions += self._disk.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY expires_at "
+                "LIMIT max(0, (SELECT COUNT(*) FROM response_cache) - ?))",
+                (self.max_disk_entries,)
+            ).rowcount
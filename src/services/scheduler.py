@@ -1,113 +1,278 @@
 import asyncio
 import logging
-from datetime import datetime, time
+from datetime import datetime, timedelta, timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from telegram.ext import Application
-from ..database.models import SessionLocal
+from ..config import (
+    DAILY_TIP_VARIANTS, DAILY_TIP_MISFIRE_GRACE_SECONDS, DAILY_TIP_HOUR, DAILY_TIP_TIMEZONE, DAILY_TIP_PREPARE_MINUTES
+)
+from ..database.async_db import run_db
 from ..database import crud
 from .ai_service import AIService
+from .admission import BACKGROUND
+from .broadcast import get_broadcaster
+from .timezones import get_tzinfo
 
 logger = logging.getLogger(__name__)
 
+TOPIC_EMOJIS = {
+    "feng_shui": "🏠", 
+    "mbti": "🧠", 
+    "iching": "🔮",
+    "bazi": "🌙",
+    "ziwei": "⭐"
+}
+
+TOPIC_TITLES_ZH = {
+    "feng_shui": "风水",
+    "mbti": "MBTI人格",
+    "iching": "易经",
+    "bazi": "八字",
+    "ziwei": "紫微斗数"
+}
+
+
+def format_tip(topic: str, tip: str, language: str = 'en') -> str:
+    """Wrap a generated tip in the daily tip heading for its language."""
+    emoji = TOPIC_EMOJIS.get(topic, "💬")
+    if language == 'zh':
+        topic_title = TOPIC_TITLES_ZH.get(topic, topic.replace('_', ' ').title())
+        return f"{emoji} <b>每日{topic_title}提示</b> {emoji}\n\n{tip}"
+    return f"{emoji} <b>Daily {topic.replace('_', ' ').title()} Tip</b> {emoji}\n\n{tip}"
+
+
+def delivery_groups(slot: datetime, timezones: list, hour: int = DAILY_TIP_HOUR,
+                    default_timezone: str = DAILY_TIP_TIMEZONE) -> dict:
+    """Find the timezones where the UTC hour `slot` is `hour` o'clock local time.
+
+    Returns {local date: [timezone, ...]}; None stands for users without a timezone.
+    Zones 24 hours apart (e.g. UTC+14 and UTC-10) share a slot on different dates.
+    """
+    groups = {}
+    for name in timezones:
+        local = slot.astimezone(get_tzinfo(name, default_timezone))
+        if local.hour == hour:
+            groups.setdefault(local.date(), []).append(name)
+    return groups
+
+
 class TipsScheduler:
-    def __init__(self, application: Application, ai_service: AIService):
+    def __init__(self, application: Application, ai_service: AIService, variants: int = DAILY_TIP_VARIANTS):
         self.application = application
         self.ai_service = ai_service
+        self.variants = max(1, variants)
+        self._tips_by_day = {}  # {local date: {language: [formatted tip, ...]}}, shared by that day's slots
+        self._prepare_lock = asyncio.Lock()  # The :45 preparation may still be running at the top of the hour
+        self._send_lock = asyncio.Lock()  # One sender per broadcast job, e.g. startup catch-up and the hourly run
+        self.broadcaster = get_broadcaster(application.bot)
+        # Jobs are kept in memory: the broadcast ledger is what survives restarts (see catch_up)
         self.scheduler = AsyncIOScheduler()
         
     def start(self):
         """Start the scheduler for daily tips."""
-        # Schedule daily tips at 9:00 AM
+        # Every hour, send to the timezones where it's now DAILY_TIP_HOUR o'clock
         self.scheduler.add_job(
             self.send_daily_tips,
-            CronTrigger(hour=9, minute=0),
+            CronTrigger(minute=0, timezone=timezone.utc),
             id='daily_tips',
-            replace_existing=True
+            misfire_grace_time=DAILY_TIP_MISFIRE_GRACE_SECONDS,
+            coalesce=True
         )
+        if DAILY_TIP_PREPARE_MINUTES:
+            # ... and generate the next hour's tips and recipients shortly before
+            self.scheduler.add_job(
+                self.prepare_daily_tips,
+                CronTrigger(minute=(60 - DAILY_TIP_PREPARE_MINUTES) % 60, timezone=timezone.utc),
+                id='prepare_daily_tips',
+                misfire_grace_time=DAILY_TIP_PREPARE_MINUTES * 60,
+                coalesce=True
+            )
+        
+        # Finish broadcasts a restart interrupted, and send the hours missed while down
+        self.scheduler.add_job(self.catch_up, id='catch_up')
+        
         self.scheduler.start()
         logger.info("Scheduler started for daily tips")
+    
+    async def catch_up(self, now: datetime = None):
+        """On startup, resume interrupted broadcasts and send the daily tips hours missed while down.
         
-    async def send_daily_tips(self):
-        """Send daily tips to subscribed users."""
-        logger.info("Sending daily tips to subscribers")
-        db = SessionLocal()
+        The ledger's latest daily tips job tells when tips last went out; the hours
+        after it, up to the misfire grace time, are prepared and sent. They're keyed
+        like any other run, so an hour that did go out isn't sent again.
+        """
+        await self.resume_broadcasts()
         
+        now = now or datetime.now(timezone.utc)
+        slot = now.replace(minute=0, second=0, microsecond=0)
         try:
-            # Get all subscribed users
-            subscribed_users = crud.get_subscribed_users(db)
-            
-            if not subscribed_users:
-                logger.info("No subscribed users found")
-                return
-            
-            # Determine which topic to use based on day of week
-            day_of_week = datetime.now().weekday()
-            topics = ['feng_shui', 'mbti', 'iching', 'bazi', 'ziwei']
-            topic = topics[day_of_week % len(topics)]
+            last = await run_db(crud.get_last_broadcast_send_at, "daily_tips", slot.replace(tzinfo=None))
+        except Exception as e:
+            logger.error(f"Error looking up the last daily tips run: {e}")
+            return
+        if last is None:
+            return  # Nothing sent yet, so nothing was missed
+        
+        missed_since = (last + timedelta(hours=1)).replace(tzinfo=timezone.utc)
+        logger.info(f"Catching up on daily tips since {missed_since:%Y-%m-%d %H}:00 UTC")
+        await self.send_daily_tips(now, missed_since)
+    
+    async def resume_broadcasts(self):
+        """Carry on delivering broadcast jobs that were interrupted mid-send."""
+        async with self._send_lock:
+            await self._resume_broadcasts()
+    
+    async def _resume_broadcasts(self):
+        try:
+            expired = datetime.utcnow() - timedelta(seconds=DAILY_TIP_MISFIRE_GRACE_SECONDS)
+            for job in await run_db(crud.get_unfinished_broadcast_jobs):
+                if job.send_at is not None and job.send_at < expired:
+                    # Too late for its delivery window; a morning tip shouldn't arrive in the evening
+                    logger.warning(f"Not resuming broadcast job {job.key}: it was due at {job.send_at} UTC")
+                    continue
+                logger.info(f"Resuming broadcast job {job.key}")
+                await self.broadcaster.deliver_job(job)
+        except Exception as e:
+            logger.error(f"Error resuming broadcasts: {e}")
+        
+    async def send_daily_tips(self, now: datetime = None, missed_since: datetime = None):
+        """Send daily tips to the subscribers whose local time is now DAILY_TIP_HOUR o'clock.
+        
+        Runs at the top of every UTC hour. Each hour's delivery is a broadcast job
+        with a ledger of its recipients, normally prepared ahead by
+        prepare_daily_tips; if it wasn't, it's prepared now. With `missed_since`
+        (the bot was down), the hours from then are prepared and sent too, if still
+        within the misfire grace time.
+        """
+        async with self._send_lock:
+            await self._send_daily_tips(now or datetime.now(timezone.utc), missed_since)
+    
+    async def _send_daily_tips(self, now: datetime, missed_since: datetime = None):
+        slot = now.replace(minute=0, second=0, microsecond=0)
+        # Stored send times are naive UTC, like the rest of the database
+        since = (slot - timedelta(seconds=DAILY_TIP_MISFIRE_GRACE_SECONDS)).replace(tzinfo=None)
+        
+        try:
+            # After downtime, the hours since the first missed run too
+            first = slot
+            if missed_since is not None:
+                missed = missed_since.replace(minute=0, second=0, microsecond=0)
+                first = max(missed, slot - timedelta(hours=DAILY_TIP_MISFIRE_GRACE_SECONDS // 3600))
+            while first <= slot:
+                await self.prepare_daily_tips(first)
+                first += timedelta(hours=1)
             
-            # Send to each subscribed user in their preferred language
-            for user in subscribed_users:
-                # Get user's preferred language
-                language = user.language if hasattr(user, 'language') else 'en'
-                
-                # Generate tip using AI in the user's language
-                tip_prompt = f"Generate a short, insightful daily tip about {topic} that would be valuable to most people."
-                tip = await self.ai_service.generate_response(topic, tip_prompt, language=language)
-                
-                # Format the tip with emojis
-                topic_emojis = {
-                    "feng_shui": "🏠", 
-                    "mbti": "🧠", 
-                    "iching": "🔮",
-                    "bazi": "🌙",
-                    "ziwei": "⭐"
-                }
-                emoji = topic_emojis.get(topic, "💬")
-                
-                # Create topic title based on language
-                if language == 'zh':
-                    topic_title = topic.replace('_', ' ').title()
-                    if topic == 'feng_shui':
-                        topic_title = "风水"
-                    elif topic == 'mbti':
-                        topic_title = "MBTI人格"
-                    elif topic == 'iching':
-                        topic_title = "易经"
-                    elif topic == 'bazi':
-                        topic_title = "八字"
-                    elif topic == 'ziwei':
-                        topic_title = "紫微斗数"
-                    
-                    formatted_tip = f"{emoji} <b>每日{topic_title}提示</b> {emoji}\n\n{tip}"
-                else:
-                    formatted_tip = f"{emoji} <b>Daily {topic.replace('_', ' ').title()} Tip</b> {emoji}\n\n{tip}"
-                
-                try:
-                    await self.application.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=formatted_tip,
-                        parse_mode='HTML'
-                    )
-                    logger.info(f"Sent daily tip to user {user.telegram_id} in {language}")
-                except Exception as e:
-                    logger.error(f"Failed to send tip to user {user.telegram_id}: {e}")
-                    
-                    # Fallback to plain text if HTML parsing fails
-                    try:
-                        plain_text = formatted_tip.replace('<b>', '').replace('</b>', '')
-                        await self.application.bot.send_message(
-                            chat_id=user.telegram_id,
-                            text=plain_text
-                        )
-                        logger.info(f"Sent fallback plain text tip to user {user.telegram_id}")
-                    except Exception as e2:
-                        logger.error(f"Failed to send fallback tip to user {user.telegram_id}: {e2}")
-                
-                # Add delay to avoid hitting rate limits
-                await asyncio.sleep(0.1)
+            for job in await run_db(crud.get_due_broadcast_jobs, "daily_tips", since, now.replace(tzinfo=None)):
+                logger.info(f"Sending daily tips {job.key} to {job.total} subscribers")
+                counts = await self.broadcaster.deliver_job(job)
+                if counts is not None:
+                    logger.info(f"Daily tips {job.key}: {counts}")
                 
         except Exception as e:
             logger.error(f"Error in send_daily_tips: {e}")
-        finally:
-            db.close()
\ No newline at end of file
+    
+    async def prepare_daily_tips(self, slot: datetime = None):
+        """Generate the tips for an hour's delivery and record its recipients.
+        
+        `slot` is the UTC hour to prepare; by default the next one. There's one job
+        per (slot, local date), keyed so each is only prepared once.
+        """
+        if slot is None:
+            slot = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        
+        try:
+            async with self._prepare_lock:
+                await self._prepare_slot(slot)
+        except Exception as e:
+            logger.error(f"Error preparing daily tips for {slot:%Y-%m-%d %H}:00 UTC: {e}")
+    
+    async def _prepare_slot(self, slot: datetime):
+        groups = delivery_groups(slot, await run_db(crud.get_subscriber_timezones))
+        for day, timezones in groups.items():
+            job = await run_db(
+                crud.get_or_create_broadcast_job,
+                f"daily_tips:{slot:%Y-%m-%dT%H}Z:{day.isoformat()}",
+                "daily_tips",
+                slot.replace(tzinfo=None)
+            )
+            if job.status == "pending":
+                await self._prepare_daily_tips(job, day, timezones)
+    
+    async def _prepare_daily_tips(self, job, day, timezones: list):
+        """Get the day's tips and record them with the job's recipients; None if there's nothing to send."""
+        # Get subscribed users in these timezones grouped by language
+        audiences = await run_db(crud.get_subscribers_by_language, timezones)
+        
+        if not audiences:
+            logger.info(f"No subscribers due daily tips {job.key}")
+            return None
+        
+        tips = await self._tips_for(day, list(audiences))
+        if not tips:
+            # The job stays pending, so the next attempt for this hour retries
+            logger.error(f"No daily tips could be generated for {day}")
+            return None
+        
+        recipients = []
+        for language, telegram_ids in audiences.items():
+            if language not in tips:
+                # Languages whose tips all failed to generate are skipped
+                logger.error(f"No daily tip for language {language}; skipping {len(telegram_ids)} subscribers")
+                continue
+            # Each user always gets the same variant, so variants are spread evenly
+            recipients.extend((telegram_id, language, telegram_id % len(tips[language])) for telegram_id in telegram_ids)
+        
+        job = await run_db(crud.prepare_broadcast_job, job.id, tips, 'HTML', recipients)
+        logger.info(f"Prepared daily tips {job.key} for {job.total} subscribers")
+        return job
+    
+    async def _tips_for(self, day, languages: list) -> dict:
+        """Get a local date's tips, generating only the languages that earlier slots that day didn't need."""
+        # Determine which topic to use based on day of week
+        topics = ['feng_shui', 'mbti', 'iching', 'bazi', 'ziwei']
+        topic = topics[day.weekday() % len(topics)]
+        
+        tips = self._tips_by_day.setdefault(day, {})
+        missing = [language for language in languages if language not in tips]
+        if missing:
+            tips.update(await self.generate_tips(topic, missing))
+        
+        # Only today's and the neighbouring dates' slots are still to come
+        for old in [d for d in self._tips_by_day if d < day - timedelta(days=2)]:
+            del self._tips_by_day[old]
+        return {language: tips[language] for language in languages if language in tips}
+    
+    async def generate_tips(self, topic: str, languages: list) -> dict:
+        """Generate and format every variant of today's tip for each language, concurrently.
+        
+        Returns {language: [formatted tip, ...]}; a language whose tips all failed is left out.
+        """
+        jobs = [(language, variant) for language in languages for variant in range(self.variants)]
+        results = await asyncio.gather(*(self._generate_tip(topic, language, variant) for language, variant in jobs))
+        
+        tips = {}
+        for (language, _), tip in zip(jobs, results):
+            if tip is not None:
+                tips.setdefault(language, []).append(format_tip(topic, tip, language))
+        logger.info(f"Generated {sum(len(v) for v in tips.values())} daily {topic} tips for {len(languages)} languages")
+        return tips
+    
+    async def _generate_tip(self, topic: str, language: str, variant: int):
+        """Generate one tip, or None if it couldn't be generated."""
+        tip_prompt = f"Generate a short, insightful daily tip about {topic} that would be valuable to most people."
+        if variant:
+            # A different prompt per variant, so they aren't served from one cache entry
+            tip_prompt += f" Take a different angle from the most common advice (variation {variant + 1})."
+        try:
+            # Raised rather than answered with the apology, which shouldn't go out to every subscriber
+            tip = await self.ai_service.generate_response(
+                topic, tip_prompt, language=language, priority=BACKGROUND, raise_errors=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate daily {topic} tip for language {language} (variant {variant + 1}): {e}")
+            return None
+        if not tip:
+            logger.error(f"Empty daily {topic} tip for language {language} (variant {variant + 1})")
+            return None
+        return tip
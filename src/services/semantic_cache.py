@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+try:
+    import hnswlib  # Optional approximate nearest-neighbour index
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+|[\u4e00-\u9fff]+")
+
+# Words that say nothing about what is being asked; dropping them keeps paraphrases close
+STOPWORDS = frozenset(
+    "a an the my our your his her their its i me we you he she they it is are was were be been "
+    "do does did should would could can will shall may might must what which who whom whose where "
+    "when why how best good better in on at for of to from with by about into and or but if "
+    "this that these those there here please tell give show explain know want need like "
+    "some any more most very so just put have has had get feng shui fengshui".split()
+)
+
+# CJK function characters ignored when building character bigrams
+CJK_STOPCHARS = frozenset("的了吗呢吧啊是在我你他她它们么什怎样请应该好用")
+
+
+class HashingEmbedder:
+    """Local embedder using hashed word, character n-gram and CJK bigram features.
+
+    Needs no model download or API call. It matches close rewordings of the same
+    question (word order, punctuation, filler words, plurals) but not deep
+    paraphrases; use the OpenAI embedder for those. Numbers are weighted heavily
+    so that e.g. "hexagram 1" and "hexagram 2" don't collide.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str):
+        for token in _TOKEN_RE.findall(text.lower()):
+            if token.isdigit():
+                yield "n:" + token, 4.0
+            elif "\u4e00" <= token[0] <= "\u9fff":
+                # Chinese has no spaces, so use character unigrams and bigrams
+                chars = [c for c in token if c not in CJK_STOPCHARS]
+                for c in chars:
+                    yield "h:" + c, 0.5
+                for i in range(len(chars) - 1):
+                    yield "b:" + chars[i] + chars[i + 1], 1.0
+            elif token not in STOPWORDS:
+                yield "w:" + token, 1.0
+                # Character trigrams make the embedding robust to plurals, spelling variants and typos
+                padded = f"#{token}#"
+                for i in range(len(padded) - 2):
+                    yield "c:" + padded[i:i + 3], 0.3
+
+    async def embed(self, text: str) -> np.ndarray:
+        return self.embed_sync(text)
+
+    def embed_sync(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Signed hashing keeps collisions from systematically inflating similarity
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class OpenAIEmbedder:
+    """Embedder backed by the OpenAI embeddings endpoint."""
+
+    def __init__(self, client, model: str = "text-embedding-3-small"):
+        self.client = client
+        self.model = model
+
+    async def embed(self, text: str) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.model, input=text)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """In-process index of unit vectors searched by cosine similarity.
+
+    Uses NumPy brute force by default, or an HNSW graph when hnswlib is installed
+    and `use_ann` is set. Once `max_entries` is reached the oldest entries are overwritten.
+    """
+
+    def __init__(self, dim: int, max_entries: int = 100000, use_ann: bool = False):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.use_ann = use_ann and hnswlib is not None
+
+        self._vectors = np.zeros((min(1024, max_entries), dim), dtype=np.float32)
+        self._values = [None] * max_entries
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+        if self.use_ann:
+            self._ann = hnswlib.Index(space="ip", dim=dim)
+            self._ann.init_index(max_elements=max_entries, ef_construction=100, M=16)
+            self._ann.set_ef(64)
+
+    def __len__(self):
+        return self._count
+
+    def add(self, vector: np.ndarray, value, expires_at: float):
+        with self._lock:
+            slot = self._next
+            if self.use_ann:
+                self._ann.add_items(vector.reshape(1, -1), [slot])
+            else:
+                if slot >= len(self._vectors):
+                    # Grow geometrically up to the configured capacity
+                    size = min(len(self._vectors) * 2, self.max_entries)
+                    grown = np.zeros((size, self.dim), dtype=np.float32)
+                    grown[:len(self._vectors)] = self._vectors
+                    self._vectors = grown
+                self._vectors[slot] = vector
+
+            self._values[slot] = value
+            self._expires[slot] = expires_at
+            self._next = (slot + 1) % self.max_entries
+            self._count = min(self._count + 1, self.max_entries)
+
+    def search(self, vector: np.ndarray):
+        """Get (similarity, value) of the closest live entry, or (0.0, None) if empty."""
+        with self._lock:
+            if not self._count:
+                return 0.0, None
+
+            if self.use_ann:
+                labels, distances = self._ann.knn_query(vector.reshape(1, -1), k=1)
+                slot = int(labels[0][0])
+                score = 1.0 - float(distances[0][0])
+            else:
+                scores = self._vectors[:self._count] @ vector
+                slot = int(np.argmax(scores))
+                score = float(scores[slot])
+
+            if self._expires[slot] < time.time():
+                return 0.0, None
+            return score, self._values[slot]
+
+
+class SemanticCache:
+    """Serve cached answers to paraphrased questions, scoped per (topic, language)."""
+
+    def __init__(self, embedder, threshold: float = 0.9, ttl: float = 86400,
+                 max_entries_per_scope: int = 20000, use_ann: bool = False):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_scope = max_entries_per_scope
+        self.use_ann = use_ann
+
+        self._indexes = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    async def get(self, topic: str, language: str, query: str, threshold: float = None):
+        """Get the cached answer to the most similar question, if it's similar enough.
+        
+        `threshold` overrides the configured similarity threshold for this lookup.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        index = self._indexes.get((topic, language))
+        if index is None or not len(index):
+            self.misses += 1
+            return None
+
+        start = time.perf_counter()
+        vector = await self.embedder.embed(query)
+        score, value = await asyncio.to_thread(index.search, vector)
+        self.lookup_seconds += time.perf_counter() - start
+
+        if value is not None and score >= threshold:
+            self.hits += 1
+            logger.info(f"Semantic cache hit on {topic}/{language} (similarity {score:.3f})")
+            return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, topic: str, language: str, query: str, response: str):
+        """Cache an answer under the embedding of its question."""
+        index = self._indexes.get((topic, language))
+        vector = await self.embedder.embed(query)
+        if index is None:
+            index = VectorIndex(len(vector), self.max_entries_per_scope, self.use_ann)
+            self._indexes[(topic, language)] = index
+        index.add(vector, response, time.time() + self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": sum(len(index) for index in list(self._indexes.values())),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_lookup_ms": round(self.lookup_seconds * 1000 / lookups, 3) if lookups else 0.0,
+            "ann": self.use_ann and hnswlib is not None
+        }
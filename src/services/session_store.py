@@ -0,0 +1,206 @@
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Rough fixed cost of a session object, its deque and its slot in the store
+SESSION_OVERHEAD_BYTES = 1024
+
+
+def _approx_size(text) -> int:
+    """Approximate memory used by a stored string."""
+    return sys.getsizeof(text) if text else 0
+
+
+class UserSession:
+    """Per-user conversation state kept compact with slots and a fixed-size message ring."""
+
+    __slots__ = ("messages", "message_count", "summary", "summary_upto", "topic", "assessment",
+                 "language", "history_loaded", "last_access", "size")
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)  # (role, content) tuples, oldest first
+        self.message_count = 0  # Messages ever added, so positions survive the ring dropping old ones
+        self.summary = None  # Running summary of older messages
+        self.summary_upto = 0  # Messages before this position are covered by the summary
+        self.topic = None
+        self.assessment = None  # (topic, context) of the last assessment
+        self.language = None
+        self.history_loaded = False  # Whether the history backend has been read into this session
+        self.last_access = time.monotonic()
+        self.size = SESSION_OVERHEAD_BYTES
+
+    def history(self, limit: int = None) -> list:
+        """Get the most recent messages in the chat completions format."""
+        messages = list(self.messages)
+        if limit is not None:
+            messages = messages[-limit:]
+        return [{"role": role, "content": content} for role, content in messages]
+
+    def position(self, index: int) -> int:
+        """Get the absolute position of the message at `index` in the ring."""
+        return self.message_count - len(self.messages) + index
+
+
+class SessionStore:
+    """Bounded store of user sessions with LRU and idle-TTL eviction.
+
+    Sessions are evicted least recently used first when the store holds more than
+    `max_sessions` sessions or more than `memory_budget_bytes` of (approximate) data,
+    and lazily once they have been idle for longer than `idle_ttl` seconds.
+    """
+
+    def __init__(self, max_sessions=10000, idle_ttl=86400, memory_budget_bytes=64 * 1024 * 1024, max_messages=20):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_messages = max_messages
+
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+
+        # Counters for sizing the store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return self.get(user_id, count=False) is not None
+
+    def get(self, user_id, count=True):
+        """Get a user's session, or None if it doesn't exist or has expired."""
+        session = self._sessions.get(user_id)
+
+        if session is not None and self._is_expired(session):
+            self._remove(user_id)
+            self.expirations += 1
+            session = None
+
+        if session is None:
+            if count:
+                self.misses += 1
+            return None
+
+        if count:
+            self.hits += 1
+        self._touch(user_id, session)
+        return session
+
+    def get_or_create(self, user_id, count=True) -> UserSession:
+        """Get a user's session, creating an empty one if needed."""
+        session = self.get(user_id, count=count)
+        if session is None:
+            session = UserSession(self.max_messages)
+            self._sessions[user_id] = session
+            self._total_bytes += session.size
+            self._enforce_limits()
+        return session
+
+    def add_message(self, user_id, role: str, content: str):
+        """Append a message to a user's history, dropping the oldest when the ring is full."""
+        session = self.get_or_create(user_id, count=False)
+
+        if len(session.messages) == session.messages.maxlen:
+            _, dropped = session.messages[0]
+            self._resize(session, -_approx_size(dropped))
+
+        session.messages.append((role, content))
+        session.message_count += 1
+        self._resize(session, _approx_size(content))
+        self._enforce_limits()
+
+    def clear_messages(self, user_id) -> bool:
+        """Clear a user's message history, keeping the rest of their session.
+
+        Returns False if there was no history to clear.
+        """
+        session = self.get(user_id, count=False)
+        if session is None or not session.messages:
+            return False
+
+        freed = sum(_approx_size(content) for _, content in session.messages) + _approx_size(session.summary)
+        session.messages.clear()
+        session.summary = None
+        session.summary_upto = session.message_count
+        self._resize(session, -freed)
+        return True
+
+    def set_summary(self, user_id, summary: str, upto: int):
+        """Store a running summary covering a user's messages before position `upto`."""
+        session = self.get(user_id, count=False)
+        if session is None or upto < session.summary_upto:
+            return  # Session gone, reset or already summarized further
+        self._resize(session, _approx_size(summary) - _approx_size(session.summary))
+        session.summary = summary
+        session.summary_upto = upto
+        self._enforce_limits()
+
+    def set_assessment(self, user_id, topic: str, context: str):
+        """Store the latest assessment context for follow-up questions."""
+        session = self.get_or_create(user_id, count=False)
+        if session.assessment:
+            self._resize(session, -_approx_size(session.assessment[1]))
+        session.assessment = (topic, context)
+        self._resize(session, _approx_size(context))
+        self._enforce_limits()
+
+    def evict_expired(self) -> int:
+        """Drop every session that has been idle for longer than the TTL."""
+        expired = 0
+        # Sessions are kept in access order, so idle ones are at the front
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if not self._is_expired(session):
+                break
+            self._remove(user_id)
+            expired += 1
+
+        self.expirations += expired
+        return expired
+
+    def stats(self) -> dict:
+        """Get counters and current size of the store."""
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "approx_bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def _is_expired(self, session: UserSession) -> bool:
+        return self.idle_ttl is not None and time.monotonic() - session.last_access > self.idle_ttl
+
+    def _touch(self, user_id, session: UserSession):
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(user_id)
+
+    def _resize(self, session: UserSession, delta: int):
+        session.size += delta
+        self._total_bytes += delta
+
+    def _remove(self, user_id):
+        session = self._sessions.pop(user_id)
+        self._total_bytes -= session.size
+
+    def _enforce_limits(self):
+        """Evict idle sessions, then least recently used ones until within bounds."""
+        self.evict_expired()
+
+        # Always keep the most recently used session, even if it alone exceeds the budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.memory_budget_bytes
+        ):
+            user_id = next(iter(self._sessions))
+            self._remove(user_id)
+            self.evictions += 1
+            logger.debug(f"Evicted session for user {user_id}")
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls so only one of them does the work.
+
+    Callers with the same key that arrive while a call is in flight await the
+    same future and receive the same result (or exception). Keys are forgotten
+    as soon as the call finishes, so this never serves stale results; caching
+    is left to the response caches.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+        # Counters for monitoring
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, fn):
+        """Run `fn()` for `key`, or wait for the identical call already in flight.
+
+        The shared call runs as its own task so one caller being cancelled doesn't
+        fail everyone else waiting on it.
+        """
+        shared = self.join(key)
+        if shared is None:
+            shared = asyncio.ensure_future(fn())
+            self._track(key, shared)
+        return await asyncio.shield(shared)
+
+    def join(self, key):
+        """Get the future of the call in flight for `key`, or None if there isn't one."""
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            logger.debug(f"Coalesced request onto in-flight call ({self.coalesced} so far)")
+        return shared
+
+    def lead(self, key) -> asyncio.Future:
+        """Register the caller as the one doing the work for `key`.
+
+        The caller must settle the returned future with a result or exception;
+        used when the work can't be wrapped in a single coroutine (e.g. streaming).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._track(key, future)
+        return future
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0
+        }
+
+    def _track(self, key, future):
+        self.calls += 1
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,50 @@
+"""User timezones, stored as IANA names ("Asia/Shanghai") or fixed UTC offsets ("UTC+08:00")."""
+import re
+from datetime import timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+_OFFSET = re.compile(r"^(?:UTC|GMT)?\s*([+-])\s*(\d{1,2})(?::?(\d{2}))?$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _zone_names() -> dict:
+    """Map lowercase IANA names to their canonical spelling, so "asia/shanghai" works too."""
+    return {name.lower(): name for name in available_timezones()}
+
+
+def normalize_timezone(value: str) -> Optional[str]:
+    """Turn what a user typed into the stored form, or None if it isn't a timezone.
+
+    Accepts IANA names in any case and offsets such as "+8", "-03:30" or "UTC+5:45".
+    """
+    value = value.strip()
+    if value.upper() in ("UTC", "GMT", "Z"):
+        return "UTC"
+
+    match = _OFFSET.match(value)
+    if match:
+        sign, hours, minutes = match.group(1), int(match.group(2)), int(match.group(3) or 0)
+        if minutes >= 60 or hours * 60 + minutes > 14 * 60:
+            return None
+        if not hours and not minutes:
+            return "UTC"
+        return f"UTC{sign}{hours:02d}:{minutes:02d}"
+
+    return _zone_names().get(value.lower())
+
+
+def get_tzinfo(name: Optional[str], default: Optional[str] = "UTC") -> tzinfo:
+    """Get the tzinfo for a stored timezone, falling back to `default` when it's unset or unknown."""
+    if name:
+        if name == "UTC":
+            return timezone.utc
+        if name.startswith("UTC") and len(name) == 9:
+            sign = -1 if name[3] == "-" else 1
+            return timezone(sign * timedelta(hours=int(name[4:6]), minutes=int(name[7:9])))
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return get_tzinfo(default, None) if default else timezone.utc
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# src.config requires these, and the database engine is created on import, so set them first
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test-token")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
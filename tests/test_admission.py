@@ -0,0 +1,92 @@
+import asyncio
+
+from src.services.admission import AdmissionController, INTERACTIVE, BACKGROUND
+
+
+async def _wait_all(controller, requests):
+    """Queue (user_id, priority) requests while the only slot is taken; return their admission order."""
+    order = []
+    blocker = await controller.acquire("blocker")
+
+    async def request(user_id, priority, name):
+        ticket = await controller.acquire(user_id, priority)
+        order.append(name)
+        await asyncio.sleep(0)
+        controller.release(ticket)
+
+    tasks = [asyncio.create_task(request(user_id, priority, name)) for name, (user_id, priority) in enumerate(requests)]
+    await asyncio.sleep(0)
+    controller.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_admits_interactive_before_background_then_in_arrival_order():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1)
+    order = asyncio.run(_wait_all(controller, [
+        (1, BACKGROUND), (2, INTERACTIVE), (3, BACKGROUND), (4, INTERACTIVE)
+    ]))
+
+    assert order == [1, 3, 0, 2]
+    assert controller.admitted[INTERACTIVE] == 3  # Including the blocker
+    assert controller.admitted[BACKGROUND] == 2
+
+
+def test_user_at_the_cap_is_skipped_without_losing_their_place():
+    async def run():
+        controller = AdmissionController(max_concurrent=2, max_per_user=1)
+        busy = await controller.acquire(1)
+
+        first = asyncio.create_task(controller.acquire(1))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(controller.acquire(2))
+        await asyncio.sleep(0)
+
+        # User 2 goes ahead while user 1 is at their cap
+        assert second.done() and not first.done()
+
+        controller.release(busy)
+        await asyncio.sleep(0)
+        assert first.done()
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 2
+    assert stats["queued"] == 0
+
+
+def test_cancelled_waiters_are_dropped_from_the_queue():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        busy = await controller.acquire(1)
+
+        cancelled = asyncio.create_task(controller.acquire(2))
+        waiting = asyncio.create_task(controller.acquire(3))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 2
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+
+        controller.release(busy)
+        ticket = await waiting
+        assert ticket.user_id == 3
+        assert controller.stats()["active"] == 1
+
+    asyncio.run(run())
+
+
+def test_holds_requests_until_the_token_budget_refills():
+    async def run():
+        controller = AdmissionController(max_concurrent=4, tokens_per_minute=600)
+        first = await controller.acquire(1, estimated_tokens=600)
+        controller.release(first)
+
+        # 10 tokens per second, so 5 tokens take about half a second
+        second = asyncio.create_task(controller.acquire(2, estimated_tokens=5))
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        await asyncio.wait_for(second, timeout=2)
+
+    asyncio.run(run())
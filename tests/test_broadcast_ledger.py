@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from src.database import crud, models
+from src.database.models import SessionLocal, init_db
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.query(models.BroadcastDelivery).delete()
+    session.query(models.BroadcastJob).delete()
+    session.query(models.User).delete()
+    session.commit()
+    session.close()
+
+
+def _job(db, chat_ids, key="tips:2026-01-01"):
+    job = crud.get_or_create_broadcast_job(db, key=key, kind="daily_tips")
+    return crud.prepare_broadcast_job(db, job.id, {"en": ["tip"]}, "HTML",
+                                      [(chat_id, "en", 0) for chat_id in chat_ids])
+
+
+def _statuses(db, job_id):
+    return dict(db.query(models.BroadcastDelivery.chat_id, models.BroadcastDelivery.status).filter(
+        models.BroadcastDelivery.job_id == job_id
+    ))
+
+
+def test_job_is_created_and_prepared_once(db):
+    job = _job(db, [1, 2, 3])
+    assert job.status == "ready" and job.total == 3
+
+    again = _job(db, [4, 5])
+    assert again.id == job.id
+    assert again.total == 3
+
+
+def test_claim_release_and_resume_never_send_twice(db):
+    job = _job(db, [1, 2, 3, 4])
+    crud.mark_broadcast_job_sending(db, job.id)
+
+    claimed = crud.claim_broadcast_deliveries(db, job.id, limit=3)
+    assert [row.chat_id for row in claimed] == [1, 2, 3]
+    assert crud.claim_broadcast_deliveries(db, job.id, after_id=claimed[-1].id, limit=3)[0].chat_id == 4
+
+    now = datetime.datetime.utcnow()
+    crud.record_broadcast_deliveries(db, [{"id": claimed[0].id, "status": "sent", "error": None, "sent_at": now}])
+    crud.release_broadcast_deliveries(db, [claimed[1].id])
+    db.expire_all()
+    assert [job.id for job in crud.get_unfinished_broadcast_jobs(db)] == [job.id]
+
+    # Restarted mid-send: what was being sent is unknown, what was released goes again
+    assert crud.abandon_broadcast_deliveries(db, job.id) == 2
+    assert _statuses(db, job.id) == {1: "sent", 2: "pending", 3: "unknown", 4: "unknown"}
+    assert [row.chat_id for row in crud.claim_broadcast_deliveries(db, job.id)] == [2]
+
+
+def test_finish_backs_off_failures_and_unsubscribes_unreachable(db):
+    for telegram_id, failures in ((1, 2), (2, 0), (3, 9), (4, 0)):
+        db.add(models.User(telegram_id=telegram_id, subscribed_to_tips=True, delivery_failures=failures))
+    db.commit()
+
+    job = _job(db, [1, 2, 3, 4])
+    rows = crud.claim_broadcast_deliveries(db, job.id)
+    outcomes = dict(zip((1, 2, 3, 4), ("sent", "failed", "failed", "unreachable")))
+    crud.record_broadcast_deliveries(db, [
+        {"id": row.id, "status": outcomes[row.chat_id], "error": None, "sent_at": None} for row in rows
+    ])
+
+    counts = crud.finish_broadcast_job(db, job.id, backoff_base=datetime.timedelta(days=1), max_failures=10)
+    assert counts == {"sent": 1, "failed": 2, "unreachable": 1}
+
+    db.expire_all()
+    users = {user.telegram_id: user for user in db.query(models.User)}
+    assert users[1].delivery_failures == 0 and users[1].next_delivery_at is None
+    assert users[2].delivery_failures == 1 and users[2].subscribed_to_tips
+    assert users[2].next_delivery_at > datetime.datetime.utcnow() + datetime.timedelta(hours=22)
+    assert users[3].delivery_failures == 10 and not users[3].subscribed_to_tips
+    assert not users[4].subscribed_to_tips
+
+    # Backed off users are left out of the next run until their time comes
+    assert crud.get_subscribers_by_language(db) == {"en": [1]}
+
+    job = db.get(models.BroadcastJob, job.id)
+    assert (job.status, job.sent, job.failed) == ("done", 1, 3)
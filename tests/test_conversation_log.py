@@ -0,0 +1,68 @@
+import asyncio
+import logging
+
+import pytest
+
+from src.database import conversation_log as conversation_log_module
+from src.database import models
+from src.database.conversation_log import ConversationLogWriter
+from src.database.models import SessionLocal, init_db
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.query(models.Conversation).delete()
+    session.query(models.User).delete()
+    session.commit()
+    session.close()
+
+
+def test_records_are_written_in_batches(db):
+    db.add(models.User(telegram_id=1))
+    db.commit()
+
+    async def run():
+        writer = ConversationLogWriter(batch_size=3, flush_interval=60)
+        for i in range(7):
+            await writer.log(1 + i % 2, f"question {i}", "answer", "general")
+        await writer.close()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats == {"queued": 0, "logged": 7, "written": 7, "batches": 3, "dropped": 0}
+
+    rows = db.query(models.Conversation.message).order_by(models.Conversation.id).all()
+    assert [message for (message,) in rows] == [f"question {i}" for i in range(7)]
+    # User 2 had no profile yet; it's created with the batch
+    users = {user.telegram_id: user for user in db.query(models.User)}
+    assert set(users) == {1, 2}
+    assert users[1].last_interaction is not None
+
+
+def test_failing_batch_is_retried_then_dropped_and_logged(db, monkeypatch, caplog):
+    attempts = []
+
+    async def failing_run_db(fn, *args):
+        attempts.append(len(args[0]))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(conversation_log_module, "run_db", failing_run_db)
+
+    async def run():
+        writer = ConversationLogWriter(batch_size=2, flush_interval=60, max_attempts=2)
+        await writer.log(1, "lost question", "answer", "general")
+        await writer.log(1, "another one", "answer", "general")
+        await writer.close()
+        return writer.stats()
+
+    with caplog.at_level(logging.ERROR, logger=conversation_log_module.logger.name):
+        stats = asyncio.run(run())
+
+    assert attempts == [2, 2]
+    assert stats["dropped"] == 2 and stats["written"] == 0
+    assert "Dropped 2 conversation logs after 2 attempts" in caplog.text
+    assert "lost question" in caplog.text and "another one" in caplog.text
+    assert db.query(models.Conversation).count() == 0
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from src.services.history_store import HistoryBackend, SQLiteHistoryBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteHistoryBackend(str(tmp_path / "history.db"), max_attempts=2, max_pending=5)
+    yield backend
+    backend._conn.close()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        HistoryBackend()
+
+
+def test_writes_are_read_back_in_order(backend):
+    async def run():
+        backend.append(1, "user", "hi")
+        backend.append(1, "assistant", "hello")
+        backend.append(2, "user", "other user")
+        return await backend.get_recent(1, 10)
+
+    assert asyncio.run(run()) == [("user", "hi"), ("assistant", "hello")]
+
+
+def test_failing_batch_is_retried_then_dropped(backend, monkeypatch):
+    def fail(batch):
+        raise OSError("disk full")
+
+    async def run():
+        write = backend._write_batch
+        monkeypatch.setattr(backend, "_write_batch", fail)
+        backend.append(1, "user", "lost")
+        await backend.flush()
+        assert backend.stats()["pending"] == 1  # Kept for one more try
+
+        await backend.flush()
+        assert backend.stats() == {"pending": 0, "written": 0, "dropped": 1}
+
+        monkeypatch.setattr(backend, "_write_batch", write)
+        backend.append(1, "user", "kept")
+        return await backend.get_recent(1, 10)
+
+    assert asyncio.run(run()) == [("user", "kept")]
+
+
+def test_queue_is_bounded(backend):
+    for i in range(8):
+        backend.append(1, "user", f"message {i}")
+
+    assert backend.stats()["pending"] == 5
+    assert backend.dropped == 3
+    assert [op[3] for op in backend._pending] == [f"message {i}" for i in range(3, 8)]
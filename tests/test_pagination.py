@@ -0,0 +1,86 @@
+import base64
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.pagination import decode_cursor, encode_cursor
+from src.api.routes import app
+from src.database import models
+from src.database.models import SessionLocal, init_db
+
+
+@pytest.mark.parametrize("row_id", [0, 1, 42, 2 ** 40])
+def test_cursor_round_trip(row_id):
+    cursor = encode_cursor(row_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == row_id
+
+
+def _raw(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "", "not a cursor", _raw("[]"), _raw("[1, 2]"), _raw('["7"]'), _raw("[true]"), _raw("[1.5]"), _raw("{}"),
+])
+def test_bad_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def client():
+    init_db()
+    db = SessionLocal()
+    user = models.User(telegram_id=1)
+    db.add(user)
+    db.add_all([models.User(telegram_id=telegram_id) for telegram_id in range(2, 8)])
+    db.commit()
+    db.add_all([
+        models.Conversation(user_id=user.id, message=f"message {i}", response="response", topic="general",
+                            created_at=datetime.datetime(2026, 1, 1))
+        for i in range(7)
+    ])
+    db.commit()
+    # Rows from before created_at was filled in; passing None to the model would get the default instead
+    db.query(models.Conversation).filter(
+        models.Conversation.message.in_(["message 1", "message 3", "message 5"])
+    ).update({"created_at": None})
+    db.commit()
+    yield TestClient(app)
+    db.query(models.Conversation).delete()
+    db.query(models.User).delete()
+    db.commit()
+    db.close()
+
+
+def _all_pages(client, path, limit):
+    items, cursor = [], None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        page = client.get(path, params=params).json()
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_pages_reach_every_row_once(client):
+    users = _all_pages(client, "/users/page", limit=3)
+    assert [user["telegram_id"] for user in users] == list(range(1, 8))
+
+    # Including the conversations without a created_at
+    conversations = _all_pages(client, "/conversations/page", limit=2)
+    assert sum(c["created_at"] is None for c in conversations) == 3
+    assert [c["message"] for c in conversations] == [f"message {i}" for i in reversed(range(7))]
+
+
+def test_list_endpoints_keep_returning_lists(client):
+    response = client.get("/users/", params={"skip": 2, "limit": 2})
+    assert [user["telegram_id"] for user in response.json()] == [3, 4]
+
+
+def test_bad_cursor_is_a_client_error(client):
+    assert client.get("/users/page", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/users/page", params={"limit": 0}).status_code == 422
@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, RateLimitError
+
+from src.services import resilience
+from src.services.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def connection_error():
+    return APIConnectionError(request=REQUEST)
+
+
+def status_error(cls, status: int, headers=None):
+    response = httpx.Response(status, request=REQUEST, headers=headers)
+    return cls(f"HTTP {status}", response=response, body=None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()  # A success resets the count
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()  # The probe
+    assert breaker.state == "half-open"
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 2
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens_and_a_lost_probe_is_replaced(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+    clock[0] += 10
+    assert breaker.allow()  # This probe never reports back
+    clock[0] += 5
+    assert not breaker.allow()
+    clock[0] += 5
+    assert breaker.allow()
+
+
+def _policy(**options):
+    options = {"max_retries": 3, "base_delay": 0.001, "max_delay": 0.001, "deadline": 5.0, **options}
+    return RetryPolicy(CircuitBreaker(failure_threshold=options.pop("failure_threshold", 5)), **options)
+
+
+def _flaky(*errors, result="ok"):
+    calls = []
+
+    async def fn(*args):
+        calls.append(args)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return fn, calls
+
+
+def test_retries_transient_errors_then_succeeds():
+    policy = _policy()
+    fn, calls = _flaky(connection_error(), status_error(RateLimitError, 429))
+
+    assert asyncio.run(policy.call(fn)) == "ok"
+    assert len(calls) == 3
+    assert policy.retries == 2
+    assert policy.breaker.state == "closed" and policy.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_gives_up_after_max_retries_and_opens_the_breaker():
+    policy = _policy(max_retries=2, failure_threshold=3)
+    fn, calls = _flaky(*(connection_error() for _ in range(5)))
+
+    with pytest.raises(APIConnectionError):
+        asyncio.run(policy.call(fn))
+    assert len(calls) == 3
+    assert policy.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.call(fn))
+    assert len(calls) == 3
+
+
+def test_upstream_rejection_counts_as_healthy_but_local_errors_do_not_touch_the_breaker():
+    policy = _policy()
+    policy.breaker.record_failure()
+
+    fn, calls = _flaky(TypeError("bug in our code"))
+    with pytest.raises(TypeError):
+        asyncio.run(policy.call(fn))
+    assert len(calls) == 1
+    assert policy.breaker.stats()["consecutive_failures"] == 1
+
+    fn, calls = _flaky(status_error(BadRequestError, 400))
+    with pytest.raises(BadRequestError):
+        asyncio.run(policy.call(fn))
+    assert len(calls) == 1
+    assert policy.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_deadline_bounds_attempts_and_backoff():
+    policy = _policy(deadline=0.05)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(policy.call(slow))
+    assert policy.deadline_exceeded == 1
+
+    # A Retry-After longer than what's left of the deadline isn't waited out
+    fn, calls = _flaky(status_error(RateLimitError, 429, headers={"retry-after": "10"}))
+    with pytest.raises(RateLimitError):
+        asyncio.run(policy.call(fn))
+    assert len(calls) == 1
+
+
+def test_waiting_for_admission_does_not_use_up_the_deadline():
+    policy = _policy(deadline=0.05)
+
+    @contextlib.asynccontextmanager
+    async def admit():
+        await asyncio.sleep(0.1)  # Queued behind other requests
+        yield "ticket"
+
+    fn, calls = _flaky(connection_error())
+    assert asyncio.run(policy.call(fn, admit=admit)) == "ok"
+    assert calls == [("ticket",), ("ticket",)]
+    assert policy.deadline_exceeded == 0
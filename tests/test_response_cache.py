@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services.response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(max_entries=10, ttl=3600, disk_path=str(tmp_path / "cache.db"), max_disk_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_key_ignores_whitespace_and_case_in_the_query():
+    key = make_cache_key("gpt-4o", "system", [], "What is  Feng Shui?", "en", 0.7)
+    assert key == make_cache_key("gpt-4o", "system", [], "what is feng shui?", "en", 0.7)
+    assert key != make_cache_key("gpt-4o", "system", [], "what is feng shui?", "zh", 0.7)
+
+
+def test_disk_tier_keeps_only_the_newest_rows(cache):
+    async def run():
+        for i in range(5):
+            await cache.set(f"key {i}", f"answer {i}")
+        cache._memory.clear()
+        return [await cache.get(f"key {i}") for i in range(5)]
+
+    assert asyncio.run(run()) == [None, None, "answer 2", "answer 3", "answer 4"]
+    assert cache.stats()["disk_evictions"] == 2
+    assert cache.stats()["disk_hits"] == 3
+
+
+def test_disk_hit_keeps_its_remaining_ttl(tmp_path, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=3600, disk_path=str(tmp_path / "cache.db"))
+
+    async def run():
+        await cache.set("key", "answer")
+        now[0] += 3000
+        cache._memory.clear()  # E.g. another worker cached it, or this one restarted
+        assert await cache.get("key") == "answer"
+
+        # 3601s after it was cached, it's gone from memory too
+        now[0] += 601
+        return await cache.get("key")
+
+    assert asyncio.run(run()) is None
+    cache.close()
@@ -0,0 +1,58 @@
+from src.services import session_store
+from src.services.session_store import SessionStore, SESSION_OVERHEAD_BYTES
+
+
+def test_evicts_least_recently_used_over_max_sessions():
+    store = SessionStore(max_sessions=2)
+    store.get_or_create(1)
+    store.get_or_create(2)
+    store.get(1)  # 2 is now the least recently used
+    store.get_or_create(3)
+
+    assert 1 in store and 3 in store
+    assert 2 not in store
+    assert store.evictions == 1
+
+
+def test_expires_idle_sessions(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "monotonic", lambda: now[0])
+    store = SessionStore(idle_ttl=60)
+    store.add_message(1, "user", "hello")
+    store.add_message(2, "user", "hello")
+
+    now[0] += 30
+    store.get(2)
+    now[0] += 45  # 1 idle for 75s, 2 for 45s
+
+    assert store.get(1) is None
+    assert store.get(2) is not None
+    assert store.expirations == 1
+    assert store.evict_expired() == 0
+
+
+def test_evicts_over_memory_budget_but_keeps_the_newest_session():
+    store = SessionStore(memory_budget_bytes=3 * SESSION_OVERHEAD_BYTES)
+    for user_id in range(3):
+        store.add_message(user_id, "user", "x" * 100)
+
+    assert len(store) == 2
+    assert 0 not in store
+
+    store.add_message(3, "user", "x" * 10 * SESSION_OVERHEAD_BYTES)
+    assert len(store) == 1
+    assert 3 in store
+
+
+def test_tracks_bytes_as_the_message_ring_drops_old_messages():
+    store = SessionStore(max_messages=2)
+    for text in ("a" * 100, "b" * 200, "c" * 300):
+        store.add_message(1, "user", text)
+
+    session = store.get(1)
+    assert [content[0] for _, content in session.messages] == ["b", "c"]
+    assert session.message_count == 3
+    assert store.stats()["approx_bytes"] == session.size
+
+    store.clear_messages(1)
+    assert store.stats()["approx_bytes"] == SESSION_OVERHEAD_BYTES
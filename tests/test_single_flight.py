@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight
+
+
+def test_coalesces_concurrent_calls_with_the_same_key():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return f"result {key}"
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: work("a")),
+            flight.do("a", lambda: work("a")),
+            flight.do("b", lambda: work("b"))
+        )
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(run())
+    assert results == ["result a", "result a", "result b"]
+    assert sorted(calls) == ["a", "b"]
+    assert flight.stats()["coalesced"] == 1
+    assert len(flight) == 0
+
+
+def test_leader_failure_reaches_every_waiter_and_is_not_remembered():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+        assert len(flight) == 0
+
+        # The next call runs again instead of reusing the failure
+        async def succeed():
+            return "ok"
+        return await flight.do("a", succeed)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        first = asyncio.create_task(flight.do("a", work))
+        second = asyncio.create_task(flight.do("a", work))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+
+
+def test_lead_shares_a_manually_settled_result():
+    async def run():
+        flight = SingleFlight()
+        future = flight.lead("a")
+        assert flight.join("a") is future
+        assert flight.join("b") is None
+
+        future.set_exception(ValueError("stream failed"))
+        with pytest.raises(ValueError):
+            await flight.join("a")
+        return flight
+
+    flight = asyncio.run(run())
+    assert len(flight) == 0
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from src.agent import streaming
+from src.agent.streaming import EMPTY_RESPONSE_TEXT, stream_reply, stream_to_message
+
+
+class FakeMessage:
+    """Records edits; `errors` are raised by the next edits in turn (None lets an edit through)."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.edits = []
+        self.text = None
+
+    async def edit_text(self, text, parse_mode=None):
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        self.edits.append((text, parse_mode))
+        self.text = text
+
+    async def reply_text(self, text, parse_mode=None):
+        self.reply = (text, parse_mode)
+        return self
+
+
+class Chunks:
+    """An async generator of deltas that remembers whether it was closed."""
+
+    def __init__(self, *deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    async def generate(self):
+        try:
+            for delta in self.deltas:
+                yield delta
+        finally:
+            self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def edit_every_chunk(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_RESPONSES", True)
+    monkeypatch.setattr(streaming, "STREAM_EDIT_INTERVAL", 0)
+
+
+def test_network_errors_and_rate_limits_only_skip_interim_edits():
+    message = FakeMessage(TimedOut(), RetryAfter(0), NetworkError("connection reset"))
+    chunks = Chunks("Hello", ", ", "world", "!")
+
+    text = asyncio.run(stream_to_message(message, chunks.generate()))
+
+    assert text == "Hello, world!"
+    assert message.text == "Hello, world!"
+    assert chunks.closed
+
+
+def test_final_formatting_error_falls_back_to_plain_text():
+    message = FakeMessage(None, BadRequest("Can't parse entities"))
+    asyncio.run(stream_to_message(message, Chunks("*bold").generate(), parse_mode="Markdown"))
+
+    assert message.edits[-1] == ("*bold", None)
+
+
+def test_not_modified_final_edit_is_ignored():
+    message = FakeMessage(BadRequest("Message is not modified"), BadRequest("Message is not modified"))
+    assert asyncio.run(stream_to_message(message, Chunks("same").generate())) == "same"
+
+
+def test_empty_response_replaces_the_placeholder():
+    message = FakeMessage()
+    asyncio.run(stream_to_message(message, Chunks("", " ").generate()))
+
+    assert message.text == EMPTY_RESPONSE_TEXT
+
+
+def test_stream_is_closed_when_an_edit_fails_unexpectedly():
+    async def run():
+        message = FakeMessage(RuntimeError("bug"))
+        chunks = Chunks("a", "b", "c")
+        with pytest.raises(RuntimeError):
+            await stream_reply(message, chunks.generate())
+        # Straight away, not when the loop shuts down its leftover generators
+        assert chunks.closed
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from src.services.scheduler import delivery_groups
+from src.services.timezones import get_tzinfo, normalize_timezone
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("asia/shanghai", "Asia/Shanghai"),
+    (" Europe/London ", "Europe/London"),
+    ("+8", "UTC+08:00"),
+    ("-03:30", "UTC-03:30"),
+    ("UTC+5:45", "UTC+05:45"),
+    ("gmt-0530", "UTC-05:30"),
+    ("+0", "UTC"),
+    ("z", "UTC"),
+    ("+14", "UTC+14:00"),
+    ("+14:30", None),
+    ("+5:60", None),
+    ("Mars/Olympus", None),
+])
+def test_normalize_timezone(value, expected):
+    assert normalize_timezone(value) == expected
+
+
+def test_get_tzinfo_for_offsets_names_and_fallbacks():
+    assert get_tzinfo("UTC-03:30").utcoffset(None) == -timedelta(hours=3, minutes=30)
+    assert get_tzinfo("UTC+05:45").utcoffset(None) == timedelta(hours=5, minutes=45)
+    assert get_tzinfo("Asia/Shanghai").utcoffset(datetime(2026, 1, 1)) == timedelta(hours=8)
+    assert get_tzinfo(None, "Asia/Tokyo").utcoffset(datetime(2026, 1, 1)) == timedelta(hours=9)
+    assert get_tzinfo("Nowhere/Special") is timezone.utc
+
+
+def test_delivery_groups_follow_daylight_saving_time():
+    zones = ["Europe/London", "UTC+01:00", "UTC"]
+    winter = delivery_groups(datetime(2026, 1, 15, 9, tzinfo=timezone.utc), zones, hour=9)
+    summer = delivery_groups(datetime(2026, 7, 15, 8, tzinfo=timezone.utc), zones, hour=9)
+
+    assert winter == {date(2026, 1, 15): ["Europe/London", "UTC"]}
+    assert summer == {date(2026, 7, 15): ["Europe/London", "UTC+01:00"]}
+
+
+def test_delivery_groups_every_zone_gets_one_slot_a_day():
+    zones = ["UTC+14:00", "UTC-10:00", "UTC+05:45", "UTC-03:30", "America/New_York", None]
+    slots = {}
+    start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    for hour in range(24 * 3):
+        slot = start + timedelta(hours=hour)
+        for day, names in delivery_groups(slot, zones, hour=9, default_timezone="Asia/Shanghai").items():
+            for name in names:
+                slots.setdefault(name, []).append(day)
+
+    # Offsets with minutes are never 9:00 on a UTC hour, so they get the 9:xx slot instead
+    for name in zones:
+        assert len(slots[name]) == len(set(slots[name])) == 3
+
+    # UTC+14 and UTC-10 share a UTC hour, a day apart
+    both = delivery_groups(datetime(2026, 3, 1, 19, tzinfo=timezone.utc), zones, hour=9)
+    assert both == {date(2026, 3, 2): ["UTC+14:00"], date(2026, 3, 1): ["UTC-10:00"]}